@@ -0,0 +1,83 @@
+"""
+Local archive of every activity garmin-activities2.py has synced.
+
+One small summary per activity (SYNC_STATE_DIR/activities/archive.json):
+start, local day, name, sport family, distance, duration, elevation gain and
+20-minute power, plus best efforts (1K, mile, 5K, 10K, 20 min power) when the
+FIT streams were decoded (--fit). Derived data such as the PR timeline
+(pr_timeline.py) is computed from it without asking Garmin again.
+"""
+
+from activity_dedupe import sport_family
+from fit_files import best_average_power, best_effort_seconds
+from formatting import METERS_PER_MILE
+from local_dates import activity_day
+from relations import activity_key
+from sync_state import load_json, save_json, state_path
+
+EFFORT_DISTANCES = {"1k": 1000, "1mi": METERS_PER_MILE, "5k": 5000, "10k": 10000}
+
+
+def _archive_file() -> str:
+    return state_path("activities", "archive.json")
+
+
+def load_archive() -> dict:
+    """
+    {key: entry}; keys are activityIds, or activity keys for entries seeded from Notion.
+    """
+    return load_json(_archive_file(), {}) or {}
+
+
+def stream_efforts(streams: dict) -> dict:
+    efforts = {}
+    for name, meters in EFFORT_DISTANCES.items():
+        seconds = best_effort_seconds(streams["time"], streams["distance"], meters)
+        if seconds:
+            efforts[name] = round(seconds, 1)
+    power = best_average_power(streams["time"], streams["power"], 20 * 60)
+    if power:
+        efforts["power_20min"] = round(power, 1)
+    return efforts
+
+
+def archive_entry(a: dict, streams: dict = None) -> dict:
+    """
+    Archive summary of a Garmin activity; streams are decoded FIT streams, if any.
+    """
+    name = a.get("activityName") or "Unnamed Activity"
+    day = activity_day(a)
+    entry = {
+        "start": a.get("startTimeGMT") or a.get("startTimeLocal") or day,
+        "day": day,
+        "name": name,
+        "key": activity_key(day or "", name),
+        "family": sport_family(a),
+        "distance": a.get("distance"),
+        "duration": a.get("duration"),
+        "elevation_gain": a.get("elevationGain"),
+        "power_20min": a.get("max20MinPower"),
+    }
+    if streams:
+        entry.update(stream_efforts(streams))
+    return entry
+
+
+def record_archive(plan: dict) -> None:
+    """
+    Add the plan's activities to the archive once the plan has been applied:
+    those whose row was written, and those whose row needed no write. An
+    activity whose write was skipped or failed is archived on a later run.
+    """
+    entries = plan.get("activity_archive")
+    if not entries:
+        return
+    applied = {str(op.get("activity_id")) for op in plan["operations"] if op["action"] in ("create", "update")}
+    unwritten = set(plan.get("activity_writes") or []) - applied
+    archive = load_archive()
+    for activity_id, entry in entries.items():
+        if activity_id in unwritten:
+            continue
+        # Keep efforts from an earlier run that had the FIT streams
+        archive[activity_id] = {**archive.get(activity_id, {}), **entry}
+    save_json(_archive_file(), archive)
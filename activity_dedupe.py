@@ -0,0 +1,178 @@
+"""
+Duplicate activity detection.
+
+peloton-to-garmin and manual uploads often add a second copy of a workout the
+watch already recorded. Activities are indexed by their [start, end) time in
+a static interval tree (sorted by start, each subtree annotated with its
+largest end), so finding everything that overlaps one activity costs
+O(log n + matches) even over a full history. Two activities are duplicates
+when they overlap for most of the shorter one, belong to the same sport
+family, and have similar duration and distance. From each group of
+duplicates only the canonical activity (the one with the richest recording)
+is kept.
+"""
+
+from local_dates import parse_instant
+
+MIN_OVERLAP = 0.5       # share of the shorter activity that must overlap
+MAX_DIFFERENCE = 0.15   # relative duration / distance difference
+
+SPORT_FAMILIES = (
+    ("cycling", ("cycling", "biking", "ride", "bike")),
+    ("running", ("running", "run")),
+    ("swimming", ("swim",)),
+    ("walking", ("walking", "hiking", "walk")),
+    ("rowing", ("rowing", "row")),
+)
+
+
+# -----------------------------
+# Interval index
+# -----------------------------
+class IntervalIndex:
+    """
+    Static interval tree over (start, end, value) items. The tree is implicit:
+    the node for items[lo:hi] is the middle item, and max_end[mid] holds the
+    largest end in that subtree, so whole subtrees that end too early are skipped.
+    """
+
+    def __init__(self, items):
+        self._items = sorted(items, key=lambda item: item[0])
+        self._max_end = [0.0] * len(self._items)
+        self._build(0, len(self._items))
+
+    def _build(self, lo: int, hi: int) -> float:
+        if lo >= hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(self._items[mid][1], self._build(lo, mid), self._build(mid + 1, hi))
+        return self._max_end[mid]
+
+    def overlapping(self, start: float, end: float) -> list:
+        """
+        Values of every item with item.start < end and item.end > start.
+        """
+        found = []
+        stack = [(0, len(self._items))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] <= start:
+                continue  # nothing in this subtree ends after start
+            item_start, item_end, value = self._items[mid]
+            stack.append((lo, mid))
+            if item_start < end:
+                if item_end > start:
+                    found.append(value)
+                stack.append((mid + 1, hi))
+        return found
+
+    def __len__(self):
+        return len(self._items)
+
+
+# -----------------------------
+# Matching rules
+# -----------------------------
+def sport_family(a: dict) -> str:
+    key = ((a.get("activityType") or {}).get("typeKey") or "").lower()
+    for family, words in SPORT_FAMILIES:
+        if any(word in key for word in words):
+            return family
+    return key
+
+
+def activity_interval(a: dict):
+    """
+    (start, end) in epoch seconds, or None without a start time.
+    """
+    start = parse_instant(a.get("startTimeGMT")) or parse_instant(a.get("beginTimestamp"))
+    if start is None:
+        return None
+    seconds = a.get("elapsedDuration") or a.get("duration") or 0
+    return start.timestamp(), start.timestamp() + max(float(seconds), 1.0)
+
+
+def _similar(x, y) -> bool:
+    x, y = x or 0, y or 0
+    if not x and not y:
+        return True
+    return abs(x - y) <= MAX_DIFFERENCE * max(x, y)
+
+
+def is_duplicate(a: dict, b: dict, interval_a, interval_b) -> bool:
+    overlap = min(interval_a[1], interval_b[1]) - max(interval_a[0], interval_b[0])
+    shorter = min(interval_a[1] - interval_a[0], interval_b[1] - interval_b[0])
+    return (
+        overlap >= MIN_OVERLAP * shorter
+        and sport_family(a) == sport_family(b)
+        and _similar(a.get("duration"), b.get("duration"))
+        and _similar(a.get("distance"), b.get("distance"))
+    )
+
+
+def canonical_rank(a: dict) -> tuple:
+    # Device recordings with HR and power beat manual/imported copies; then the earliest upload
+    return (
+        not a.get("manualActivity"),
+        a.get("averageHR") is not None,
+        a.get("avgPower") is not None,
+        bool(a.get("deviceId")),
+        -(a.get("activityId") or 0),
+    )
+
+
+# -----------------------------
+# Detection
+# -----------------------------
+def find_duplicates(activities: list) -> dict:
+    """
+    {activityId of each duplicate: activityId of the activity it duplicates}.
+    """
+    intervals = {}
+    for a in activities:
+        interval = activity_interval(a)
+        if interval and a.get("activityId"):
+            intervals[a["activityId"]] = (a, interval)
+    index = IntervalIndex([(start, end, activity_id) for activity_id, (_, (start, end)) in intervals.items()])
+
+    # Union overlapping matches into groups, then keep the best of each group
+    parent = {activity_id: activity_id for activity_id in intervals}
+
+    def root(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for activity_id, (a, interval) in intervals.items():
+        for other_id in index.overlapping(*interval):
+            if other_id != activity_id and is_duplicate(a, intervals[other_id][0], interval, intervals[other_id][1]):
+                parent[root(other_id)] = root(activity_id)
+
+    groups = {}
+    for activity_id in intervals:
+        groups.setdefault(root(activity_id), []).append(intervals[activity_id][0])
+
+    duplicates = {}
+    for group in groups.values():
+        if len(group) > 1:
+            keep = max(group, key=canonical_rank)
+            for a in group:
+                if a is not keep:
+                    duplicates[a["activityId"]] = keep["activityId"]
+    return duplicates
+
+
+def drop_duplicates(activities: list) -> list:
+    """
+    The activities without duplicates, in their original order; each dropped one is reported.
+    """
+    duplicates = find_duplicates(activities)
+    names = {a.get("activityId"): a.get("activityName") or "Unnamed Activity" for a in activities}
+    for activity_id, keep_id in duplicates.items():
+        print(f"Skipping duplicate activity {activity_id} ({names[activity_id]}); "
+              f"same workout as {keep_id} ({names[keep_id]})")
+    return [a for a in activities if a.get("activityId") not in duplicates]
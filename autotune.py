@@ -0,0 +1,126 @@
+"""
+AIMD tuning of page sizes and in-flight requests, remembered between runs.
+
+Each knob starts from the value the last run settled on
+(SYNC_STATE_DIR/autotune.json), or from its old fixed default:
+
+  garmin.activities_page  activities per get_activities() call
+  garmin.range_days       days per daily-steps / health range request
+  garmin.workers          concurrent per-day fetches in daily-metrics.py
+  notion.page_size        results per Notion query / block list page
+
+Calls made under measure(knob) feed it back: a throttled call (HTTP 429)
+halves the knob, a call slower than the knob's target latency cuts it by a
+quarter, and every few fast calls add one step, up to the knob's limit.
+Decreases within DECREASE_COOLDOWN seconds of the last one are ignored, so a
+burst of concurrent 429s counts as one. AUTOTUNE=0 pins every knob to its
+default.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sync_state import load_json, save_json, state_path
+
+# name: (default, lowest, highest, additive step, target latency in seconds)
+KNOBS = {
+    "garmin.activities_page": (30, 10, 100, 10, 8.0),
+    "garmin.range_days": (28, 7, 28, 7, 8.0),
+    "garmin.workers": (4, 1, 8, 1, 5.0),
+    "notion.page_size": (100, 25, 100, 25, 3.0),
+}
+
+THROTTLED_FACTOR = 0.5
+SLOW_FACTOR = 0.75
+# Fast calls needed for one additive step
+INCREASE_AFTER = 5
+DECREASE_COOLDOWN = 2.0
+
+_lock = threading.Lock()
+_state = None
+
+
+def _tuning_file() -> str:
+    return state_path("autotune.json")
+
+
+def _enabled() -> bool:
+    return os.getenv("AUTOTUNE", "1").lower() not in ("0", "false", "no")
+
+
+def _load() -> dict:
+    global _state
+    if _state is None:
+        saved = load_json(_tuning_file(), {}) or {}
+        _state = {name: {"value": float(saved.get(name, knob[0])), "fast": 0, "decreased_at": 0.0}
+                  for name, knob in KNOBS.items()}
+    return _state
+
+
+def tuned(name: str) -> int:
+    """
+    Current value of a knob, within its limits.
+    """
+    default, low, high = KNOBS[name][:3]
+    if not _enabled():
+        return default
+    with _lock:
+        return int(min(max(_load()[name]["value"], low), high))
+
+
+def throttled(error: Exception) -> bool:
+    """
+    True for Notion's rate_limited errors and Garmin's (or any HTTP) 429.
+    """
+    if getattr(error, "status", None) == 429 or getattr(error, "code", None) == "rate_limited":
+        return True
+    response = getattr(error, "response", None) or getattr(getattr(error, "error", None), "response", None)
+    return getattr(response, "status_code", None) == 429 or "TooManyRequests" in type(error).__name__
+
+
+def observe(name: str, seconds: float, was_throttled: bool = False) -> None:
+    _, low, high, step, target = KNOBS[name]
+    with _lock:
+        knob = _load()[name]
+        if was_throttled or seconds > target:
+            now = time.monotonic()
+            knob["fast"] = 0
+            if now - knob["decreased_at"] < DECREASE_COOLDOWN:
+                return
+            knob["decreased_at"] = now
+            factor = THROTTLED_FACTOR if was_throttled else SLOW_FACTOR
+            knob["value"] = max(low, knob["value"] * factor)
+            print(f"Autotune: {name} down to {int(knob['value'])} "
+                  f"({'throttled' if was_throttled else f'{seconds:.1f}s'})")
+            return
+        knob["fast"] += 1
+        if knob["fast"] >= INCREASE_AFTER:
+            knob["fast"] = 0
+            knob["value"] = min(high, knob["value"] + step)
+
+
+@contextmanager
+def measure(name: str):
+    """
+    Time the call inside the block and feed it to the knob; errors are re-raised.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        if throttled(e):
+            observe(name, time.perf_counter() - start, was_throttled=True)
+        raise
+    observe(name, time.perf_counter() - start)
+
+
+def save_tuning() -> None:
+    """
+    Remember where the knobs ended up; the next run starts there.
+    """
+    if _state is None or not _enabled():
+        return
+    with _lock:
+        save_json(_tuning_file(), {name: round(knob["value"], 2) for name, knob in _state.items()})
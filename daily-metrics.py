@@ -0,0 +1,42 @@
+from dotenv import load_dotenv
+import argparse
+import os
+
+from garmin_session import login_to_garmin
+from metric_sources import SOURCES
+from metric_sync import build_metrics_plan, record_synced
+from sync_plan import add_plan_arguments, run_plan_cli
+from transport import shared_notion_client
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Sync daily Garmin metrics (stress, Body Battery, HRV, ...) to Notion")
+    add_plan_arguments(parser)
+    parser.add_argument("--source", action="append", choices=[s.name for s in SOURCES],
+                        help="only sync this metric (repeatable); default: every metric with a database ID set")
+    parser.add_argument("--backfill", type=int, metavar="DAYS",
+                        help="re-read the last DAYS days instead of continuing from the last synced day")
+    parser.add_argument("--workers", type=int,
+                        help="concurrent Garmin requests for per-day metrics (default: tuned from earlier runs, "
+                             "starting at 4)")
+    args = parser.parse_args()
+
+    notion_token = os.getenv("NOTION_TOKEN")
+    client = shared_notion_client(notion_token)
+
+    # A metric is synced when its database ID is configured
+    sources = [s for s in SOURCES if os.getenv(s.db_env) and (not args.source or s.name in args.source)]
+    database_ids = {s.name: os.getenv(s.db_env) for s in sources}
+    if not sources and not args.apply:
+        print("No metric databases configured (set e.g. NOTION_STRESS_DB_ID)")
+        return
+
+    def build_plan():
+        garmin = login_to_garmin()
+        return build_metrics_plan(garmin, client, sources, database_ids, args.backfill, args.workers)
+
+    run_plan_cli(args, client, build_plan, after_apply=record_synced)
+
+if __name__ == '__main__':
+    main()
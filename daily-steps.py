@@ -1,165 +1,159 @@
-from datetime import date, timedelta
-from garminconnect import Garmin
-from notion_client import Client
+from datetime import timedelta
 from dotenv import load_dotenv
+import argparse
 import os
 import sys
 
-def get_all_daily_steps(garmin):
+from autotune import measure, tuned
+from garmin_session import login_to_garmin
+from local_dates import today
+from notion_index import load_index, page_date, page_value
+from relations import load_activity_links
+from rollups import add_rollups, record_rollups, steps_facts
+from step_streaks import catchup_start, load_streaks, save_streaks, streak_properties
+from sync_plan import add_plan_arguments, create_op, new_plan, run_plan_cli, update_op
+from transport import shared_notion_client
+
+def get_all_daily_steps(garmin, startdate=None):
     """
-    Get last x days of daily step count data from Garmin Connect.
+    Get daily step count data from Garmin Connect, from startdate (default:
+    yesterday) up to yesterday.
     """
-    startdate = date.today() - timedelta(days=1)
+    end = today()
+    startdate = startdate or end - timedelta(days=1)
     daterange = [startdate + timedelta(days=x) 
-                 for x in range((date.today() - startdate).days)] # excl. today
+                 for x in range((end - startdate).days)] # excl. today
     daily_steps = []
-    for d in daterange:
-        daily_steps += garmin.get_daily_steps(d.isoformat(), d.isoformat())
+    i = 0
+    while i < len(daterange):
+        # Days per Garmin range request when catching up (see autotune.py)
+        chunk = daterange[i:i + tuned("garmin.range_days")]
+        with measure("garmin.range_days"):
+            daily_steps += garmin.get_daily_steps(chunk[0].isoformat(), chunk[-1].isoformat())
+        i += len(chunk)
     return daily_steps
 
-def daily_steps_exist(client, database_id, activity_date):
+def get_daily_steps_on(garmin, days):
     """
-    Check if daily step count already exists in the Notion database.
+    Daily step counts for the given calendar days (targeted syncs, see push_sync.py).
     """
-    query = client.databases.query(
-        database_id=database_id,
-        filter={
-            "and": [
-                {"property": "Date", "date": {"equals": activity_date}},
-                {"property": "Activity Type", "title": {"equals": "Walking"}}
-            ]
-        }
-    )
-    results = query['results']
-    return results[0] if results else None
-
-def steps_need_update(existing_steps, new_steps):
+    daily_steps = []
+    for day in sorted(set(days)):
+        daily_steps += garmin.get_daily_steps(day, day) or []
+    return daily_steps
+
+def daily_steps_key(page):
     """
-    Compare existing steps data with imported data to determine if an update is needed.
+    Key a Notion steps row by its date. Only 'Walking' rows are daily step entries.
     """
-    existing_props = existing_steps['properties']
-    activity_type = "Walking"
-    
-    return (
-        existing_props['Total Steps']['number'] != new_steps.get('totalSteps') or
-        existing_props['Step Goal']['number'] != new_steps.get('stepGoal') or
-        existing_props['Total Distance (km)']['number'] != new_steps.get('totalDistance') or
-        existing_props['Activity Type']['title'] != activity_type
-    )
-
-def update_daily_steps(client, existing_steps, new_steps):
+    if page_value(page, 'Activity Type') != "Walking":
+        return None
+    return page_date(page, 'Date')
+
+def load_daily_steps_index(client, database_id):
     """
-    Update an existing daily steps entry in the Notion database with new data.
+    Read the whole steps database once, keyed by calendar date.
     """
-    total_distance = new_steps.get('totalDistance')
-    if total_distance is None:
-        total_distance = 0
-    properties = {
-        "Activity Type":  {"title": [{"text": {"content": "Walking"}}]},
-        "Total Steps": {"number": new_steps.get('totalSteps')},
-        "Step Goal": {"number": new_steps.get('stepGoal')},
-        "Total Distance (km)": {"number": round(total_distance / 1000, 2)}
-    }
-    
-    update = {
-        "page_id": existing_steps['id'],
-        "properties": properties,
-    }
-        
-    client.pages.update(**update)
+    return load_index(client, database_id, daily_steps_key)
 
-def create_daily_steps(client, database_id, steps):
+def daily_steps_properties(steps):
     """
-    Create a new daily steps entry in the Notion database.
+    Notion properties for a Garmin daily steps entry.
     """
     total_distance = steps.get('totalDistance')
     if total_distance is None:
         total_distance = 0
-    properties = {
+    return {
         "Activity Type": {"title": [{"text": {"content": "Walking"}}]},
         "Date": {"date": {"start": steps.get('calendarDate')}},
         "Total Steps": {"number": steps.get('totalSteps')},
         "Step Goal": {"number": steps.get('stepGoal')},
         "Total Distance (km)": {"number": round(total_distance / 1000, 2)}
     }
-    
-    page = {
-        "parent": {"database_id": database_id},
-        "properties": properties,
-    }
-    
-    client.pages.create(**page)
 
-def login_to_garmin():
+def plan_daily_steps(database_id, daily_steps, index, links=None, streaks=None):
     """
-    Login to Garmin Connect with 2FA support
+    Create a new entry for unseen dates and update existing ones whose values changed.
+    With links (relations.ActivityLinks) each day also links to that day's activities;
+    with streaks (step_streaks.StepStreaks) it gets its streak and week/month totals.
     """
-    garmin_email = os.getenv("GARMIN_EMAIL")
-    garmin_password = os.getenv("GARMIN_PASSWORD")
-    token_store = os.getenv("GARMIN_TOKEN_STORE", "~/.garmin_tokens")
-    token_store = os.path.expanduser(token_store)
-    mfa_code = os.getenv("GARMIN_MFA_CODE")  # Optional, for non-interactive 2FA
-    
-    # Initialize Garmin client
-    garmin = Garmin(garmin_email, garmin_password)
-    
-    try:
-        # First try to use token store if it exists
-        if os.path.exists(token_store):
-            print(f"Using stored tokens from {token_store}")
-            garmin.login(tokenstore=token_store)
-            return garmin
-        
-        # If no token store or it failed, try fresh login
-        if mfa_code:
-            # Use non-interactive 2FA flow
-            print("Using non-interactive 2FA flow")
-            client_state, _ = garmin.login(return_on_mfa=True)
-            if client_state == "needs_mfa":
-                garmin.resume_login(client_state, mfa_code)
-            else:
-                print("MFA was expected but not requested")
+    ops = []
+    for steps in sorted(daily_steps, key=lambda s: s.get('calendarDate') or ""):
+        steps_date = steps.get('calendarDate')
+        properties = daily_steps_properties(steps)
+        if streaks and steps.get('totalSteps') is not None:
+            properties.update(streak_properties(
+                streaks.update(steps_date, steps.get('totalSteps'), steps.get('stepGoal'))))
+        if links:
+            properties.update(links.day_properties(steps_date))
+        existing_steps = index.get(steps_date)
+        if existing_steps:
+            ops.append(update_op(existing_steps, steps_date, properties))
         else:
-            # Use interactive login (will prompt for MFA code if needed)
-            garmin.login()
-        
-        # Save tokens for future use if login was successful
-        if hasattr(garmin, 'garth') and garmin.garth:
-            # Make sure token store directory exists
-            os.makedirs(os.path.dirname(token_store), exist_ok=True)
-            garmin.garth.save(token_store)
-            print(f"Saved authentication tokens to {token_store}")
-        
-        return garmin
-    except Exception as e:
-        print(f"Error during Garmin login: {e}")
-        sys.exit(1)
+            ops.append(create_op(database_id, steps_date, properties))
+    plan = new_plan("daily-steps", ops)
+    if streaks:
+        plan["step_days"] = {s['calendarDate']: [s.get('totalSteps'), s.get('stepGoal')] for s in daily_steps
+                             if s.get('calendarDate') and s.get('totalSteps') is not None}
+    return plan
+
+def record_streaks(plan):
+    """
+    Fold the synced days into the stored streak state, up to the first day
+    whose write the deadline skipped or that failed; the next run catches up from there.
+    """
+    if "step_days" not in plan:
+        return
+    skipped = {op["key"] for op in plan.get("skipped") or []}
+    streaks = load_streaks()
+    for day, (steps, goal) in sorted(plan["step_days"].items()):
+        if day in skipped:
+            break
+        streaks.update(day, steps, goal)
+    save_streaks(streaks)
+    print("Steps: " + ", ".join(f"{name} {value}" for name, value in streaks.records().items()))
 
 def main():
     load_dotenv()
 
+    parser = argparse.ArgumentParser(description="Sync Garmin daily step counts to Notion")
+    add_plan_arguments(parser)
+    parser.add_argument("--date", action="append", metavar="YYYY-MM-DD",
+                        help="also sync this day, even today (repeatable); without --streaks only these days")
+    parser.add_argument("--streaks", action="store_true",
+                        help="also write goal streak, week/month totals and goal progress, "
+                             "catching up on days not seen since the last run")
+    args = parser.parse_args()
+
     # Get environment variables
     notion_token = os.getenv("NOTION_TOKEN")
     database_id = os.getenv("NOTION_STEPS_DB_ID")
 
-    # Login to Garmin with 2FA support
-    garmin = login_to_garmin()
-    
     # Initialize Notion client
-    client = Client(auth=notion_token)
+    client = shared_notion_client(notion_token)
 
-    # Get and process daily steps
-    daily_steps = get_all_daily_steps(garmin)
-    for steps in daily_steps:
-        steps_date = steps.get('calendarDate')
-        existing_steps = daily_steps_exist(client, database_id, steps_date)
-        if existing_steps:
-            if steps_need_update(existing_steps, steps):
-                update_daily_steps(client, existing_steps, steps)
-                print(f"Updated steps for {steps_date}")
+    def build_plan():
+        # Login to Garmin with 2FA support
+        garmin = login_to_garmin()
+        streaks = load_streaks() if args.streaks else None
+        startdate = catchup_start(streaks, today() - timedelta(days=1)) if streaks else None
+        if args.date:
+            # With streaks the missed days are still caught up, so the streak has no gap
+            by_day = {s.get('calendarDate'): s for s in
+                      (get_all_daily_steps(garmin, startdate) if streaks else [])
+                      + get_daily_steps_on(garmin, args.date)}
+            daily_steps = list(by_day.values())
         else:
-            create_daily_steps(client, database_id, steps)
-            print(f"Created new steps entry for {steps_date}")
+            daily_steps = get_all_daily_steps(garmin, startdate)
+        plan = plan_daily_steps(database_id, daily_steps, load_daily_steps_index(client, database_id),
+                                load_activity_links(client), streaks)
+        return add_rollups(plan, client, steps_facts(daily_steps))
+
+    def after_apply(plan):
+        record_rollups(plan)
+        record_streaks(plan)
+
+    run_plan_cli(args, client, build_plan, after_apply=after_apply)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
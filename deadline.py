@@ -0,0 +1,58 @@
+"""
+Per-call timeouts and a run deadline with cooperative cancellation.
+
+Every Notion call times out after NOTION_TIMEOUT seconds and every Garmin call
+after GARMIN_TIMEOUT seconds (both default 30). On top of that a run can get
+a deadline: --deadline SECONDS on any script or on sync-all2.py, or
+SYNC_DEADLINE in the environment. It is stored as an absolute time in
+SYNC_DEADLINE_AT, so scripts started by sync-all2.py share the orchestrator's
+budget instead of each getting a fresh one.
+
+Nothing is interrupted mid-call. Loops that do one unit of work at a time (a
+Notion write, a Garmin day or chunk, an activity body) check expired() first
+and stop cleanly; the work that was skipped is not recorded as done, so the
+next run picks it up.
+"""
+
+import os
+import time
+
+DEADLINE_ENV = "SYNC_DEADLINE_AT"
+DEFAULT_TIMEOUT = 30
+
+
+def add_deadline_argument(parser) -> None:
+    parser.add_argument("--deadline", type=float, metavar="SECONDS",
+                        help="stop cleanly once this many seconds have passed (default: SYNC_DEADLINE, if set)")
+
+
+def init_deadline(seconds: float = None) -> None:
+    """
+    Start the run's clock. An explicit value wins; otherwise SYNC_DEADLINE is
+    used unless a parent process already set SYNC_DEADLINE_AT.
+    """
+    if seconds is None and not os.getenv(DEADLINE_ENV) and os.getenv("SYNC_DEADLINE"):
+        seconds = float(os.getenv("SYNC_DEADLINE"))
+    if seconds is not None:
+        os.environ[DEADLINE_ENV] = str(time.time() + seconds)
+
+
+def remaining():
+    """
+    Seconds left before the deadline, or None without one.
+    """
+    at = os.getenv(DEADLINE_ENV)
+    return float(at) - time.time() if at else None
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def notion_timeout() -> float:
+    return float(os.getenv("NOTION_TIMEOUT", DEFAULT_TIMEOUT))
+
+
+def garmin_timeout() -> float:
+    return float(os.getenv("GARMIN_TIMEOUT", DEFAULT_TIMEOUT))
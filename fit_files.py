@@ -0,0 +1,474 @@
+"""
+Original FIT files for activities, cached locally and decoded into NumPy arrays.
+
+The activity summary from get_activities() has no streams, and the per-activity
+detail endpoints are slow and rate-limited. Instead each activity's original
+FIT file is downloaded once, cached under SYNC_STATE_DIR/fit/<activityId>.fit,
+and decoded by a small single-pass decoder: one precompiled struct per message
+definition, unpack_from straight out of the buffer (no slicing), and values
+appended to typed arrays that become NumPy arrays without copying. The file
+and header CRCs are checked first, so a truncated or corrupted download is
+rejected instead of decoded into garbage. Decoded streams are cached next to
+the file as .npz, so re-runs never decode twice.
+"""
+
+import io
+import os
+import struct
+import zipfile
+from array import array
+
+import numpy as np
+
+from sync_state import load_json, save_json, state_path
+
+# Seconds between the Unix epoch and the FIT epoch (1989-12-31T00:00:00Z)
+FIT_EPOCH = 631065600
+
+MESG_LAP = 19
+MESG_RECORD = 20
+FIELD_TIMESTAMP = 253
+
+# FIT base type -> (struct code, invalid value)
+BASE_TYPES = {
+    0x00: ("B", 0xFF), 0x01: ("b", 0x7F), 0x02: ("B", 0xFF), 0x0A: ("B", 0x00), 0x0D: ("B", 0xFF),
+    0x83: ("h", 0x7FFF), 0x84: ("H", 0xFFFF), 0x8B: ("H", 0x0000),
+    0x85: ("i", 0x7FFFFFFF), 0x86: ("I", 0xFFFFFFFF), 0x8C: ("I", 0x00000000),
+    0x88: ("f", None), 0x89: ("d", None),
+    0x8E: ("q", 0x7FFFFFFFFFFFFFFF), 0x8F: ("Q", 0xFFFFFFFFFFFFFFFF), 0x90: ("Q", 0),
+}
+
+# message -> {field number: (name, scale, offset)}; everything else is skipped
+RECORD_FIELDS = {
+    FIELD_TIMESTAMP: ("time", 1, 0),
+    2: ("altitude", 5, 500),
+    78: ("enhanced_altitude", 5, 500),
+    3: ("heart_rate", 1, 0),
+    4: ("cadence", 1, 0),
+    5: ("distance", 100, 0),
+    6: ("speed", 1000, 0),
+    73: ("enhanced_speed", 1000, 0),
+    7: ("power", 1, 0),
+}
+LAP_FIELDS = {
+    2: ("start_time", 1, 0),
+    7: ("total_elapsed_time", 1000, 0),
+    8: ("total_timer_time", 1000, 0),
+    9: ("total_distance", 100, 0),
+    13: ("avg_speed", 1000, 0),
+    110: ("enhanced_avg_speed", 1000, 0),
+    15: ("avg_heart_rate", 1, 0),
+    16: ("max_heart_rate", 1, 0),
+    19: ("avg_power", 1, 0),
+    21: ("total_ascent", 1, 0),
+}
+WANTED = {MESG_RECORD: RECORD_FIELDS, MESG_LAP: LAP_FIELDS}
+
+STREAMS = ("time", "heart_rate", "power", "speed", "altitude", "distance", "cadence")
+
+# Samples further apart than this are a pause; only this much of the gap counts as time in zone
+MAX_SAMPLE_GAP = 10.0
+
+
+def _crc_table() -> list:
+    # CRC-16 (polynomial 0xA001, reflected) as used by FIT, one entry per byte value
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC_TABLE = _crc_table()
+
+
+class FitError(Exception):
+    pass
+
+
+# -----------------------------
+# Decoding
+# -----------------------------
+def fit_crc(data, crc: int = 0) -> int:
+    table = CRC_TABLE
+    for byte in bytes(data):
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def check_crc(buf, header_size: int, data_size: int) -> None:
+    """
+    Raise FitError unless the header CRC (when the header has one) and the
+    file CRC after the data records match.
+    """
+    if header_size >= 14:
+        header_crc = struct.unpack_from("<H", buf, 12)[0]
+        if header_crc and header_crc != fit_crc(buf[:12]):
+            raise FitError("header CRC mismatch")
+    end = header_size + data_size
+    if len(buf) < end + 2:
+        raise FitError(f"file truncated: {len(buf)} of {end + 2} bytes")
+    if struct.unpack_from("<H", buf, end)[0] != fit_crc(buf[:end]):
+        raise FitError("file CRC mismatch")
+
+
+def _compile(endian: str, fields: list, dev_size: int, global_num: int):
+    """
+    One struct for a whole data message: wanted fields get their type code,
+    everything else (and developer fields) becomes padding.
+    """
+    wanted = WANTED.get(global_num, {})
+    fmt = [endian]
+    picked = []
+    timestamp_index = None
+    for num, size, base in fields:
+        code, invalid = BASE_TYPES.get(base, (None, None))
+        if code and struct.calcsize(code) == size and (num in wanted or num == FIELD_TIMESTAMP):
+            if num == FIELD_TIMESTAMP:
+                timestamp_index = len(picked)
+            picked.append((num, invalid))
+            fmt.append(code)
+        else:
+            fmt.append(f"{size}x")
+    if dev_size:
+        fmt.append(f"{dev_size}x")
+    return struct.Struct("".join(fmt)), picked, timestamp_index
+
+
+def decode_fit(data) -> dict:
+    """
+    Decode record and lap messages from FIT bytes.
+    Returns {"streams": {name: ndarray}, "laps": [dict, ...]}.
+    """
+    buf = memoryview(data)
+    if len(buf) < 12:
+        raise FitError("file too short")
+    header_size = buf[0]
+    data_size = struct.unpack_from("<I", buf, 4)[0]
+    if bytes(buf[8:12]) != b".FIT":
+        raise FitError("missing .FIT signature")
+    check_crc(buf, header_size, data_size)
+
+    columns = {name: array("d") for name, _, _ in RECORD_FIELDS.values()}
+    laps = []
+    definitions = {}
+    last_ts = 0
+    pos = header_size
+    end = header_size + data_size
+
+    while pos < end:
+        header = buf[pos]
+        pos += 1
+
+        if header & 0x80:
+            # Compressed timestamp header: 5-bit offset from the last full timestamp
+            local = (header >> 5) & 0x03
+            offset = header & 0x1F
+            ts = (last_ts & ~0x1F) + offset
+            if offset < (last_ts & 0x1F):
+                ts += 0x20
+            last_ts = ts
+            compressed_ts = ts
+        elif header & 0x40:
+            local = header & 0x0F
+            endian = ">" if buf[pos + 1] == 1 else "<"
+            global_num = struct.unpack_from(endian + "H", buf, pos + 2)[0]
+            count = buf[pos + 4]
+            pos += 5
+            fields = [(buf[pos + 3 * i], buf[pos + 3 * i + 1], buf[pos + 3 * i + 2]) for i in range(count)]
+            pos += 3 * count
+            dev_size = 0
+            if header & 0x20:
+                dev_count = buf[pos]
+                pos += 1
+                dev_size = sum(buf[pos + 3 * i + 1] for i in range(dev_count))
+                pos += 3 * dev_count
+            definitions[local] = (global_num, *_compile(endian, fields, dev_size, global_num))
+            continue
+        else:
+            local = header & 0x0F
+            compressed_ts = None
+
+        try:
+            global_num, layout, picked, ts_index = definitions[local]
+        except KeyError:
+            raise FitError(f"data message for undefined local type {local} at byte {pos - 1}")
+        values = layout.unpack_from(buf, pos)
+        pos += layout.size
+
+        if ts_index is not None and values[ts_index] != 0xFFFFFFFF:
+            last_ts = values[ts_index]
+
+        wanted = WANTED.get(global_num)
+        if wanted is None:
+            continue
+
+        if global_num == MESG_RECORD:
+            seen = set()
+            for (num, invalid), value in zip(picked, values):
+                name, scale, offset = RECORD_FIELDS[num]
+                columns[name].append(np.nan if value == invalid else value / scale - offset)
+                seen.add(name)
+            if compressed_ts is not None and "time" not in seen:
+                columns["time"].append(compressed_ts)
+                seen.add("time")
+            # Keep every column the same length as the time column
+            for name, column in columns.items():
+                if name not in seen:
+                    column.append(np.nan)
+        else:
+            lap = {}
+            for (num, invalid), value in zip(picked, values):
+                if num in LAP_FIELDS and value != invalid:
+                    name, scale, offset = LAP_FIELDS[num]
+                    lap[name] = value / scale - offset
+            laps.append(lap)
+
+    raw = {name: np.frombuffer(column, dtype=np.float64) for name, column in columns.items()}
+    streams = {
+        "time": raw["time"] + FIT_EPOCH,
+        "heart_rate": raw["heart_rate"],
+        "power": raw["power"],
+        "speed": np.where(np.isnan(raw["enhanced_speed"]), raw["speed"], raw["enhanced_speed"]),
+        "altitude": np.where(np.isnan(raw["enhanced_altitude"]), raw["altitude"], raw["enhanced_altitude"]),
+        "distance": raw["distance"],
+        "cadence": raw["cadence"],
+    }
+    return {"streams": streams, "laps": laps}
+
+
+# -----------------------------
+# Download and cache
+# -----------------------------
+def fit_path(activity_id) -> str:
+    return state_path("fit", f"{activity_id}.fit")
+
+
+def _extract_fit(payload: bytes) -> bytes:
+    # Garmin wraps the original upload in a zip; manual uploads may be bare .fit
+    if payload[:2] != b"PK":
+        return payload
+    with zipfile.ZipFile(io.BytesIO(payload)) as zf:
+        names = [n for n in zf.namelist() if n.lower().endswith(".fit")]
+        if not names:
+            raise FitError("no .fit file in the original download (GPX/TCX upload?)")
+        return zf.read(names[0])
+
+
+def download_fit(garmin, activity_id) -> str:
+    """
+    Path of the cached original FIT file, downloading it on first use.
+    """
+    path = fit_path(activity_id)
+    if not os.path.exists(path):
+        payload = garmin.download_activity(activity_id, dl_fmt=garmin.ActivityDownloadFormat.ORIGINAL)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_extract_fit(payload))
+        os.replace(tmp, path)
+        print(f"Downloaded FIT for activity {activity_id}")
+    return path
+
+
+def _streams_path(activity_id) -> str:
+    return state_path("fit", f"{activity_id}.npz")
+
+
+def has_local_streams(activity_id) -> bool:
+    return os.path.exists(_streams_path(activity_id)) or os.path.exists(fit_path(activity_id))
+
+
+def load_activity_streams(garmin, activity_id) -> dict:
+    """
+    Decoded streams and laps for an activity, from the .npz cache when present,
+    otherwise from the (downloaded once) FIT file.
+    """
+    cache = _streams_path(activity_id)
+    if os.path.exists(cache):
+        with np.load(cache, allow_pickle=False) as data:
+            streams = {name: data[name] for name in STREAMS}
+            lap_keys = list(data["lap_keys"])
+            laps = [{k: float(v) for k, v in zip(lap_keys, row) if not np.isnan(v)} for row in data["laps"]]
+        return {"streams": streams, "laps": laps}
+
+    path = download_fit(garmin, activity_id)
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        decoded = decode_fit(data)
+    except FitError:
+        # A damaged download is fetched again next time instead of failing forever
+        os.remove(path)
+        raise
+
+    lap_keys = [name for name, _, _ in LAP_FIELDS.values()]
+    lap_table = np.array([[lap.get(k, np.nan) for k in lap_keys] for lap in decoded["laps"]],
+                         dtype=np.float64).reshape(-1, len(lap_keys))
+    np.savez_compressed(cache, lap_keys=np.array(lap_keys), laps=lap_table, **decoded["streams"])
+    return decoded
+
+
+# -----------------------------
+# Derived metrics
+# -----------------------------
+def _nanstat(fn, values):
+    values = values[~np.isnan(values)] if len(values) else values
+    return float(fn(values)) if len(values) else None
+
+
+def normalized_power(time, power):
+    """
+    30-second rolling mean of power, to the fourth power, averaged, fourth root.
+    Assumes roughly 1 s recording; gaps are filled with zeros.
+    """
+    valid = ~np.isnan(power)
+    if valid.sum() < 30:
+        return None
+    t = (time[valid] - time[valid][0]).astype(np.int64)
+    per_second = np.zeros(t[-1] + 1)
+    per_second[t] = power[valid]
+    rolling = np.convolve(per_second, np.ones(30) / 30, mode="valid")
+    return float(np.mean(rolling ** 4) ** 0.25)
+
+
+def elevation_gain(altitude, window: int = 5):
+    """
+    Total ascent after a short moving average, so barometric noise does not add up.
+    """
+    alt = altitude[~np.isnan(altitude)]
+    if len(alt) < 2:
+        return None
+    if len(alt) > window:
+        alt = np.convolve(alt, np.ones(window) / window, mode="valid")
+    steps = np.diff(alt)
+    return float(steps[steps > 0].sum())
+
+
+def best_effort_seconds(time, distance, meters: float):
+    """
+    Fastest time to cover `meters` anywhere in the activity (e.g. best 5K
+    inside a 10K run), or None if the activity is shorter.
+    """
+    valid = ~np.isnan(time) & ~np.isnan(distance)
+    if valid.sum() < 2:
+        return None
+    t, d = time[valid], np.maximum.accumulate(distance[valid])
+    if d[-1] - d[0] < meters:
+        return None
+    # For every start sample, the first sample at least `meters` further on
+    end = np.searchsorted(d, d + meters)
+    reachable = end < len(d)
+    durations = t[end[reachable]] - t[reachable]
+    return float(durations.min()) if len(durations) else None
+
+
+def best_average_power(time, power, seconds: int):
+    """
+    Highest mean power over any `seconds` window (1 s resampled, gaps count as zero).
+    """
+    valid = ~np.isnan(power)
+    if valid.sum() < seconds:
+        return None
+    t = (time[valid] - time[valid][0]).astype(np.int64)
+    per_second = np.zeros(t[-1] + 1)
+    per_second[t] = power[valid]
+    if len(per_second) < seconds:
+        return None
+    sums = np.cumsum(np.concatenate(([0.0], per_second)))
+    return float((sums[seconds:] - sums[:-seconds]).max() / seconds)
+
+
+def stream_metrics(streams: dict) -> dict:
+    """
+    Activity metrics computed purely from local streams.
+    """
+    hr, power, speed = streams["heart_rate"], streams["power"], streams["speed"]
+    return {
+        "avg_hr": _nanstat(np.mean, hr),
+        "max_hr": _nanstat(np.max, hr),
+        "avg_power": _nanstat(np.mean, power),
+        "max_power": _nanstat(np.max, power),
+        "normalized_power": normalized_power(streams["time"], power),
+        "max_speed": _nanstat(np.max, speed),
+        "elevation_gain": elevation_gain(streams["altitude"]),
+    }
+
+
+def _zones_file() -> str:
+    return state_path("fit", "hr_zones.json")
+
+
+def remember_zone_boundaries(hr_zones: list) -> None:
+    """
+    Keep the lower bound of each HR zone from a Garmin get_activity_hr_in_timezones()
+    answer, so zones can later be computed from FIT streams alone.
+    """
+    bounds = sorted((z["zoneNumber"], z["zoneLowBoundary"]) for z in hr_zones or []
+                    if z.get("zoneNumber") is not None and z.get("zoneLowBoundary") is not None)
+    if bounds and bounds != [tuple(b) for b in load_zone_boundaries()]:
+        save_json(_zones_file(), bounds)
+
+
+def load_zone_boundaries() -> list:
+    """
+    [(zone number, lower bound bpm)] last seen from Garmin; HR_ZONES (comma
+    list of lower bounds, e.g. "98,117,137,156,176") overrides them.
+    """
+    if os.getenv("HR_ZONES"):
+        return [(i, int(b)) for i, b in enumerate(os.getenv("HR_ZONES").split(","), start=1)]
+    return [tuple(b) for b in load_json(_zones_file(), []) or []]
+
+
+def hr_zones(streams: dict, boundaries: list) -> list:
+    """
+    Time in each HR zone from the heart-rate stream, in the shape of
+    get_activity_hr_in_timezones(). Each sample counts until the next one,
+    at most MAX_SAMPLE_GAP seconds; time below zone 1 is left out like Garmin does.
+    """
+    time, hr = streams["time"], streams["heart_rate"]
+    if not boundaries or len(time) < 2:
+        return []
+    seconds = np.minimum(np.diff(time), MAX_SAMPLE_GAP)
+    hr = hr[:-1]
+    valid = ~np.isnan(hr) & (seconds > 0)
+    lows = np.array([low for _, low in boundaries], dtype=np.float64)
+    # Zone index of every sample: -1 below zone 1
+    zone = np.searchsorted(lows, hr[valid], side="right") - 1
+    totals = np.bincount(zone[zone >= 0], weights=seconds[valid][zone >= 0], minlength=len(lows))
+    return [{"zoneNumber": number, "secsInZone": round(float(total)), "zoneLowBoundary": low}
+            for (number, low), total in zip(boundaries, totals)]
+
+
+def fit_properties(streams: dict) -> dict:
+    """
+    Notion properties for the stream metrics that the FIT file actually had.
+    """
+    metrics = stream_metrics(streams)
+    columns = {
+        "Avg HR": "avg_hr",
+        "Max HR": "max_hr",
+        "Avg Power (W)": "avg_power",
+        "Normalized Power (W)": "normalized_power",
+        "Elevation Gain (m)": "elevation_gain",
+    }
+    return {name: {"number": round(metrics[key])} for name, key in columns.items() if metrics[key] is not None}
+
+
+def laps_as_splits(laps: list) -> dict:
+    """
+    FIT laps in the shape of get_activity_splits(), so page bodies can be built
+    without another Garmin call.
+    """
+    return {"lapDTOs": [
+        {
+            "lapIndex": i,
+            "distance": lap.get("total_distance"),
+            "duration": lap.get("total_timer_time") or lap.get("total_elapsed_time"),
+            "averageSpeed": lap.get("enhanced_avg_speed") or lap.get("avg_speed"),
+            "averageHR": lap.get("avg_heart_rate"),
+            "elevationGain": lap.get("total_ascent"),
+        }
+        for i, lap in enumerate(laps, start=1)
+    ]}
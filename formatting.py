@@ -0,0 +1,263 @@
+"""
+Units and display formatting shared by all sync scripts.
+
+One place for pace, duration and clock-time text so every script rounds the
+same way: durations and paces are rounded to the nearest whole second before
+they are split into h/m/s (the old per-script helpers mixed integer division,
+float division and truncation).
+
+Batched *_array variants take NumPy arrays for backfills; the digit table is
+precomputed so formatting thousands of values is mostly list indexing.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pytz
+
+METERS_PER_KM = 1000.0
+METERS_PER_MILE = 1609.344
+FEET_PER_METER = 3.28084
+
+UNITS = {
+    # system -> (meters per distance unit, distance label, elevation factor, elevation label)
+    "metric": (METERS_PER_KM, "km", 1.0, "m"),
+    "imperial": (METERS_PER_MILE, "mi", FEET_PER_METER, "ft"),
+}
+
+# locale -> (thousands separator, decimal separator)
+LOCALES = {
+    "en": (",", "."),
+    "de": (".", ","),
+    "fr": (" ", ","),
+    "nl": (".", ","),
+}
+
+# "00" .. "59", indexed by value
+TWO_DIGITS = [f"{i:02d}" for i in range(60)]
+
+
+# -----------------------------
+# Time zones
+# -----------------------------
+@lru_cache(maxsize=None)
+def get_tz(name: str):
+    """
+    pytz zone object for a name, built once per process.
+    """
+    return pytz.timezone(name)
+
+
+def _zone_offset(tz_name: str, epoch_seconds: int) -> int:
+    return int(datetime.fromtimestamp(epoch_seconds, get_tz(tz_name)).utcoffset().total_seconds())
+
+
+@lru_cache(maxsize=65536)
+def _hour_offset(tz_name: str, epoch_hour: int):
+    # One offset for the whole UTC hour, or None when it changes within it
+    # (zones such as Australia/Lord_Howe or historic LMT offsets switch off the hour)
+    first = _zone_offset(tz_name, epoch_hour * 3600)
+    return first if _zone_offset(tz_name, epoch_hour * 3600 + 3599) == first else None
+
+
+def utc_offset(tz_name: str, epoch_seconds: int) -> int:
+    """
+    UTC offset in seconds of tz_name at an epoch second, cached per hour.
+    """
+    offset = _hour_offset(tz_name, epoch_seconds // 3600)
+    return _zone_offset(tz_name, epoch_seconds) if offset is None else offset
+
+
+def localize(dt: datetime, tz_name: str) -> datetime:
+    """
+    Attach tz_name to a naive datetime (assumed local), or convert an aware one.
+    """
+    tz = get_tz(tz_name)
+    return tz.localize(dt) if dt.tzinfo is None else dt.astimezone(tz)
+
+
+def format_local_time(value, tz_name: str, fmt: str = "%H:%M", default: str = "Unknown") -> str:
+    """
+    HH:MM (or fmt) in tz_name for an epoch-milliseconds timestamp or a Garmin
+    ISO string. Naive ISO strings are taken to be local time already.
+    """
+    if not value:
+        return default
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value / 1000, get_tz(tz_name)).strftime(fmt)
+        dt = datetime.fromisoformat(str(value).replace("Z", ""))
+        return localize(dt, tz_name).strftime(fmt)
+    except Exception:
+        return default
+
+
+# -----------------------------
+# Numbers and units
+# -----------------------------
+def _separators(locale: str):
+    return LOCALES.get((locale or "en")[:2].lower(), LOCALES["en"])
+
+
+def format_int(value, locale: str = "en") -> str:
+    """
+    Rounded integer with a thousands separator, e.g. 12,345 (en) or 12.345 (de).
+    """
+    thousands, _ = _separators(locale)
+    return f"{round(value):,}".replace(",", thousands)
+
+
+def format_decimal(value, digits: int = 2, locale: str = "en") -> str:
+    thousands, decimal = _separators(locale)
+    text = f"{value:,.{digits}f}"
+    return text.replace(",", "\0").replace(".", decimal).replace("\0", thousands)
+
+
+def distance(meters, units: str = "metric", digits: int = 2) -> float:
+    """
+    Meters to km or miles, rounded. Missing values count as 0.
+    """
+    try:
+        return round((meters or 0) / UNITS[units][0], digits)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def km(meters) -> float:
+    return distance(meters, "metric")
+
+
+def minutes(seconds) -> float:
+    try:
+        return round((seconds or 0) / 60.0, 2)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def elevation(meters, units: str = "metric") -> int:
+    return int((meters or 0) * UNITS[units][2])
+
+
+def format_elevation(meters, units: str = "metric", locale: str = "en") -> str:
+    return f"{format_int(elevation(meters, units), locale)} {UNITS[units][3]}"
+
+
+# -----------------------------
+# Durations and paces
+# -----------------------------
+def split_seconds(seconds):
+    """
+    (hours, minutes, seconds) of a duration rounded to the nearest second.
+    """
+    total = int(round(seconds or 0))
+    hours, rest = divmod(total, 3600)
+    mins, secs = divmod(rest, 60)
+    return hours, mins, secs
+
+
+def format_clock(seconds, decimals: int = 0, locale: str = "en") -> str:
+    """
+    Race-clock text: m:ss below an hour, h:mm:ss above. With decimals > 0 the
+    seconds keep that many decimals (m:ss.ss), as Garmin shows for short efforts.
+    """
+    seconds = seconds or 0
+    if decimals:
+        _, decimal = _separators(locale)
+        hours = int(seconds // 3600)
+        mins = int((seconds % 3600) // 60)
+        secs = round(seconds % 60, decimals)
+        text = f"{secs:0{3 + decimals}.{decimals}f}".replace(".", decimal)
+        return f"{hours}:{mins:02d}:{text}" if hours else f"{mins}:{text}"
+
+    hours, mins, secs = split_seconds(seconds)
+    if hours:
+        return f"{hours}:{TWO_DIGITS[mins]}:{TWO_DIGITS[secs]}"
+    return f"{mins}:{TWO_DIGITS[secs]}"
+
+
+def format_duration(seconds, locale: str = "en") -> str:
+    """
+    Coarse duration like '7h 5m' (whole minutes, truncated), as used for sleep stages.
+    """
+    total_minutes = int(seconds or 0) // 60
+    return f"{format_int(total_minutes // 60, locale)}h {total_minutes % 60}m"
+
+
+def pace_seconds(speed_mps, units: str = "metric"):
+    """
+    Seconds per km (or mile) for a speed in m/s, or None if the speed is invalid.
+    """
+    if not speed_mps or speed_mps <= 0:
+        return None
+    return UNITS[units][0] / speed_mps
+
+
+def format_pace(speed_mps, units: str = "metric", suffix: str = "min/{unit}",
+                decimals: int = 0, locale: str = "en") -> str:
+    """
+    'mm:ss min/km' (or min/mi) pace text for a speed in m/s; '' if the speed is invalid.
+    """
+    per_unit = pace_seconds(speed_mps, units)
+    if per_unit is None:
+        return ""
+    return f"{format_clock(per_unit, decimals, locale)} {suffix.format(unit=UNITS[units][1])}".rstrip()
+
+
+def format_pace_for_effort(total_seconds, meters, units: str = "metric", suffix: str = "/{unit}",
+                           decimals: int = 0, locale: str = "en") -> str:
+    """
+    Average pace of an effort that covered `meters` in `total_seconds`, e.g. '4:52 /km'.
+    """
+    if not meters or not total_seconds:
+        return ""
+    per_unit = round(total_seconds) * UNITS[units][0] / meters
+    return f"{format_clock(per_unit, decimals, locale)} {suffix.format(unit=UNITS[units][1])}".rstrip()
+
+
+# -----------------------------
+# Batched versions (backfills)
+# -----------------------------
+def split_seconds_array(seconds):
+    """
+    Vectorised split_seconds: (hours, minutes, seconds) int64 arrays.
+    """
+    total = np.rint(np.nan_to_num(np.asarray(seconds, dtype=np.float64))).astype(np.int64)
+    hours, rest = np.divmod(total, 3600)
+    mins, secs = np.divmod(rest, 60)
+    return hours, mins, secs
+
+
+def format_clock_array(seconds) -> list:
+    hours, mins, secs = split_seconds_array(seconds)
+    return [
+        f"{h}:{TWO_DIGITS[m]}:{TWO_DIGITS[s]}" if h else f"{m}:{TWO_DIGITS[s]}"
+        for h, m, s in zip(hours.tolist(), mins.tolist(), secs.tolist())
+    ]
+
+
+def format_pace_array(speed_mps, units: str = "metric", suffix: str = "min/{unit}") -> list:
+    """
+    Vectorised format_pace; invalid speeds give ''.
+    """
+    speed = np.asarray(speed_mps, dtype=np.float64)
+    valid = np.isfinite(speed) & (speed > 0)
+    per_unit = np.where(valid, UNITS[units][0] / np.where(valid, speed, 1.0), 0.0)
+    label = suffix.format(unit=UNITS[units][1])
+    clocks = format_clock_array(per_unit)
+    return [f"{c} {label}".rstrip() if ok else "" for c, ok in zip(clocks, valid.tolist())]
+
+
+def distance_array(meters, units: str = "metric", digits: int = 2):
+    return np.round(np.nan_to_num(np.asarray(meters, dtype=np.float64)) / UNITS[units][0], digits)
+
+
+def format_local_time_array(epoch_ms, tz_name: str, fmt: str = "%H:%M") -> list:
+    """
+    Batched format_local_time for epoch milliseconds. UTC offsets come from
+    utc_offset's per-hour cache instead of one tz lookup per value.
+    """
+    seconds = np.asarray(epoch_ms, dtype=np.int64) // 1000
+    local = seconds + np.array([utc_offset(tz_name, s) for s in seconds.tolist()], dtype=np.int64)
+    stamps = local.astype("datetime64[s]").tolist()
+    return [dt.strftime(fmt) for dt in stamps]
@@ -1,106 +1,95 @@
 # activities-data.py
-from datetime import datetime
-from garminconnect import Garmin
+import argparse
 from notion_client import Client
 from dotenv import load_dotenv, dotenv_values
-import pytz
 import os
 import sys
 
+from activity_archive import archive_entry, record_archive
+from activity_dedupe import drop_duplicates
+from autotune import measure, tuned
+from deadline import expired
+from fit_files import (fit_properties, has_local_streams, hr_zones, laps_as_splits, load_activity_streams,
+                       load_zone_boundaries, remember_zone_boundaries)
+from formatting import format_local_time, format_pace, km, minutes
+from garmin_session import login_to_garmin
+from gear import add_gear, record_gear
+from local_dates import activity_day, sync_tz_name
+from notion_blocks import activity_body_blocks, body_hash, load_body_hashes, record_body_hashes
+from notion_index import load_index
+from relations import activity_key, activity_page_key
+from rollups import activity_facts, add_rollups, record_rollups
+from sync_plan import PAST_TENSE, add_plan_arguments, apply_op, body_op, create_op, new_plan, run_plan_cli, update_op
+from transport import shared_notion_client
+
 # -----------------------------
 # Constants / Config
 # -----------------------------
-# London timezone as requested
-local_tz = pytz.timezone("Europe/London")
-
-# Load environment variables
+# Load environment variables (SYNC_TIMEZONE is read when needed, see local_dates.py)
 load_dotenv()
 CONFIG = dotenv_values()
 
 # Use your provided Activities DB ID, but allow override via env NOTION_DB_ID
 DEFAULT_NOTION_ACTIVITIES_DB = "244ef489a270818c9872d834c5f30430"
 
+# How many of the most recent activities each run checks
+RECENT_ACTIVITIES = 30
+
 # -----------------------------
 # Helpers
 # -----------------------------
-def format_pace(average_speed_mps: float) -> str:
+def fmt_dt_readable(iso_str: str) -> str:
     """
-    Convert speed (m/s) to mm:ss per km pace text. Returns "" if speed is invalid.
+    Convert an ISO GMT/Local time from Garmin into a local HH:MM string, if possible.
+    Naive strings are treated as local time already. Fallback to 'Unknown'.
     """
-    if not average_speed_mps or average_speed_mps <= 0:
-        return ""
-    # pace (min/km) = 1000 meters / (speed m/s) / 60
-    pace_min = 1000.0 / (average_speed_mps * 60.0)
-    minutes = int(pace_min)
-    seconds = int(round((pace_min - minutes) * 60))
-    if seconds == 60:
-        minutes += 1
-        seconds = 0
-    return f"{minutes}:{seconds:02d} min/km"
+    return format_local_time(iso_str, sync_tz_name())
 
-def fmt_dt_readable(iso_str: str) -> str:
+def get_recent_activities(garmin, count: int = RECENT_ACTIVITIES) -> list:
     """
-    Convert an ISO GMT/Local time from Garmin into a local (London) HH:MM string, if possible.
-    Fallback to original or 'Unknown'.
+    The latest `count` activities, newest first, fetched in pages of the tuned
+    garmin.activities_page size (see autotune.py).
     """
-    if not iso_str:
-        return "Unknown"
-    try:
-        # Garmin returns e.g. '2025-08-05T07:12:34.0' (local) or '2025-08-05T06:12:34.0' (GMT)
-        # Try parse with fromisoformat; assume naive is local time already
-        dt = datetime.fromisoformat(iso_str.replace("Z", "").replace("000Z", ""))
-        if dt.tzinfo is None:
-            # Treat as naive local time, attach local tz
-            dt = local_tz.localize(dt)
-        # Convert to local_tz explicitly (no-op if already local)
-        dt_local = dt.astimezone(local_tz)
-        return dt_local.strftime("%H:%M")
-    except Exception:
-        return "Unknown"
-
-def km(distance_meters) -> float:
-    try:
-        return round((distance_meters or 0) / 1000.0, 2)
-    except Exception:
-        return 0.0
+    activities = []
+    while len(activities) < count:
+        limit = min(tuned("garmin.activities_page"), count - len(activities))
+        with measure("garmin.activities_page"):
+            page = garmin.get_activities(len(activities), limit) or []
+        activities += page
+        if len(page) < limit:
+            break
+    return activities
 
-def minutes(duration_seconds) -> float:
-    try:
-        return round((duration_seconds or 0) / 60.0, 2)
-    except Exception:
-        return 0.0
+def get_activities_on(garmin, days: list, activity_ids: list = None) -> list:
+    """
+    Activities on the given calendar days, optionally only those with the given IDs
+    (targeted syncs, see push_sync.py).
+    """
+    activities = []
+    for day in sorted(set(days)):
+        activities += garmin.get_activities_by_date(day, day) or []
+    if activity_ids:
+        wanted = set(activity_ids)
+        activities = [a for a in activities if str(a.get("activityId")) in wanted]
+    return activities
 
 # -----------------------------
 # Notion helpers
 # -----------------------------
-def activity_exists(client: Client, database_id: str, date_iso: str, activity_name: str):
-    """
-    Checks if an activity row already exists for the same date and name.
-    Assumes:
-      - Date property is named 'Date' (date)
-      - Title property is 'Activity Name'
-    """
-    query = client.databases.query(
-        database_id=database_id,
-        filter={
-            "and": [
-                {"property": "Date", "date": {"equals": date_iso.split("T")[0]}},
-                {"property": "Activity Name", "title": {"equals": activity_name or ""}},
-            ]
-        }
-    )
-    results = query.get("results", [])
-    return results[0] if results else None
-
-def upsert_activity(client: Client, database_id: str, a: dict):
-    """
-    Creates (or updates) a Notion page for a Garmin activity dict.
+def load_activity_index(client: Client, database_id: str) -> dict:
+    """
+    Reads the whole Activities DB once, keyed like activity_key().
+    """
+    return load_index(client, database_id, activity_page_key)
+
+def activity_properties(a: dict) -> dict:
+    """
+    Notion properties payload for a Garmin activity dict.
     Expects Garmin activity fields similar to garminconnect get_activities().
     """
     # Extract fields
-    start_gmt = a.get("startTimeGMT") or a.get("startTimeLocal")
     start_local_readable = fmt_dt_readable(a.get("startTimeLocal") or a.get("startTimeGMT"))
-    date_for_notion = (a.get("startTimeGMT") or a.get("startTimeLocal") or "")[:10]
+    date_for_notion = activity_day(a) or ""
     name = a.get("activityName") or "Unnamed Activity"
     type_key = (a.get("activityType") or {}).get("typeKey", "Unknown").replace("_", " ").title()
     dist_km = km(a.get("distance"))
@@ -108,12 +97,8 @@ def upsert_activity(client: Client, database_id: str, a: dict):
     cals = round(a.get("calories") or 0)
     pace_txt = format_pace(a.get("averageSpeed"))
 
-
-    # Does it already exist?
-    existing = activity_exists(client, database_id, start_gmt or date_for_notion, name)
-
     # Build properties payload
-    props = {
+    return {
         "Date": {"date": {"start": date_for_notion}},
         #"Start": {"rich_text": [{"text": {"content": start_local_readable}}]},
    
@@ -128,94 +113,206 @@ def upsert_activity(client: Client, database_id: str, a: dict):
 
     }
 
-    if existing:
-        client.pages.update(page_id=existing["id"], properties=props)
-        print(f"Updated: {date_for_notion} · {name}")
-    else:
-        client.pages.create(parent={"database_id": database_id}, properties=props, icon={"emoji": "🏃"})
-        print(f"Created: {date_for_notion} · {name}")
+def props_name(props: dict) -> str:
+    return props["Activity Name"]["title"][0]["text"]["content"]
 
-# -----------------------------
-# Garmin login (token store like sleep-data.py)
-# -----------------------------
-def login_to_garmin():
-    garmin_email = os.getenv("GARMIN_EMAIL")
-    garmin_password = os.getenv("GARMIN_PASSWORD")
-    token_store = os.getenv("GARMIN_TOKEN_STORE", "~/.garmin_tokens")
-    token_store = os.path.expanduser(token_store)
-    mfa_code = os.getenv("GARMIN_MFA_CODE")  # Optional, for non-interactive 2FA
-
-    if not garmin_email or not garmin_password:
-        print("Missing GARMIN_EMAIL or GARMIN_PASSWORD")
-        sys.exit(1)
+def find_existing(index: dict, a: dict, props: dict):
+    """
+    The Notion row for an activity, if any. Rows written before local-day
+    bucketing used the GMT date, so that key is tried as well.
+    """
+    existing = index.get(activity_key(props["Date"]["date"]["start"], props_name(props)))
+    if not existing:
+        legacy_key = activity_key((a.get("startTimeGMT") or a.get("startTimeLocal") or "")[:10], props_name(props))
+        existing = index.get(legacy_key)
+    return existing
 
-    garmin = Garmin(garmin_email, garmin_password)
+def plan_activity(database_id: str, a: dict, index: dict, extra_properties: dict = None):
+    """
+    Create/update operation for one activity, or None if Notion is already up to date.
+    """
+    props = activity_properties(a)
+    if extra_properties:
+        props.update(extra_properties)
+    key = activity_key(props["Date"]["date"]["start"], props_name(props))
 
-    try:
-        if os.path.exists(token_store):
-            print(f"Using stored tokens from {token_store}")
-            garmin.login(tokenstore=token_store)
-            return garmin
-
-        if mfa_code:
-            print("Using non-interactive 2FA flow")
-            client_state, _ = garmin.login(return_on_mfa=True)
-            if client_state == "needs_mfa":
-                garmin.resume_login(client_state, mfa_code)
-            else:
-                print("MFA was expected but not requested (continuing).")
+    # Does it already exist?
+    existing = find_existing(index, a, props)
+    if existing:
+        return update_op(existing, key, props)
+    return create_op(database_id, key, props, icon={"emoji": "🏃"})
+
+def plan_activity_body(garmin, a: dict, op, existing, body_hashes: dict, streams: dict = None):
+    """
+    Splits/laps page body for one activity. New pages get the blocks inside their
+    create operation; existing pages get a "body" operation, but only when the
+    hash of the split data differs from the one last written. With decoded FIT
+    streams the laps and HR zones come from the file and no Garmin calls are
+    made (once the zone bounds are known, see fit_files.load_zone_boundaries).
+    """
+    activity_id = a.get("activityId")
+    if not activity_id:
+        return None
+    known = body_hashes.get(str(activity_id))
+    # Unchanged activity whose body was already written: no Garmin calls needed
+    if existing and known and not op:
+        return None
+
+    if streams:
+        splits, boundaries = laps_as_splits(streams["laps"]), load_zone_boundaries()
+        if boundaries or not garmin:
+            zones = hr_zones(streams["streams"], boundaries)
         else:
-            garmin.login()
+            # Zone bounds are only known to Garmin; fetched once, then remembered
+            zones = garmin.get_activity_hr_in_timezones(activity_id)
+            remember_zone_boundaries(zones)
+    else:
+        splits = garmin.get_activity_splits(activity_id)
+        zones = garmin.get_activity_hr_in_timezones(activity_id)
+        remember_zone_boundaries(zones)
+    new_hash = body_hash(a, splits, zones)
+    if existing and new_hash == known:
+        return None
 
-        if hasattr(garmin, "garth") and garmin.garth:
-            os.makedirs(os.path.dirname(token_store), exist_ok=True)
-            garmin.garth.save(token_store)
-            print(f"Saved authentication tokens to {token_store}")
+    blocks = activity_body_blocks(a, splits, zones)
+    if op and op["action"] == "create":
+        op.update(children=blocks, activity_id=activity_id, body_hash=new_hash)
+        return None
+    key = activity_key(activity_day(a) or "", a.get("activityName") or "Unnamed Activity")
+    body = body_op(existing["id"], key, blocks, known, new_hash)
+    body.update(activity_id=activity_id, body_hash=new_hash)
+    return body
 
-        return garmin
+def activity_streams(garmin, a: dict, existing):
+    """
+    Decoded FIT streams for new activities (downloaded once) and for any
+    activity already cached locally; None otherwise or if the file is unusable.
+    """
+    activity_id = a.get("activityId")
+    if not activity_id or (existing and not has_local_streams(activity_id)):
+        return None
+    try:
+        return load_activity_streams(garmin, activity_id)
     except Exception as e:
-        print(f"Error during Garmin login: {e}")
-        sys.exit(1)
+        print(f"Skipping FIT for activity {activity_id}: {e}")
+        return None
+
+def plan_activities(database_id: str, activities: list, index: dict, garmin=None, body_hashes=None,
+                    with_fit: bool = False) -> dict:
+    """
+    Operations for a batch of activities. With body_hashes (see --body) each
+    page also gets its splits/laps body; with_fit (see --fit) adds metrics
+    computed from the original FIT file. Activities not reached before the
+    run deadline are left out and planned on the next run. Every planned
+    activity is also summarised for the local archive (activity_archive.py),
+    which only keeps it once its row write (if any) has been applied.
+    """
+    ops = []
+    archive = {}
+    writes = []
+    for i, a in enumerate(activities):
+        if expired():
+            print(f"Deadline reached: {len(activities) - i} activities left for the next run")
+            break
+        existing = find_existing(index, a, activity_properties(a))
+        streams = activity_streams(garmin, a, existing) if with_fit else None
+        extra = fit_properties(streams["streams"]) if streams else None
+        op = plan_activity(database_id, a, index, extra)
+        if op and a.get("activityId"):
+            op["activity_id"] = a["activityId"]
+            writes.append(str(a["activityId"]))
+        ops.append(op)
+        if body_hashes is not None:
+            ops.append(plan_activity_body(garmin, a, op, existing, body_hashes, streams))
+        if a.get("activityId"):
+            archive[str(a["activityId"])] = archive_entry(a, streams["streams"] if streams else None)
+    plan = new_plan("garmin-activities2", ops)
+    plan["activity_archive"] = archive
+    plan["activity_writes"] = writes
+    return plan
+
+def upsert_activity(client: Client, database_id: str, a: dict, index: dict):
+    """
+    Creates (or updates) a Notion page for a single Garmin activity dict.
+    """
+    op = plan_activity(database_id, a, index)
+    if op:
+        apply_op(client, op)
+        print(f"{PAST_TENSE[op['action']]}: {op['key']}")
 
 # -----------------------------
 # Main
 # -----------------------------
-def main():
-    notion_token = os.getenv("NOTION_TOKEN")
-    if not notion_token:
-        print("Missing NOTION_TOKEN")
-        sys.exit(1)
-
-    # Allow override via env NOTION_DB_ID; otherwise use your provided ID
-    database_id = os.getenv("NOTION_DB_ID", DEFAULT_NOTION_ACTIVITIES_DB)
-
-    # Login + clients
+def build_plan(client: Client, database_id: str, with_body: bool = False, with_fit: bool = False,
+               keep_duplicates: bool = False, with_gear: bool = False, days: list = None,
+               activity_ids: list = None) -> dict:
+    """
+    Fetch recent Garmin activities (or those on the given days) and the Activities DB,
+    and work out what would change. Read-only: nothing is written to Notion here.
+    """
     garmin = login_to_garmin()
-    client = Client(auth=notion_token)
 
-    # Fetch a reasonable batch (adjust as you wish)
+    # Fetch a reasonable batch (adjust RECENT_ACTIVITIES as you wish)
     try:
-        activities = garmin.get_activities(0, 30)
+        activities = get_activities_on(garmin, days, activity_ids) if days else get_recent_activities(garmin)
     except Exception as e:
         print(f"No activities available or error fetching activities: {e}")
-        # If you want to create a placeholder row in Notion when nothing is found, uncomment below:
-        # client.pages.create(
-        #     parent={"database_id": database_id},
-        #     properties={
-        #         "Date": {"date": {"start": datetime.now(local_tz).strftime("%Y-%m-%d")}},
-        #         "Activity Name": {"title": [{"text": {"content": "No activities found"}}]},
-        #     },
-        #     icon={"emoji": "❌"},
-        # )
         sys.exit(0)
 
     if not activities:
         print("No activities found.")
-        # (Optional) create a placeholder page as above
         sys.exit(0)
 
-    for a in activities:
-        upsert_activity(client, database_id, a)
+    if not keep_duplicates:
+        activities = drop_duplicates(activities)
+
+    index = load_activity_index(client, database_id)
+    body_hashes = load_body_hashes() if with_body else None
+    plan = plan_activities(database_id, activities, index, garmin, body_hashes, with_fit)
+    # Gear and rollups only count the activities reached before the deadline;
+    # the rest are planned, and counted, on the next run
+    planned = [a for a in activities if str(a.get("activityId")) in plan["activity_archive"]]
+    if with_gear:
+        plan = add_gear(plan, client, garmin, planned)
+    return add_rollups(plan, client, activity_facts(planned))
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync recent Garmin activities to Notion")
+    add_plan_arguments(parser)
+    parser.add_argument("--body", action="store_true",
+                        help="also write a page body with summary, HR zones and a table of splits/laps")
+    parser.add_argument("--fit", action="store_true",
+                        help="download new activities' original FIT files once and add HR/power/elevation "
+                             "metrics computed from them")
+    parser.add_argument("--gear", action="store_true",
+                        help="keep per-gear distance/time totals and update the Gear database (NOTION_GEAR_DB_ID)")
+    parser.add_argument("--date", action="append", metavar="YYYY-MM-DD",
+                        help="sync the activities of this day instead of the most recent ones (repeatable)")
+    parser.add_argument("--activity-id", action="append",
+                        help="with --date, only sync this activity (repeatable)")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="write overlapping copies of the same workout (e.g. peloton-to-garmin uploads) too")
+    args = parser.parse_args()
+
+    notion_token = os.getenv("NOTION_TOKEN")
+    if not notion_token:
+        print("Missing NOTION_TOKEN")
+        sys.exit(1)
+
+    # Allow override via env NOTION_DB_ID; otherwise use your provided ID
+    database_id = os.getenv("NOTION_DB_ID", DEFAULT_NOTION_ACTIVITIES_DB)
+
+    client = shared_notion_client(notion_token)
+
+    def after_apply(plan):
+        record_body_hashes(plan)
+        record_rollups(plan)
+        record_archive(plan)
+        record_gear(plan)
+
+    run_plan_cli(args, client, lambda: build_plan(client, database_id, args.body, args.fit, args.keep_duplicates,
+                                                   args.gear, args.date, args.activity_id),
+                 after_apply=after_apply)
 
 if __name__ == "__main__":
     main()
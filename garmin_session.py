@@ -0,0 +1,133 @@
+"""
+Garmin Connect login shared by all sync scripts.
+
+The logged-in client is created once per process and wrapped in SingleFlight:
+identical read calls (get_* / download_*) made while one is already in flight
+wait for it instead of going to Garmin again, and results are remembered for
+the rest of the run. When several syncs share a process (sync-all2.py
+--in-process) or one sync fetches concurrently, each distinct request reaches
+Garmin once.
+"""
+
+import copy
+import os
+import sys
+import threading
+from concurrent.futures import Future
+
+from garminconnect import Garmin
+
+from deadline import garmin_timeout
+from profiling import stage
+from transport import STATS, instrument_garmin
+
+READ_PREFIXES = ("get_", "download_")
+
+_garmin = None
+
+
+class SingleFlight:
+    """
+    Proxy for a Garmin client that coalesces and memoizes read calls.
+    Callers get their own deep copy of a result, so mutating it is safe.
+    Failed calls are not remembered; the next caller tries again.
+    """
+
+    def __init__(self, garmin):
+        self._garmin = garmin
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._garmin, name)
+        if not name.startswith(READ_PREFIXES) or not callable(attr):
+            return attr
+        return lambda *args, **kwargs: self._call(name, attr, args, kwargs)
+
+    def _call(self, name, method, args, kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return method(*args, **kwargs)
+
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = Future()
+
+        if owner:
+            STATS["garmin"]["calls"] += 1
+            try:
+                future.set_result(method(*args, **kwargs))
+            except BaseException as e:
+                with self._lock:
+                    self._calls.pop(key, None)
+                future.set_exception(e)
+                raise
+        else:
+            STATS["garmin"]["coalesced"] += 1
+        return copy.deepcopy(future.result())
+
+
+def login_to_garmin():
+    """
+    Login to Garmin Connect with 2FA support. The logged-in session (and its
+    connection pool) is shared by every caller in the process.
+    """
+    global _garmin
+    if _garmin is None:
+        with stage("garmin-login"):
+            garmin = _login()
+        instrument_garmin(garmin)
+        _garmin = SingleFlight(garmin)
+    return _garmin
+
+
+def _login():
+    garmin_email = os.getenv("GARMIN_EMAIL")
+    garmin_password = os.getenv("GARMIN_PASSWORD")
+    token_store = os.getenv("GARMIN_TOKEN_STORE", "~/.garmin_tokens")
+    token_store = os.path.expanduser(token_store)
+    mfa_code = os.getenv("GARMIN_MFA_CODE")  # Optional, for non-interactive 2FA
+
+    # Initialize Garmin client
+    garmin = Garmin(garmin_email, garmin_password)
+    garmin.garth.configure(timeout=garmin_timeout())
+
+    try:
+        # First try to use token store if it exists
+        if os.path.exists(token_store):
+            print(f"Using stored tokens from {token_store}")
+            garmin.login(tokenstore=token_store)
+            return garmin
+
+        if not garmin_email or not garmin_password:
+            print("Missing GARMIN_EMAIL or GARMIN_PASSWORD")
+            sys.exit(1)
+
+        # If no token store or it failed, try fresh login
+        if mfa_code:
+            # Use non-interactive 2FA flow
+            print("Using non-interactive 2FA flow")
+            client_state, _ = garmin.login(return_on_mfa=True)
+            if client_state == "needs_mfa":
+                garmin.resume_login(client_state, mfa_code)
+            else:
+                print("MFA was expected but not requested")
+        else:
+            # Use interactive login (will prompt for MFA code if needed)
+            garmin.login()
+
+        # Save tokens for future use if login was successful
+        if hasattr(garmin, 'garth') and garmin.garth:
+            # Make sure token store directory exists
+            os.makedirs(os.path.dirname(token_store), exist_ok=True)
+            garmin.garth.save(token_store)
+            print(f"Saved authentication tokens to {token_store}")
+
+        return garmin
+    except Exception as e:
+        print(f"Error during Garmin login: {e}")
+        sys.exit(1)
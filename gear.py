@@ -0,0 +1,191 @@
+"""
+Gear (shoes, bikes) mileage, kept up to date one activity at a time.
+
+garmin-activities2.py --gear asks Garmin which gear each activity used, once
+per activity, and adds the activity's distance and time to that gear's totals
+in SYNC_STATE_DIR/gear/totals.json. A gear seen for the first time starts
+from Garmin's own lifetime stats, so history is never re-summed, and an
+activity already counted is never counted again.
+
+A Gear database (NOTION_GEAR_DB_ID) gets one row per gear, written only when
+its totals change. It needs:
+  Name (title), Gear ID (text), Type (select), Distance (km), Duration (h),
+  Activities, Limit (km) (numbers), Status (select: OK / Near limit / Over limit).
+The limit is the gear's "maximum distance" from Garmin Connect, otherwise
+GEAR_SHOE_LIMIT_KM (default 700) for shoes; Near limit starts at
+GEAR_ALERT_SHARE (default 0.9) of it.
+"""
+
+import os
+
+from notion_index import load_index, page_value
+from sync_plan import create_op, update_op
+from sync_state import load_json, save_json, state_path
+
+
+def gear_database_id():
+    return os.getenv("NOTION_GEAR_DB_ID")
+
+
+def _totals_file() -> str:
+    return state_path("gear", "totals.json")
+
+
+def load_gear_state() -> dict:
+    state = load_json(_totals_file(), {}) or {}
+    return {"gear": state.get("gear", {}), "activities": state.get("activities", {}),
+            "pending": state.get("pending", [])}
+
+
+# -----------------------------
+# Totals
+# -----------------------------
+def _gear_info(item: dict) -> dict:
+    return {
+        "name": item.get("displayName") or item.get("customMakeModel") or item.get("uuid"),
+        "type": item.get("gearTypeName") or "Other",
+        "max_meters": item.get("maximumMeters") or None,
+    }
+
+
+def _seed_totals(garmin, uuid: str) -> dict:
+    stats = garmin.get_gear_stats(uuid) or {}
+    return {
+        "distance": stats.get("totalDistance") or 0.0,
+        "duration": stats.get("totalDuration") or 0.0,
+        "activities": stats.get("totalActivities") or 0,
+    }
+
+
+def _add(totals: dict, distance: float, duration: float) -> None:
+    totals["distance"] += distance
+    totals["duration"] += duration
+    totals["activities"] += 1
+
+
+def update_gear(state: dict, garmin, activities: list) -> set:
+    """
+    Fold activities into the gear totals. Only activities not seen before cost
+    a Garmin call. Returns the UUIDs whose totals changed.
+    """
+    changed = set()
+    # Gear seeded from lifetime stats during this call: those stats already
+    # include every activity in the batch, so none of them is added on top
+    seeded = set()
+    for a in activities:
+        activity_id = str(a.get("activityId") or "")
+        if not activity_id or activity_id in state["activities"]:
+            continue
+        try:
+            items = garmin.get_activity_gear(activity_id) or []
+        except Exception as e:
+            print(f"Skipping gear for activity {activity_id}: {e}")
+            continue
+
+        distance, duration = a.get("distance") or 0, a.get("duration") or 0
+        uuids = []
+        for item in items:
+            uuid = item.get("uuid")
+            if not uuid:
+                continue
+            uuids.append(uuid)
+            gear = state["gear"].get(uuid)
+            if gear is None:
+                state["gear"][uuid] = {**_gear_info(item), **_seed_totals(garmin, uuid)}
+                seeded.add(uuid)
+            else:
+                gear.update(_gear_info(item))
+                if uuid not in seeded:
+                    _add(gear, distance, duration)
+            changed.add(uuid)
+        state["activities"][activity_id] = [uuids, distance, duration]
+    return changed
+
+
+# -----------------------------
+# Alerts and Notion rows
+# -----------------------------
+def gear_limit_meters(gear: dict):
+    if gear.get("max_meters"):
+        return gear["max_meters"]
+    if gear.get("type", "").lower() == "shoes":
+        return float(os.getenv("GEAR_SHOE_LIMIT_KM", "700")) * 1000
+    return None
+
+
+def gear_status(gear: dict) -> str:
+    limit = gear_limit_meters(gear)
+    if not limit:
+        return "OK"
+    if gear["distance"] >= limit:
+        return "Over limit"
+    if gear["distance"] >= float(os.getenv("GEAR_ALERT_SHARE", "0.9")) * limit:
+        return "Near limit"
+    return "OK"
+
+
+def gear_properties(uuid: str, gear: dict) -> dict:
+    limit = gear_limit_meters(gear)
+    return {
+        "Name": {"title": [{"text": {"content": gear["name"]}}]},
+        "Gear ID": {"rich_text": [{"text": {"content": uuid}}]},
+        "Type": {"select": {"name": gear["type"]}},
+        "Distance (km)": {"number": round(gear["distance"] / 1000, 1)},
+        "Duration (h)": {"number": round(gear["duration"] / 3600, 1)},
+        "Activities": {"number": gear["activities"]},
+        "Limit (km)": {"number": round(limit / 1000) if limit else None},
+        "Status": {"select": {"name": gear_status(gear)}},
+    }
+
+
+def plan_gear(client, state: dict, uuids: set) -> list:
+    database_id = gear_database_id()
+    if not database_id or not uuids:
+        return []
+    index = load_index(client, database_id, lambda page: page_value(page, "Gear ID"))
+    ops = []
+    for uuid in sorted(uuids):
+        gear = state["gear"].get(uuid)
+        if not gear:
+            continue
+        if gear_status(gear) != "OK":
+            print(f"Gear alert: {gear['name']} is at {gear['distance'] / 1000:.0f} km ({gear_status(gear)})")
+        properties = gear_properties(uuid, gear)
+        existing = index.get(uuid)
+        if existing:
+            ops.append(update_op(existing, f"gear {uuid}", properties))
+        else:
+            ops.append(create_op(database_id, f"gear {uuid}", properties, icon={"emoji": "👟"}))
+    return [op for op in ops if op]
+
+
+def add_gear(plan: dict, client, garmin, activities: list) -> dict:
+    """
+    Update gear totals for the plan's activities and append the Gear rows that
+    changed (plus rows a deadline left pending). The new state is saved by
+    record_gear once the plan has been applied.
+    """
+    state = load_gear_state()
+    known = set(state["activities"])
+    changed = update_gear(state, garmin, activities) | set(state["pending"])
+    plan["operations"] += plan_gear(client, state, changed)
+    plan["gear_update"] = {
+        "gear": {uuid: state["gear"][uuid] for uuid in changed if uuid in state["gear"]},
+        "activities": {k: v for k, v in state["activities"].items() if k not in known},
+    }
+    return plan
+
+
+def record_gear(plan: dict) -> None:
+    """
+    Store the plan's gear totals; rows the deadline skipped or that failed
+    stay pending and are written on the next run.
+    """
+    if "gear_update" not in plan:
+        return
+    state = load_gear_state()
+    state["gear"].update(plan["gear_update"]["gear"])
+    state["activities"].update(plan["gear_update"]["activities"])
+    state["pending"] = sorted(op["key"][len("gear "):] for op in plan.get("skipped") or []
+                              if op["key"].startswith("gear "))
+    save_json(_totals_file(), state)
@@ -1,26 +1,82 @@
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import argparse
 
 from notion_client import Client
 from dotenv import load_dotenv
 import os
 
-# Import your fetch_today_health function. Adjust the import path if necessary.
-# from health_data import fetch_today_health
+from autotune import measure, tuned
+from formatting import get_tz
+from garmin_session import login_to_garmin
+from health_trends import load_trends, record_trends, trend_properties
+from local_dates import sync_tz_name, today
+from notion_index import load_index, page_date
+from relations import load_activity_links
+from sync_plan import add_plan_arguments, create_op, new_plan, run_plan_cli, update_op
+from transport import shared_notion_client
 
+def _day_range(start, end) -> list:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
 
-def write_health_to_notion(health: dict, database_id: str, notion_token: str) -> None:
+
+def fetch_health(garmin, start, end) -> dict:
+    """
+    Weigh-ins and resting heart rate from start to end (inclusive), keyed by
+    calendar day: {day: {"weight": kg, "bmi": ..., "restingHeartRate": bpm}}.
+    The latest weigh-in of a day wins.
+    """
+    health = {}
+    days = _day_range(start, end)
+    i = 0
+    while i < len(days):
+        # Days per Garmin range request (see autotune.py)
+        chunk = days[i:i + tuned("garmin.range_days")]
+        first, last = chunk[0].isoformat(), chunk[-1].isoformat()
+        i += len(chunk)
+
+        with measure("garmin.range_days"):
+            weigh_ins = (garmin.get_body_composition(first, last) or {}).get("dateWeightList") or []
+        for w in sorted(weigh_ins, key=lambda w: w.get("date") or 0):
+            if w.get("calendarDate") and w.get("weight"):
+                health.setdefault(w["calendarDate"], {}).update(
+                    weight=round(w["weight"] / 1000, 2), bmi=round(w["bmi"], 1) if w.get("bmi") else None)
+
+        # get_rhr_day asks for a single day; the endpoint itself takes a range
+        with measure("garmin.range_days"):
+            rhr = garmin.connectapi(f"{garmin.garmin_connect_rhr_url}/{garmin.display_name}",
+                                    params={"fromDate": first, "untilDate": last, "metricId": 60}) or {}
+        metrics = ((rhr.get("allMetrics") or {}).get("metricsMap") or {}).get("WELLNESS_RESTING_HEART_RATE") or []
+        for m in metrics:
+            if m.get("calendarDate") and m.get("value"):
+                health.setdefault(m["calendarDate"], {})["restingHeartRate"] = int(m["value"])
+    return health
+
+
+def health_record(day: str, readings: dict) -> dict:
+    """
+    The health dict health_properties expects, for one day of fetch_health output.
     """
-    Create a new page in Notion with the provided health metrics.
+    reading = readings.get(day) or {}
+    return {
+        "calendarDate": day,
+        "weight": reading.get("weight"),
+        "restingHeartRate": reading.get("restingHeartRate"),
+        "bmi": reading.get("bmi"),
+        "no_data": not reading,
+        "time": datetime.now(get_tz(sync_tz_name())).strftime("%H:%M"),
+    }
+
 
-    :param health: Dictionary returned by fetch_today_health with keys
+def health_properties(health: dict) -> Tuple[dict, dict]:
+    """
+    Build the Notion properties payload and page icon for one day of health metrics.
+
+    :param health: Dictionary returned by health_record with keys
                    'calendarDate', 'weight', 'restingHeartRate', 'bmi',
                    'no_data', and 'time'.
-    :param database_id: The Notion database ID where the page should be created.
-    :param notion_token: An integration token generated from Notion.
+    :return: (properties, icon)
     """
-    client = Client(auth=notion_token)
-
     # Format a human‑readable title for the page (e.g. "05.08.2025" or "No data on 04.08.2025").
     date_iso = health.get("calendarDate")
     try:
@@ -48,6 +104,87 @@ def write_health_to_notion(health: dict, database_id: str, notion_token: str) ->
         "Time": {"rich_text": [{"text": {"content": health.get("time", "")}}]},
         "No Data": {"checkbox": bool(health.get("no_data"))},
     }
+    return properties, icon
+
+
+def load_health_index(client: Client, database_id: str) -> dict:
+    """
+    Read the whole health database once, keyed by the 'Full Date' property.
+    """
+    return load_index(client, database_id, lambda page: page_date(page, "Full Date"))
+
+
+def health_op(database_id: str, health: dict, index: dict, links=None, trends=None) -> Optional[dict]:
+    """
+    Create a page for a new day, or update the existing page for that day if any metric changed.
+    With links (relations.ActivityLinks) the day also links to its activities, and
+    with trends (health_trends.HealthTrends) the smoothed values go in the same payload.
+    """
+    properties, icon = health_properties(health)
+    date_iso = health.get("calendarDate")
+    if links:
+        properties.update(links.day_properties(date_iso))
+    if trends is not None:
+        properties.update(trend_properties(trends.summary(date_iso)))
+    existing = index.get(date_iso)
+    if existing:
+        # "Time" is the sync time, different on every run: it is written along
+        # with a real change but never causes an update by itself
+        time = properties.pop("Time")
+        op = update_op(existing, date_iso, properties, icon=icon)
+        if op:
+            op["properties"]["Time"] = time
+        return op
+    return create_op(database_id, date_iso, properties, icon=icon)
+
+
+def plan_health(database_id: str, health: dict, index: dict, links=None) -> dict:
+    return new_plan("health-data", [health_op(database_id, health, index, links)])
+
+
+def trends_start(trends, end):
+    """
+    First day to fetch: the whole HEALTH_BACKFILL_DAYS window on the first run,
+    otherwise the last stored day (a later weigh-in may have changed it).
+    """
+    backfill = int(os.getenv("HEALTH_BACKFILL_DAYS", "365"))
+    last = trends.last_day()
+    start = datetime.strptime(last, "%Y-%m-%d").date() if last else end - timedelta(days=backfill - 1)
+    return max(start, end - timedelta(days=backfill - 1))
+
+
+def plan_health_trends(database_id: str, readings: dict, index: dict, links, trends) -> dict:
+    """
+    Fold the fetched readings into the trends and write a row for every day
+    since the last run (only today on the first run), plus pending rows.
+    """
+    last = trends.last_day()
+    before = dict(trends.days)
+    trends.update({day: [r.get("weight"), r.get("restingHeartRate")] for day, r in readings.items()})
+    end = today()
+    trends.extend_to(end.isoformat())
+
+    days = [d.isoformat() for d in _day_range(datetime.strptime(last, "%Y-%m-%d").date(), end)] if last \
+        else [end.isoformat()]
+    days = sorted(set(days) | {d for d in trends.pending if d in trends.days})
+    ops = [health_op(database_id, health_record(day, readings), index, links, trends) for day in days]
+    plan = new_plan("health-data", ops)
+    plan["health_trends"] = {d: v for d, v in trends.days.items() if before.get(d) != v}
+    return plan
+
+
+def write_health_to_notion(health: dict, database_id: str, notion_token: str) -> None:
+    """
+    Create a new page in Notion with the provided health metrics, through the
+    process-wide Notion client rather than a new connection per call.
+
+    :param health: Dictionary returned by health_record (see health_properties).
+    :param database_id: The Notion database ID where the page should be created.
+    :param notion_token: An integration token generated from Notion.
+    """
+    client = shared_notion_client(notion_token)
+
+    properties, icon = health_properties(health)
 
     # Create the page in Notion
     client.pages.create(
@@ -59,13 +196,19 @@ def write_health_to_notion(health: dict, database_id: str, notion_token: str) ->
 
 def main() -> None:
     """
-    Example entry point: fetch health data for today and write it to Notion.
+    Fetch today's weigh-in and resting heart rate and write them to Notion.
     Ensure that GARMIN_EMAIL/GARMIN_PASSWORD and NOTION_TOKEN are set in your
-    environment, along with NOTION_HEALTH_DB_ID. Replace the fetch_today_health
-    call with your existing Garmin authentication logic.
+    environment, along with NOTION_HEALTH_DB_ID.
     """
     load_dotenv()
 
+    parser = argparse.ArgumentParser(description="Sync today's health metrics to Notion")
+    add_plan_arguments(parser)
+    parser.add_argument("--trends", action="store_true",
+                        help="also write the smoothed weight and resting HR trends and the weight "
+                             "change over 7 and 30 days, catching up on days not seen since the last run")
+    args = parser.parse_args()
+
     notion_token = os.environ.get("NOTION_TOKEN")
     database_id = os.environ.get("NOTION_HEALTH_DB_ID")
 
@@ -74,22 +217,20 @@ def main() -> None:
     if not database_id:
         raise RuntimeError("NOTION_HEALTH_DB_ID environment variable is not set")
 
-    # TODO: authenticate to Garmin and fetch today’s health data
-    # For example:
-    # garmin = login_to_garmin()  # your custom login function
-    # health = fetch_today_health(garmin, datetime.today().strftime("%Y-%m-%d"))
-
-    # For demonstration, use a placeholder health record. Replace this with real data.
-    health = {
-        "calendarDate": datetime.today().strftime("%Y-%m-%d"),
-        "weight": 0.0,
-        "restingHeartRate": 0,
-        "bmi": 0.0,
-        "no_data": True,
-        "time": datetime.now().strftime("%H:%M"),
-    }
+    client = shared_notion_client(notion_token)
+
+    def build_plan():
+        garmin = login_to_garmin()
+        end = today()
+        index, links = load_health_index(client, database_id), load_activity_links(client)
+        if not args.trends:
+            readings = fetch_health(garmin, end, end)
+            return plan_health(database_id, health_record(end.isoformat(), readings), index, links)
+        trends = load_trends()
+        readings = fetch_health(garmin, trends_start(trends, end), end)
+        return plan_health_trends(database_id, readings, index, links, trends)
 
-    write_health_to_notion(health, database_id, notion_token)
+    run_plan_cli(args, client, build_plan, after_apply=record_trends)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,224 @@
+"""
+Smoothed weight and resting-HR trends for health-data.py.
+
+Daily weigh-ins swing by a kilo or more with water and food, so next to the
+raw value each day gets an exponentially smoothed trend (half-life
+WEIGHT_HALF_LIFE_DAYS, default 10; RHR_HALF_LIFE_DAYS, default 7) and the
+trend's change over 7 and 30 days. A day without a reading leaves the trend
+where it was.
+
+The raw readings and trends live in SYNC_STATE_DIR/health/trends.json, one
+entry per day. The first run computes the trends for the whole history at
+once with NumPy; after that each new day is a single update from the previous
+day's trend, and a changed reading (typically a later weigh-in on the last
+stored day) recomputes only the days from that one on.
+"""
+
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+from sync_state import load_json, save_json, state_path
+
+# Days per vectorized block. Each block restarts the running decay factor at 1;
+# ema() shortens the blocks further for fast decays so it never underflows
+BLOCK_DAYS = 256
+# Largest total log decay in one block: exp(-600) ~ 1e-261 is still a normal float64
+MAX_LOG_DECAY = 600.0
+
+# Per-day entry layout
+WEIGHT, RESTING_HR, WEIGHT_TREND, RHR_TREND = range(4)
+
+
+def _trends_file() -> str:
+    return state_path("health", "trends.json")
+
+
+def _alpha(half_life_env: str, default: float) -> float:
+    half_life = float(os.getenv(half_life_env, default))
+    return 1 - 0.5 ** (1 / half_life)
+
+
+def weight_alpha() -> float:
+    return _alpha("WEIGHT_HALF_LIFE_DAYS", 10)
+
+
+def rhr_alpha() -> float:
+    return _alpha("RHR_HALF_LIFE_DAYS", 7)
+
+
+# -----------------------------
+# Smoothing
+# -----------------------------
+def ema(values, alpha: float, initial=None) -> np.ndarray:
+    """
+    trend[i] = trend[i-1] + alpha * (values[i] - trend[i-1]), skipping NaNs,
+    without a Python loop per day. With a_i = alpha (0 on missing days) and
+    D_i = prod(1 - a_j, j <= i), the recursion unrolls to
+    trend[i] = D_i * (initial + sum(a_k * values[k] / D_k, k <= i)).
+    D_i shrinks by (1 - alpha) per reading, so blocks are cut short enough that
+    it stays a normal float; a decay too fast for even one day (alpha ~ 1)
+    just carries the last reading forward.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(x)
+    # Before the first reading there is no trend (unless one is carried in)
+    first = 0
+    if initial is None:
+        if not present.any():
+            return np.full(len(x), np.nan)
+        initial = x[present][0]
+        first = np.argmax(present)
+
+    log_decay = -np.log1p(-alpha) if alpha < 1 else np.inf
+    if log_decay > MAX_LOG_DECAY:
+        filled = np.where(present, x, np.nan)
+        index = np.maximum.accumulate(np.where(present, np.arange(len(x)), -1))
+        out = np.where(index >= 0, filled[np.maximum(index, 0)], initial)
+    else:
+        a = np.where(present, alpha, 0.0)
+        x = np.where(present, x, 0.0)
+        block_days = max(1, min(BLOCK_DAYS, int(MAX_LOG_DECAY / log_decay))) if log_decay else BLOCK_DAYS
+        out = np.empty(len(x))
+        prev = initial
+        for start in range(0, len(x), block_days):
+            block = slice(start, start + block_days)
+            decay = np.exp(np.cumsum(np.log1p(-a[block])))
+            out[block] = decay * (prev + np.cumsum(a[block] * x[block] / decay))
+            prev = out[block][-1]
+    out[:first] = np.nan
+    return out
+
+
+def _days_between(first: str, last: str) -> list:
+    start, end = date.fromisoformat(first), date.fromisoformat(last)
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def _round(value, digits: int):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+class HealthTrends:
+    def __init__(self, state: dict = None):
+        state = state or {}
+        self.days = state.get("days", {})
+        self.pending = state.get("pending", [])
+
+    def to_json(self) -> dict:
+        return {"days": self.days, "pending": self.pending}
+
+    def last_day(self):
+        return max(self.days) if self.days else None
+
+    def update(self, readings: dict) -> None:
+        """
+        readings: {day: (weight_kg or None, resting_hr or None)}. Days after the
+        last stored one are folded in one by one; a change to a stored day
+        recomputes the trends from that day on.
+        """
+        changed = {d: list(r) for d, r in readings.items()
+                   if (self.days.get(d) or [None, None])[:2] != list(r)}
+        if not changed:
+            return
+        last = self.last_day()
+        if last is None or min(changed) <= last:
+            for day, reading in changed.items():
+                self.days[day] = reading
+            self._rebuild(min(changed))
+            return
+        for day in _days_between(last, max(changed))[1:]:
+            self._add(day, changed.get(day, [None, None]))
+
+    def extend_to(self, day: str) -> None:
+        """
+        Carry the last trends forward through `day` (e.g. today before the
+        weigh-in), so every row written up to it has trend values.
+        """
+        last = self.last_day()
+        if last is None:
+            return
+        for missing in _days_between(last, day)[1:]:
+            self._add(missing, [None, None])
+
+    def _add(self, day: str, reading: list) -> None:
+        prev = self.days[self.last_day()]
+        trends = []
+        for index, trend_index, alpha, digits in ((WEIGHT, WEIGHT_TREND, weight_alpha(), 3),
+                                                  (RESTING_HR, RHR_TREND, rhr_alpha(), 2)):
+            value, trend = reading[index], prev[trend_index]
+            if value is None:
+                trends.append(trend)
+            elif trend is None:
+                trends.append(value)
+            else:
+                trends.append(round(trend + alpha * (value - trend), digits))
+        self.days[day] = [reading[WEIGHT], reading[RESTING_HR], *trends]
+
+    def _rebuild(self, start: str) -> None:
+        """
+        Recompute the trends from `start` to the last day, continuing from the
+        day before's trends; from the first day on if there is none.
+        """
+        before = self.days.get((date.fromisoformat(start) - timedelta(days=1)).isoformat())
+        if before is None:
+            start = min(self.days)
+        weight_from, rhr_from = (before[WEIGHT_TREND], before[RHR_TREND]) if before else (None, None)
+        days = _days_between(start, max(self.days))
+        raw = [self.days.get(d, [None, None]) for d in days]
+        weights = np.array([r[WEIGHT] if r[WEIGHT] is not None else np.nan for r in raw])
+        rhr = np.array([r[RESTING_HR] if r[RESTING_HR] is not None else np.nan for r in raw])
+        weight_trend, rhr_trend = ema(weights, weight_alpha(), weight_from), ema(rhr, rhr_alpha(), rhr_from)
+        self.days.update({
+            d: [r[WEIGHT], r[RESTING_HR], _round(w, 3), _round(h, 2)]
+            for d, r, w, h in zip(days, raw, weight_trend, rhr_trend)
+        })
+
+    def summary(self, day: str) -> dict:
+        """
+        Trend values and 7/30-day trend deltas for a day that has been stored.
+        """
+        entry = self.days.get(day)
+        if not entry:
+            return {}
+
+        def delta(days_back):
+            then = self.days.get((date.fromisoformat(day) - timedelta(days=days_back)).isoformat())
+            if not then or then[WEIGHT_TREND] is None or entry[WEIGHT_TREND] is None:
+                return None
+            return round(entry[WEIGHT_TREND] - then[WEIGHT_TREND], 2)
+
+        return {
+            "weight_trend": _round(entry[WEIGHT_TREND], 2) if entry[WEIGHT_TREND] is not None else None,
+            "weight_delta_7d": delta(7),
+            "weight_delta_30d": delta(30),
+            "rhr_trend": _round(entry[RHR_TREND], 1) if entry[RHR_TREND] is not None else None,
+        }
+
+
+def load_trends() -> HealthTrends:
+    return HealthTrends(load_json(_trends_file(), {}))
+
+
+def record_trends(plan: dict) -> None:
+    """
+    Store the days the plan changed once it has been applied; rows the
+    deadline skipped or that failed stay pending and are written on the next
+    run.
+    """
+    if "health_trends" not in plan:
+        return
+    trends = load_trends()
+    trends.days.update(plan["health_trends"])
+    trends.pending = sorted(op["key"] for op in plan.get("skipped") or [])
+    save_json(_trends_file(), trends.to_json())
+
+
+def trend_properties(summary: dict) -> dict:
+    return {
+        "Weight Trend": {"number": summary.get("weight_trend")},
+        "Weight Δ7d": {"number": summary.get("weight_delta_7d")},
+        "Weight Δ30d": {"number": summary.get("weight_delta_30d")},
+        "Resting HR Trend": {"number": summary.get("rhr_trend")},
+    }
@@ -0,0 +1,42 @@
+from dotenv import load_dotenv
+import argparse
+
+from deadline import add_deadline_argument, expired, init_deadline
+from garmin_session import login_to_garmin
+from intraday_store import SERIES, compact, days_to_ingest, ingest_day
+from local_dates import today
+from profiling import add_profile_argument, profile_session, stage
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Store intraday Garmin steps, heart rate and stress locally")
+    parser.add_argument("--series", action="append", choices=list(SERIES),
+                        help="only ingest this series (repeatable); default: all")
+    parser.add_argument("--backfill", type=int, metavar="DAYS",
+                        help="re-read the last DAYS days instead of continuing from the last stored day")
+    parser.add_argument("--compact", action="store_true",
+                        help="drop superseded day chunks from the local files after ingesting")
+    add_profile_argument(parser)
+    add_deadline_argument(parser)
+    args = parser.parse_args()
+    init_deadline(args.deadline)
+
+    with profile_session(args.profile, "intraday-data"):
+        garmin = login_to_garmin()
+        for name in args.series or SERIES:
+            with stage(name):
+                days = days_to_ingest(name, today(), args.backfill)
+                samples = 0
+                for i, day in enumerate(days):
+                    if expired():
+                        # Stored days are the progress; the next run continues from the last one
+                        print(f"Deadline reached: {name} stopped with {len(days) - i} day(s) left")
+                        break
+                    samples += ingest_day(garmin, day, [name]).get(name, 0)
+                print(f"{name}: {samples} sample(s) for {len(days)} day(s)")
+                if args.compact:
+                    print(f"{name}: reclaimed {compact(name)} byte(s)")
+
+if __name__ == '__main__':
+    main()
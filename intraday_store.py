@@ -0,0 +1,198 @@
+"""
+Local store for intraday Garmin series (15-min steps, 2-min heart rate, stress).
+
+Each series has one append-only file per year, SYNC_STATE_DIR/intraday/<series>/<year>.bin,
+made of day chunks. A chunk is the day's timestamps and values as int32
+deltas (first timestamp in the header), zlib-compressed; regular sampling
+makes the deltas almost constant, so a day of 2-min HR takes about a
+kilobyte. A small JSON index next to the file maps each day to its chunk's
+offset and length, so a range read only seeks to and decompresses the days
+it needs. Re-ingesting a day appends a new chunk and repoints the index;
+compact() drops the superseded chunks.
+"""
+
+import os
+import struct
+import zlib
+from datetime import date, timedelta
+
+import numpy as np
+
+from sleep_detail import epoch_seconds
+from sync_state import load_json, save_json, state_path
+
+CHUNK_HEADER = struct.Struct("<qI")  # first timestamp (epoch s), sample count
+
+
+# -----------------------------
+# Parsing Garmin payloads
+# -----------------------------
+def _pairs(pairs) -> tuple:
+    # [[epoch_ms, value], ...] with None / negative values meaning "no reading"
+    rows = [p for p in pairs or [] if p and len(p) >= 2 and p[0] is not None
+            and p[1] is not None and p[1] >= 0]
+    if not rows:
+        return np.empty(0), np.empty(0)
+    t, v = zip(*((p[0], p[1]) for p in rows))
+    return epoch_seconds(list(t)), np.array(v, dtype=np.float64)
+
+
+def heart_rate_samples(payload: dict) -> tuple:
+    return _pairs((payload or {}).get("heartRateValues"))
+
+
+def stress_samples(payload: dict) -> tuple:
+    return _pairs((payload or {}).get("stressValuesArray"))
+
+
+def steps_samples(payload: list) -> tuple:
+    rows = [s for s in payload or [] if s.get("startGMT") and s.get("steps") is not None]
+    if not rows:
+        return np.empty(0), np.empty(0)
+    return epoch_seconds([s["startGMT"] for s in rows]), np.array([s["steps"] for s in rows], dtype=np.float64)
+
+
+# series -> (Garmin call for one day, payload -> (t, v))
+SERIES = {
+    "steps": (lambda garmin, day: garmin.get_steps_data(day), steps_samples),
+    "heart_rate": (lambda garmin, day: garmin.get_heart_rates(day), heart_rate_samples),
+    "stress": (lambda garmin, day: garmin.get_stress_data(day), stress_samples),
+}
+
+
+# -----------------------------
+# Chunk encoding
+# -----------------------------
+def encode_chunk(t: np.ndarray, v: np.ndarray) -> bytes:
+    order = np.argsort(t, kind="stable")
+    t = np.asarray(t, dtype=np.int64)[order]
+    v = np.rint(np.asarray(v, dtype=np.float64)[order]).astype(np.int64)
+    dt = np.diff(t, prepend=t[0]).astype(np.int32)
+    dv = np.diff(v, prepend=0).astype(np.int32)
+    return CHUNK_HEADER.pack(int(t[0]), len(t)) + zlib.compress(dt.tobytes() + dv.tobytes(), 6)
+
+
+def decode_chunk(blob: bytes) -> tuple:
+    t0, count = CHUNK_HEADER.unpack_from(blob)
+    deltas = np.frombuffer(zlib.decompress(blob[CHUNK_HEADER.size:]), dtype=np.int32)
+    t = t0 + np.cumsum(deltas[:count], dtype=np.int64)
+    v = np.cumsum(deltas[count:], dtype=np.int64)
+    return t, v
+
+
+# -----------------------------
+# Files
+# -----------------------------
+def _data_file(series: str, year: int) -> str:
+    return state_path("intraday", series, f"{year}.bin")
+
+
+def _index_file(series: str, year: int) -> str:
+    return state_path("intraday", series, f"{year}.json")
+
+
+def append_day(series: str, day: str, t, v) -> int:
+    """
+    Store one day of samples, replacing any earlier chunk for that day.
+    Returns the number of bytes written.
+    """
+    if len(t) == 0:
+        return 0
+    year = int(day[:4])
+    blob = encode_chunk(t, v)
+    path = _data_file(series, year)
+    with open(path, "ab") as f:
+        offset = f.tell()
+        f.write(blob)
+    index = load_json(_index_file(series, year), {})
+    index[day] = [offset, len(blob)]
+    save_json(_index_file(series, year), index)
+    return len(blob)
+
+
+def stored_days(series: str) -> list:
+    folder = os.path.dirname(_index_file(series, 0))
+    days = []
+    for name in os.listdir(folder):
+        if name.endswith(".json"):
+            days += load_json(os.path.join(folder, name), {})
+    return sorted(days)
+
+
+def read_range(series: str, start: str, end: str) -> tuple:
+    """
+    (t, v) int64 arrays for every stored day from start to end (inclusive,
+    YYYY-MM-DD), reading only those days' chunks.
+    """
+    ts, vs = [], []
+    for year in range(int(start[:4]), int(end[:4]) + 1):
+        index = load_json(_index_file(series, year), {})
+        days = sorted(d for d in index if start <= d <= end)
+        if not days:
+            continue
+        with open(_data_file(series, year), "rb") as f:
+            for day in days:
+                offset, length = index[day]
+                f.seek(offset)
+                t, v = decode_chunk(f.read(length))
+                ts.append(t)
+                vs.append(v)
+    if not ts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(ts), np.concatenate(vs)
+
+
+def compact(series: str) -> int:
+    """
+    Rewrite each year file without superseded chunks. Returns bytes reclaimed.
+    """
+    reclaimed = 0
+    for year in sorted({int(d[:4]) for d in stored_days(series)}):
+        path, index_path = _data_file(series, year), _index_file(series, year)
+        index = load_json(index_path, {})
+        before = os.path.getsize(path)
+        if before == sum(length for _, length in index.values()):
+            continue
+        new_index, tmp = {}, path + ".tmp"
+        with open(path, "rb") as src, open(tmp, "wb") as dst:
+            for d in sorted(index):
+                offset, length = index[d]
+                src.seek(offset)
+                new_index[d] = [dst.tell(), length]
+                dst.write(src.read(length))
+        os.replace(tmp, path)
+        save_json(index_path, new_index)
+        reclaimed += before - os.path.getsize(path)
+    return reclaimed
+
+
+# -----------------------------
+# Ingestion
+# -----------------------------
+def ingest_day(garmin, day: str, series: list = None) -> dict:
+    """
+    Fetch and store one calendar day of each series. Returns {series: samples}.
+    """
+    stored = {}
+    for name in series or SERIES:
+        fetch, parse = SERIES[name]
+        try:
+            t, v = parse(fetch(garmin, day))
+        except Exception as e:
+            print(f"{name} {day}: error fetching intraday data: {e}")
+            continue
+        append_day(name, day, t, v)
+        stored[name] = len(t)
+    return stored
+
+
+def days_to_ingest(series: str, end: date, backfill_days: int = None) -> list:
+    """
+    From the last stored day (re-read: it was probably partial) up to end.
+    """
+    days = stored_days(series)
+    if backfill_days or not days:
+        start = end - timedelta(days=(backfill_days or 1) - 1)
+    else:
+        start = min(date.fromisoformat(days[-1]), end)
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
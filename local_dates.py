@@ -0,0 +1,108 @@
+"""
+One time zone for every sync.
+
+Garmin hands out instants in several shapes (epoch milliseconds, naive GMT
+strings like '2025-08-05 21:40:12', ISO strings with an offset) and the
+scripts used to cut the calendar day from whichever one was at hand. Everything
+that decides "which day is this?" - existence keys and Notion Date
+properties - goes through here instead, using SYNC_TIMEZONE (default
+Europe/London).
+
+UTC offsets come from formatting.utc_offset, cached per (zone, hour), so bulk
+conversions over years of history only consult the tz database a few thousand
+times.
+"""
+
+import os
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+
+from formatting import get_tz, utc_offset
+
+DEFAULT_TZ = "Europe/London"
+
+
+def sync_tz_name() -> str:
+    return os.getenv("SYNC_TIMEZONE", DEFAULT_TZ)
+
+
+def parse_instant(value, naive: str = "utc"):
+    """
+    Aware UTC datetime for an epoch-ms number or an ISO string, or None.
+    Naive strings are read as UTC (Garmin *GMT fields) or, with naive="local",
+    as wall-clock time in the sync zone (Garmin *Local fields).
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, timezone.utc)
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        if naive == "local":
+            return get_tz(sync_tz_name()).localize(dt).astimezone(timezone.utc)
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def to_local(value, tz_name: str = None, naive: str = "utc"):
+    """
+    Aware datetime in the sync zone, or None.
+    """
+    instant = parse_instant(value, naive)
+    if instant is None:
+        return None
+    tz_name = tz_name or sync_tz_name()
+    offset = utc_offset(tz_name, int(instant.timestamp()))
+    return instant.astimezone(timezone(timedelta(seconds=offset)))
+
+
+def local_day(value, tz_name: str = None, naive: str = "utc"):
+    """
+    'YYYY-MM-DD' in the sync zone for any Garmin/Notion timestamp.
+    Plain dates ('2025-08-05') are already calendar days and pass through.
+    """
+    if isinstance(value, str) and len(value) == 10:
+        return value
+    local = to_local(value, tz_name, naive)
+    return local.strftime("%Y-%m-%d") if local else None
+
+
+def local_days(epoch_ms, tz_name: str = None) -> list:
+    """
+    Bulk local_day for an array of epoch-millisecond timestamps.
+    """
+    tz_name = tz_name or sync_tz_name()
+    seconds = np.asarray(epoch_ms, dtype=np.int64) // 1000
+    offsets = np.array([utc_offset(tz_name, s) for s in seconds.tolist()], dtype=np.int64)
+    days = (seconds + offsets) // 86400
+    return np.datetime_as_string(days.astype("datetime64[D]")).tolist()
+
+
+def local_days_iso(values, tz_name: str = None, naive: str = "utc") -> list:
+    """
+    Bulk local_day for Garmin ISO strings; unparseable values give None.
+    """
+    return [local_day(v, tz_name, naive) for v in values]
+
+
+def today(tz_name: str = None) -> date:
+    """
+    Today's date in the sync zone (not the runner's zone, which is UTC on GitHub Actions).
+    """
+    return datetime.now(get_tz(tz_name or sync_tz_name())).date()
+
+
+def activity_day(a: dict):
+    """
+    Calendar day of a Garmin activity in the sync zone, from startTimeGMT when
+    available, otherwise from startTimeLocal.
+    """
+    if a.get("startTimeGMT"):
+        return local_day(a["startTimeGMT"])
+    if a.get("beginTimestamp"):
+        return local_day(a["beginTimestamp"])
+    local = a.get("startTimeLocal")
+    return local[:10] if local else None
@@ -0,0 +1,183 @@
+"""
+Daily Garmin metrics synced by daily-metrics.py.
+
+Each entry is a declaration for the engine in metric_sync.py. Every metric
+database uses the same two key columns as the health database: a title
+'Date' (dd.mm.yyyy) and a date property 'Full Date'.
+"""
+
+from datetime import datetime
+
+from metric_sync import MetricSource
+
+
+def day_title(day: str) -> dict:
+    try:
+        title = datetime.strptime(day, "%Y-%m-%d").strftime("%d.%m.%Y")
+    except (TypeError, ValueError):
+        title = day or "Unknown"
+    return {"title": [{"text": {"content": title}}]}
+
+
+def _base(day: str) -> dict:
+    return {"Date": day_title(day), "Full Date": {"date": {"start": day}}}
+
+
+def _number(value, digits=None):
+    if value is None:
+        return {"number": None}
+    return {"number": round(value, digits) if digits is not None else value}
+
+
+def _select(value):
+    return {"select": {"name": str(value).replace("_", " ").title()} if value else None}
+
+
+# -----------------------------
+# Stress
+# -----------------------------
+def stress_properties(p: dict):
+    if p.get("avgStressLevel") is None or p["avgStressLevel"] < 0:
+        return None
+    return {
+        **_base(p["calendarDate"]),
+        "Avg Stress": _number(p.get("avgStressLevel")),
+        "Max Stress": _number(p.get("maxStressLevel")),
+    }
+
+
+# -----------------------------
+# Body Battery
+# -----------------------------
+def _battery_levels(p: dict) -> list:
+    # Entries are [timestamp, level] or [timestamp, status, level, version]
+    levels = []
+    for entry in p.get("bodyBatteryValuesArray") or []:
+        value = entry[1] if len(entry) == 2 else entry[2] if len(entry) > 2 else None
+        if isinstance(value, (int, float)):
+            levels.append(value)
+    return levels
+
+
+def body_battery_properties(p: dict):
+    levels = _battery_levels(p)
+    if not levels and p.get("charged") is None:
+        return None
+    return {
+        **_base(p["date"]),
+        "Charged": _number(p.get("charged")),
+        "Drained": _number(p.get("drained")),
+        "Highest": _number(max(levels) if levels else None),
+        "Lowest": _number(min(levels) if levels else None),
+    }
+
+
+# -----------------------------
+# HRV status
+# -----------------------------
+def _hrv_summary(p: dict) -> dict:
+    return (p or {}).get("hrvSummary") or {}
+
+
+def hrv_properties(p: dict):
+    summary = _hrv_summary(p)
+    if summary.get("lastNightAvg") is None:
+        return None
+    baseline = summary.get("baseline") or {}
+    return {
+        **_base(summary["calendarDate"]),
+        "Last Night Avg": _number(summary.get("lastNightAvg")),
+        "Last Night 5-min High": _number(summary.get("lastNight5MinHigh")),
+        "Weekly Avg": _number(summary.get("weeklyAvg")),
+        "Baseline Low": _number(baseline.get("balancedLow")),
+        "Baseline High": _number(baseline.get("balancedUpper")),
+        "Status": _select(summary.get("status")),
+    }
+
+
+# -----------------------------
+# Training readiness
+# -----------------------------
+def fetch_training_readiness(garmin, day: str):
+    # Several readings per day are possible; keep the latest one
+    readings = garmin.get_training_readiness(day) or []
+    if isinstance(readings, dict):
+        readings = [readings]
+    readings = [r for r in readings if r.get("score") is not None]
+    return max(readings, key=lambda r: r.get("timestamp") or "") if readings else None
+
+
+def readiness_properties(p: dict):
+    recovery = p.get("recoveryTime")
+    return {
+        **_base(p["calendarDate"]),
+        "Score": _number(p.get("score")),
+        "Level": _select(p.get("level")),
+        "Sleep Score": _number(p.get("sleepScore")),
+        "Recovery Time (h)": _number(recovery / 60 if recovery is not None else None, 1),
+        "HRV Factor (%)": _number(p.get("hrvFactorPercent")),
+        "Acute Load": _number(p.get("acuteLoad")),
+    }
+
+
+# -----------------------------
+# Hydration
+# -----------------------------
+def hydration_properties(p: dict):
+    if not p or p.get("valueInML") is None:
+        return None
+    return {
+        **_base(p["calendarDate"]),
+        "Intake (ml)": _number(p.get("valueInML"), 0),
+        "Goal (ml)": _number(p.get("goalInML"), 0),
+        "Sweat Loss (ml)": _number(p.get("sweatLossInML"), 0),
+    }
+
+
+SOURCES = [
+    MetricSource(
+        name="stress",
+        db_env="NOTION_STRESS_DB_ID",
+        fetch_day=lambda garmin, day: garmin.get_stress_data(day),
+        key=lambda p: p.get("calendarDate"),
+        properties=stress_properties,
+        icon="😰",
+    ),
+    MetricSource(
+        name="body-battery",
+        db_env="NOTION_BODY_BATTERY_DB_ID",
+        fetch_range=lambda garmin, start, end: garmin.get_body_battery(start, end),
+        key=lambda p: p.get("date"),
+        properties=body_battery_properties,
+        icon="🔋",
+    ),
+    MetricSource(
+        name="hrv",
+        db_env="NOTION_HRV_DB_ID",
+        fetch_day=lambda garmin, day: garmin.get_hrv_data(day),
+        key=lambda p: _hrv_summary(p).get("calendarDate"),
+        properties=hrv_properties,
+        icon="💗",
+        include_today=True,
+    ),
+    MetricSource(
+        name="training-readiness",
+        db_env="NOTION_READINESS_DB_ID",
+        fetch_day=fetch_training_readiness,
+        key=lambda p: p.get("calendarDate"),
+        properties=readiness_properties,
+        # Readiness is recomputed during the day; only a real score change is worth a write
+        diff_fields=("Score", "Level"),
+        icon="🚦",
+        include_today=True,
+    ),
+    MetricSource(
+        name="hydration",
+        db_env="NOTION_HYDRATION_DB_ID",
+        fetch_day=lambda garmin, day: garmin.get_hydration_data(day),
+        key=lambda p: p.get("calendarDate"),
+        properties=hydration_properties,
+        tolerance={"Sweat Loss (ml)": 10},
+        icon="💧",
+    ),
+]
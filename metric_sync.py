@@ -0,0 +1,198 @@
+"""
+Generic sync engine for daily Garmin metrics.
+
+A metric is declared as a MetricSource: how to fetch it from Garmin (per day,
+or per date range when the endpoint supports it), its natural key, how it maps
+to Notion properties and which changes are worth an update. The engine does
+the rest: range batching, concurrent per-day fetches, bulk dedupe against the
+Notion mirror, plan/apply and remembering the last synced day per source.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Callable, Optional
+
+from autotune import measure, tuned
+from deadline import expired
+from local_dates import today
+from notion_index import load_index, page_date
+from sync_plan import create_op, new_plan, update_op
+from sync_state import load_json, save_json, state_path
+
+DEFAULT_LOOKBACK_DAYS = 7
+
+
+@dataclass
+class MetricSource:
+    name: str
+    # Env var holding the Notion database ID; sources without one are skipped
+    db_env: str
+    # payload -> Notion properties, or None to skip the payload
+    properties: Callable[[dict], Optional[dict]]
+    # payload -> natural key (calendar day, YYYY-MM-DD)
+    key: Callable[[dict], Optional[str]]
+    # garmin, "YYYY-MM-DD" -> payload or list of payloads
+    fetch_day: Optional[Callable] = None
+    # garmin, start, end -> list of payloads; preferred over fetch_day when set
+    fetch_range: Optional[Callable] = None
+    max_range_days: int = 28
+    # Notion date property holding the key
+    key_property: str = "Full Date"
+    # An existing row is only updated if one of these changed (None = any property)
+    diff_fields: Optional[tuple] = None
+    # Numeric properties whose changes within +/- tolerance are ignored
+    tolerance: dict = field(default_factory=dict)
+    icon: str = "📈"
+    # Whether today's (still changing) value is synced
+    include_today: bool = False
+
+
+# -----------------------------
+# State
+# -----------------------------
+def _state_file(source: MetricSource) -> str:
+    return state_path("metrics", f"{source.name}.json")
+
+
+def days_to_sync(source: MetricSource, backfill_days: int = None) -> list:
+    """
+    Calendar days to fetch for a source: from the last synced day (re-read, it
+    may have been partial) up to yesterday or today. The first run, or an
+    explicit backfill, looks back a fixed number of days instead.
+    """
+    end = today() if source.include_today else today() - timedelta(days=1)
+    state = load_json(_state_file(source), {})
+    if backfill_days:
+        start = end - timedelta(days=backfill_days - 1)
+    elif state.get("last_day"):
+        start = date.fromisoformat(state["last_day"])
+    else:
+        start = end - timedelta(days=DEFAULT_LOOKBACK_DAYS - 1)
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def record_synced(plan: dict) -> None:
+    """
+    Advance each source's last synced day once its plan has been applied. If
+    the deadline skipped some writes or some failed, a source stops at its
+    first unwritten day.
+    """
+    state = dict(plan.get("state") or {})
+    for op in plan.get("skipped") or []:
+        name, day = op["key"].rsplit(" ", 1)
+        if name in state:
+            state[name] = min(state[name], day)
+    for name, last_day in state.items():
+        save_json(state_path("metrics", f"{name}.json"), {"last_day": last_day})
+
+
+# -----------------------------
+# Fetching
+# -----------------------------
+def _as_list(payload) -> list:
+    if payload is None:
+        return []
+    return payload if isinstance(payload, list) else [payload]
+
+
+def fetch_payloads(garmin, source: MetricSource, days: list, workers: int = None):
+    """
+    All payloads for the given days: one call per range chunk when the source
+    can fetch ranges, otherwise per-day calls spread over a thread pool of
+    `workers` (default: the tuned garmin.workers, see autotune.py).
+    Returns (payloads, failed_days).
+    """
+    workers = workers or tuned("garmin.workers")
+    if source.fetch_range:
+        chunks = [days[i:i + source.max_range_days] for i in range(0, len(days), source.max_range_days)]
+        call = lambda chunk: source.fetch_range(garmin, chunk[0].isoformat(), chunk[-1].isoformat())
+    else:
+        chunks = [[day] for day in days]
+        call = lambda chunk: source.fetch_day(garmin, chunk[0].isoformat())
+
+    def fetch(chunk):
+        if expired():
+            # Treated like a failure: the day is fetched again next run
+            return [], chunk
+        try:
+            with measure("garmin.workers"):
+                return _as_list(call(chunk)), []
+        except Exception as e:
+            print(f"{source.name}: error fetching {chunk[0]}..{chunk[-1]}: {e}")
+            return [], chunk
+
+    payloads, failed = [], []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch, missed in pool.map(fetch, chunks):
+            payloads += batch
+            failed += missed
+    return payloads, failed
+
+
+# -----------------------------
+# Planning
+# -----------------------------
+def _apply_rules(source: MetricSource, op):
+    if not op:
+        return None
+    for name, tol in source.tolerance.items():
+        change = op["diff"].get(name)
+        if change and isinstance(change["old"], (int, float)) and isinstance(change["new"], (int, float)) \
+                and abs(change["old"] - change["new"]) <= tol:
+            del op["diff"][name]
+            del op["properties"][name]
+    if source.diff_fields is not None and not any(name in op["diff"] for name in source.diff_fields):
+        return None
+    return op if op["diff"] else None
+
+
+def plan_source(source: MetricSource, database_id: str, payloads: list, index: dict) -> list:
+    """
+    Create/update operations for one source. Payloads are deduplicated by key
+    (the last one wins) before being compared with the Notion index.
+    """
+    latest = {}
+    for payload in payloads:
+        key = source.key(payload)
+        if key:
+            latest[key] = payload
+
+    ops = []
+    for key in sorted(latest):
+        properties = source.properties(latest[key])
+        if not properties:
+            continue
+        existing = index.get(key)
+        if existing:
+            ops.append(_apply_rules(source, update_op(existing, f"{source.name} {key}", properties)))
+        else:
+            ops.append(create_op(database_id, f"{source.name} {key}", properties, icon={"emoji": source.icon}))
+    return [op for op in ops if op]
+
+
+def build_metrics_plan(garmin, client, sources: list, database_ids: dict,
+                       backfill_days: int = None, workers: int = None) -> dict:
+    """
+    One plan covering every configured source. The plan carries the day each
+    source will have reached once applied, so --apply can record it later.
+    """
+    ops = []
+    state = {}
+    for source in sources:
+        if expired():
+            print(f"Deadline reached: {source.name} and later metrics left for the next run")
+            break
+        database_id = database_ids[source.name]
+        days = days_to_sync(source, backfill_days)
+        payloads, failed = fetch_payloads(garmin, source, days, workers)
+        index = load_index(client, database_id, lambda page, s=source: page_date(page, s.key_property))
+        ops += plan_source(source, database_id, payloads, index)
+        # A failed day is retried next run, so never advance past it
+        if days:
+            state[source.name] = (min(failed) if failed else days[-1]).isoformat()
+        print(f"{source.name}: {len(payloads)} payload(s) for {len(days)} day(s)")
+
+    plan = new_plan("daily-metrics", ops)
+    plan["state"] = state
+    return plan
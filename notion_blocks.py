@@ -0,0 +1,184 @@
+"""
+Notion page bodies for activities: summary, HR zones and a table of splits/laps.
+
+Blocks are packed into as few blocks.children.append calls as possible (Notion
+accepts at most 100 blocks per request, counting nested table rows). Bodies are
+only rewritten when the hash of the underlying split data changes; the hashes
+live in SYNC_STATE_DIR/activity_bodies.json, keyed by Garmin activityId.
+"""
+
+import hashlib
+import json
+
+from autotune import measure, tuned
+from formatting import format_clock, format_pace, km
+from sync_state import load_json, save_json, state_path
+
+MAX_BLOCKS_PER_REQUEST = 100
+
+
+# -----------------------------
+# Block builders
+# -----------------------------
+def _text(content: str) -> list:
+    return [{"type": "text", "text": {"content": str(content)}}]
+
+
+def heading(content: str) -> dict:
+    return {"object": "block", "type": "heading_2", "heading_2": {"rich_text": _text(content)}}
+
+
+def bullet(content: str) -> dict:
+    return {"object": "block", "type": "bulleted_list_item", "bulleted_list_item": {"rich_text": _text(content)}}
+
+
+def table(header: list, rows: list) -> dict:
+    cells = lambda values: {"object": "block", "type": "table_row",
+                            "table_row": {"cells": [_text(v) for v in values]}}
+    return {
+        "object": "block",
+        "type": "table",
+        "table": {
+            "table_width": len(header),
+            "has_column_header": True,
+            "has_row_header": False,
+            "children": [cells(header)] + [cells(r) for r in rows],
+        },
+    }
+
+
+def _block_weight(block: dict) -> int:
+    # A table counts once for itself plus once per row
+    if block.get("type") == "table":
+        return 1 + len(block["table"]["children"])
+    return 1
+
+
+# -----------------------------
+# Activity body
+# -----------------------------
+def lap_rows(splits: dict) -> list:
+    rows = []
+    for i, lap in enumerate((splits or {}).get("lapDTOs") or [], start=1):
+        rows.append([
+            lap.get("lapIndex", i),
+            f"{km(lap.get('distance')):.2f}",
+            format_clock(lap.get("duration")),
+            format_pace(lap.get("averageSpeed"), suffix="") or "-",
+            round(lap["averageHR"]) if lap.get("averageHR") else "-",
+            round(lap["elevationGain"]) if lap.get("elevationGain") is not None else "-",
+        ])
+    return rows
+
+
+def activity_body_blocks(activity: dict, splits: dict, hr_zones: list) -> list:
+    """
+    Summary bullets, time in each HR zone and one table row per lap/split.
+    """
+    blocks = [heading("Summary")]
+    summary = [
+        f"Distance: {km(activity.get('distance')):.2f} km",
+        f"Time: {format_clock(activity.get('duration'))}",
+        f"Avg pace: {format_pace(activity.get('averageSpeed')) or '-'}",
+    ]
+    if activity.get("averageHR"):
+        summary.append(f"Avg / max HR: {round(activity['averageHR'])} / {round(activity.get('maxHR') or 0)} bpm")
+    if activity.get("elevationGain") is not None:
+        summary.append(f"Elevation gain: {round(activity['elevationGain'])} m")
+    blocks += [bullet(line) for line in summary]
+
+    zones = [z for z in (hr_zones or []) if z.get("secsInZone")]
+    if zones:
+        blocks.append(heading("Heart rate zones"))
+        blocks += [
+            bullet(f"Zone {z.get('zoneNumber')} (≥{z.get('zoneLowBoundary')} bpm): {format_clock(z['secsInZone'])}")
+            for z in zones
+        ]
+
+    rows = lap_rows(splits)
+    if rows:
+        blocks.append(heading("Splits"))
+        header = ["#", "km", "Time", "Pace", "Avg HR", "Gain (m)"]
+        # Keep every table (header + rows + the table itself) within one request
+        per_table = MAX_BLOCKS_PER_REQUEST - 2
+        for i in range(0, len(rows), per_table):
+            blocks.append(table(header, rows[i:i + per_table]))
+    return blocks
+
+
+def body_hash(activity: dict, splits: dict, hr_zones: list) -> str:
+    data = {
+        "laps": lap_rows(splits),
+        "zones": [(z.get("zoneNumber"), z.get("secsInZone")) for z in hr_zones or []],
+        "summary": [activity.get(k) for k in ("distance", "duration", "averageSpeed", "averageHR", "maxHR", "elevationGain")],
+    }
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+# -----------------------------
+# Writing
+# -----------------------------
+def pack_blocks(blocks: list, limit: int = MAX_BLOCKS_PER_REQUEST) -> list:
+    """
+    Split blocks into the fewest consecutive batches of at most `limit` (weighted) blocks.
+    """
+    batches, current, weight = [], [], 0
+    for block in blocks:
+        w = _block_weight(block)
+        if current and weight + w > limit:
+            batches.append(current)
+            current, weight = [], 0
+        current.append(block)
+        weight += w
+    if current:
+        batches.append(current)
+    return batches
+
+
+def append_blocks(client, page_id: str, blocks: list) -> None:
+    for batch in pack_blocks(blocks):
+        client.blocks.children.append(block_id=page_id, children=batch)
+
+
+def clear_body(client, page_id: str) -> None:
+    cursor = None
+    ids = []
+    while True:
+        params = {"block_id": page_id, "page_size": tuned("notion.page_size")}
+        if cursor:
+            params["start_cursor"] = cursor
+        with measure("notion.page_size"):
+            response = client.blocks.children.list(**params)
+        ids += [b["id"] for b in response.get("results", [])]
+        if not response.get("has_more"):
+            break
+        cursor = response.get("next_cursor")
+    for block_id in ids:
+        client.blocks.delete(block_id=block_id)
+
+
+def replace_body(client, page_id: str, blocks: list) -> None:
+    clear_body(client, page_id)
+    append_blocks(client, page_id, blocks)
+
+
+# -----------------------------
+# Hash state
+# -----------------------------
+def _hash_file() -> str:
+    return state_path("activity_bodies.json")
+
+
+def load_body_hashes() -> dict:
+    return load_json(_hash_file(), {})
+
+
+def record_body_hashes(plan: dict) -> None:
+    """
+    Remember the split-data hash of every body written by an applied plan.
+    """
+    written = {str(op["activity_id"]): op["body_hash"] for op in plan["operations"] if op.get("body_hash")}
+    if written:
+        hashes = load_body_hashes()
+        hashes.update(written)
+        save_json(_hash_file(), hashes)
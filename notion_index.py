@@ -0,0 +1,283 @@
+"""
+Bulk Notion database loading.
+
+Instead of asking Notion "does this row exist?" once per Garmin record, the
+sync scripts read a whole database once and look rows up locally by key.
+
+Each database is mirrored locally (see sync_state.py). A run only queries the
+pages whose last_edited_time is at or after the previous watermark; every
+NOTION_FULL_SYNC_DAYS days (default 7) the mirror is rebuilt from a full read
+so pages deleted or archived in Notion drop out of it. Pages the sync scripts
+write are folded in as they are applied (fold_pages), so the mirror, and
+report.py reading it, includes them before the next read.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+from autotune import measure, tuned
+from local_dates import local_day
+from profiling import stage
+from sync_state import load_json, save_json, state_path
+
+MIRROR_VERSION = 2
+
+# Set when Notion is not a write target (see sinks.py): planning then reads the
+# last mirrored state without querying Notion
+_local_only = False
+
+# Parsed mirrors by file path, with the file's mtime when they were read or written
+_mirrors = {}
+
+
+# -----------------------------
+# Querying
+# -----------------------------
+def query_all(client, database_id: str, **query):
+    """
+    Yield every page matching a database query, following Notion's pagination cursor.
+    Extra keyword arguments (filter, sorts) are passed straight to databases.query.
+    """
+    cursor = None
+    while True:
+        params = {"database_id": database_id, "page_size": tuned("notion.page_size"), **query}
+        if cursor:
+            params["start_cursor"] = cursor
+        with measure("notion.page_size"):
+            response = client.databases.query(**params)
+        yield from response.get("results", [])
+        if not response.get("has_more"):
+            return
+        cursor = response.get("next_cursor")
+
+
+# -----------------------------
+# Local mirror
+# -----------------------------
+def _mirror_path(database_id: str) -> str:
+    return state_path("notion", f"{database_id.replace('-', '')}.json")
+
+
+def _load_mirror(database_id: str) -> dict:
+    path = _mirror_path(database_id)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    cached = _mirrors.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    mirror = load_json(path) or {}
+    _mirrors[path] = (mtime, mirror)
+    return mirror
+
+
+def _save_mirror(database_id: str, mirror: dict) -> None:
+    path = _mirror_path(database_id)
+    save_json(path, mirror)
+    _mirrors[path] = (os.stat(path).st_mtime_ns, mirror)
+
+
+def _slim(page: dict) -> dict:
+    # Only what the scripts look at; keeps the mirror small for large databases
+    return {
+        "id": page["id"],
+        "database_id": ((page.get("parent") or {}).get("database_id") or "").replace("-", ""),
+        "last_edited_time": page.get("last_edited_time"),
+        "archived": page.get("archived", False) or page.get("in_trash", False),
+        "properties": page.get("properties", {}),
+    }
+
+
+def _full_sync_due(mirror: dict, now: datetime) -> bool:
+    last_full = mirror.get("last_full_sync")
+    if not last_full:
+        return True
+    days = float(os.getenv("NOTION_FULL_SYNC_DAYS", "7"))
+    return now - datetime.fromisoformat(last_full) >= timedelta(days=days)
+
+
+def refresh_mirror(client, database_id: str, full: bool = False) -> dict:
+    """
+    Bring the local mirror of a database up to date and return it.
+
+    Incremental refreshes query `last_edited_time on_or_after watermark`, sorted
+    ascending. Notion rounds last_edited_time to the minute, so pages edited in
+    the watermark minute are read again; that overlap is harmless. Deleted or
+    archived pages never show up in an incremental query, which is why a full
+    reconciliation still runs periodically (or when full=True).
+    """
+    now = datetime.now(timezone.utc)
+    mirror = _load_mirror(database_id)
+    if mirror.get("version") != MIRROR_VERSION or mirror.get("database_id") != database_id:
+        mirror = {}
+
+    full = full or not mirror or _full_sync_due(mirror, now)
+    if full:
+        pages = {}
+        query = {}
+    else:
+        pages = dict(mirror["pages"])
+        query = {
+            "filter": {"timestamp": "last_edited_time",
+                       "last_edited_time": {"on_or_after": mirror["watermark"]}},
+            "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+        }
+
+    watermark = mirror.get("watermark")
+    fetched = 0
+    for page in query_all(client, database_id, **query):
+        fetched += 1
+        slim = _slim(page)
+        if slim["archived"]:
+            pages.pop(slim["id"], None)
+        else:
+            pages[slim["id"]] = slim
+        edited = slim["last_edited_time"]
+        if edited and (not watermark or edited > watermark):
+            watermark = edited
+
+    mirror = {
+        "version": MIRROR_VERSION,
+        "database_id": database_id,
+        "watermark": watermark or now.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "last_full_sync": now.isoformat() if full else mirror["last_full_sync"],
+        "pages": pages,
+    }
+    _save_mirror(database_id, mirror)
+    print(f"Notion mirror {database_id[:8]}…: {'full' if full else 'incremental'} read of {fetched} page(s), {len(pages)} cached")
+    return mirror
+
+
+def use_local_mirror(enabled: bool = True) -> None:
+    global _local_only
+    _local_only = enabled
+
+
+def mirror_pages(client, database_id: str, full: bool = False) -> list:
+    """
+    All live pages of a database, served from the refreshed local mirror.
+    """
+    if _local_only:
+        return cached_pages(database_id)
+    with stage("notion-read"):
+        return list(refresh_mirror(client, database_id, full=full)["pages"].values())
+
+
+def cached_pages(database_id: str) -> list:
+    """
+    Pages of a database as of the last sync, read from the local mirror only
+    (no Notion call). Empty if the database has never been mirrored.
+    """
+    mirror = _load_mirror(database_id)
+    return list((mirror.get("pages") or {}).values())
+
+
+def fold_pages(pages: list) -> None:
+    """
+    Put pages just returned by pages.create/pages.update into their databases'
+    mirrors. The watermark stays put, so the next incremental read still
+    fetches them and Notion's own version wins.
+    """
+    by_database = {}
+    for page in pages:
+        slim = _slim(page)
+        if slim["database_id"]:
+            by_database.setdefault(slim["database_id"], []).append(slim)
+    for database_id, slims in by_database.items():
+        mirror = _load_mirror(database_id)
+        if mirror.get("version") != MIRROR_VERSION or "pages" not in mirror:
+            continue
+        pages = dict(mirror["pages"])
+        for slim in slims:
+            if slim["archived"]:
+                pages.pop(slim["id"], None)
+            else:
+                pages[slim["id"]] = slim
+        _save_mirror(database_id, {**mirror, "pages": pages})
+
+
+def load_index(client, database_id: str, key_fn) -> dict:
+    """
+    Return {key: page} for a whole database. key_fn maps a page to its natural
+    key (or None to leave the page out). If two pages share a key the first one
+    wins, which mirrors the old `results[0]` lookups.
+    """
+    index = {}
+    for page in mirror_pages(client, database_id):
+        key = key_fn(page)
+        if key is not None and key not in index:
+            index[key] = page
+    return index
+
+
+# -----------------------------
+# Property access
+# -----------------------------
+def _plain_text(items) -> str:
+    # Read payloads carry plain_text, write payloads only text.content
+    return "".join(
+        (item.get("plain_text") if item.get("plain_text") is not None
+         else (item.get("text") or {}).get("content", ""))
+        for item in (items or [])
+    )
+
+
+def _normalize_datetime(value):
+    """
+    Notion echoes '2025-08-05T06:12:34.000Z' back as '2025-08-05T06:12:00.000+00:00',
+    so compare datetimes as UTC minutes. Plain dates are returned unchanged.
+    """
+    if not value or "T" not in value:
+        return value
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M")
+
+
+def property_value(prop):
+    """
+    Reduce a Notion property (either as read from a page or as written in a
+    create/update payload) to a plain comparable Python value.
+    """
+    if not prop:
+        return None
+    if "title" in prop:
+        return _plain_text(prop["title"])
+    if "rich_text" in prop:
+        return _plain_text(prop["rich_text"])
+    if "number" in prop:
+        return prop["number"]
+    if "checkbox" in prop:
+        return bool(prop["checkbox"])
+    if "select" in prop:
+        return (prop["select"] or {}).get("name")
+    if "date" in prop:
+        date = prop["date"] or {}
+        start = _normalize_datetime(date.get("start"))
+        end = _normalize_datetime(date.get("end"))
+        return [start, end] if end else start
+    if "relation" in prop:
+        return sorted(r.get("id", "").replace("-", "") for r in prop["relation"] or [])
+    if "url" in prop:
+        return prop["url"]
+    return None
+
+
+def page_value(page: dict, name: str):
+    """
+    Plain value of one property of a Notion page, or None if it is missing.
+    """
+    return property_value((page.get("properties") or {}).get(name))
+
+
+def page_date(page: dict, name: str):
+    """
+    The calendar day (YYYY-MM-DD, in the sync time zone) of a date property, or None.
+    """
+    date = ((page.get("properties") or {}).get(name) or {}).get("date") or {}
+    return local_day(date.get("start"))
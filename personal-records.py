@@ -1,10 +1,18 @@
 from datetime import date, datetime
-from garminconnect import Garmin
-from notion_client import Client
 from dotenv import load_dotenv
+import argparse
 import os
 import sys
 
+from formatting import METERS_PER_MILE, format_clock, format_elevation, format_int, format_pace_for_effort
+from garmin_session import login_to_garmin
+from local_dates import local_day
+from notion_index import mirror_pages, page_date, page_value
+from pr_timeline import record_timeline, update_timeline
+from relations import ActivityLinks, activities_database_id, load_activity_links
+from sync_plan import add_plan_arguments, create_op, new_plan, run_plan_cli, update_op
+from transport import shared_notion_client
+
 def get_icon_for_record(activity_name):
     icon_map = {
         "1K": "🥇",
@@ -49,97 +57,36 @@ def format_activity_name(activity_name):
         return "Unnamed Activity"
     return activity_name
 
-def format_garmin_value(value, activity_type, typeId):
-    if typeId  == 1:  # 1K
-        total_seconds = round(value)  # Round to the nearest second
-        minutes = total_seconds // 60
-        seconds = total_seconds % 60
-        formatted_value = f"{minutes}:{seconds:02d} /km"
-        pace = formatted_value  # For these types, the value is the pace
-        return formatted_value, pace
-
-    if typeId  == 2:  # 1mile
-        total_seconds = round(value)  # Round to the nearest second
-        minutes = total_seconds // 60
-        seconds = total_seconds % 60
-        formatted_value = f"{minutes}:{seconds:02d}"
-        total_pseconds = total_seconds / 1.60934  # Divide by 1.60934 to get pace per km
-        pminutes = int(total_pseconds // 60)      # Convert to integer
-        pseconds = int(total_pseconds % 60)       # Convert to integer
-        formatted_pace = f"{pminutes}:{pseconds:02d} /km"
-        return formatted_value, formatted_pace
+# typeId -> distance in meters for the timed-distance records
+RECORD_DISTANCES = {1: 1000, 2: METERS_PER_MILE, 3: 5000, 4: 10000}
 
-    if typeId == 3:  # 5K
-        total_seconds = round(value) 
-        minutes = total_seconds // 60
-        seconds = total_seconds % 60
-        formatted_value = f"{minutes}:{seconds:02d}"
-        total_pseconds = total_seconds // 5  # Divide by 5km
-        pminutes = total_pseconds // 60
-        pseconds = total_pseconds % 60
-        formatted_pace = f"{pminutes}:{pseconds:02d} /km"
-        return formatted_value, formatted_pace
+def format_garmin_value(value, activity_type, typeId):
+    if typeId == 1:  # 1K: the time is the pace
+        formatted_value = f"{format_clock(value)} /km"
+        return formatted_value, formatted_value
 
-    if typeId == 4:  # 10K
-        # Round to the nearest second
-        total_seconds = round(value)
-        hours = total_seconds // 3600
-        minutes = (total_seconds % 3600) // 60
-        seconds = total_seconds % 60
-        if hours > 0:
-            formatted_value = f"{hours}:{minutes:02d}:{seconds:02d}"
-        else:
-            formatted_value = f"{minutes}:{seconds:02d}"
-        total_pseconds = total_seconds // 10  # Divide by 10km
-        phours = total_pseconds // 3600
-        pminutes = (total_pseconds % 3600) // 60
-        pseconds = total_pseconds % 60
-        formatted_pace = f"{pminutes}:{pseconds:02d} /km"
+    if typeId in RECORD_DISTANCES:  # 1mi, 5K, 10K
+        formatted_value = format_clock(value)
+        formatted_pace = format_pace_for_effort(value, RECORD_DISTANCES[typeId])
         return formatted_value, formatted_pace
 
     if typeId in [7, 8]:  # Longest Run, Longest Ride
-        value_km = value / 1000
-        formatted_value = f"{value_km:.2f} km"
-        pace = ""  # No pace for these types
-        return formatted_value, pace
+        return f"{value / 1000:.2f} km", ""
 
     if typeId == 9:  # Total Ascent
-        value_m = int(value)
-        formatted_value = f"{value_m:,} m"
-        pace = ""
-        return formatted_value, pace
+        return format_elevation(value), ""
 
     if typeId == 10:  # Max Avg Power
-        value_w = round(value)
-        formatted_value = f"{value_w} W"
-        pace = ""
-        return formatted_value, pace
+        return f"{round(value)} W", ""
 
     if typeId in [12, 13, 14]:  # Step counts
-        value_steps = round(value)
-        formatted_value = f"{value_steps:,}"
-        pace = ""
-        return formatted_value, pace
+        return format_int(value), ""
 
     if typeId == 15:  # Longest Goal Streak
-        value_days = round(value)
-        formatted_value = f"{value_days} days"
-        pace = ""
-        return formatted_value, pace
+        return f"{round(value)} days", ""
 
     # Default case
-    if int(value // 60) < 60:  # If total time is less than an hour
-        minutes = int(value // 60)
-        seconds = round((value / 60 - minutes) * 60, 2)
-        formatted_value = f"{minutes}:{seconds:05.2f}"
-    else:  # If total time is one hour or more
-        hours = int(value // 3600)
-        minutes = int((value % 3600) // 60)
-        seconds = round(value % 60, 2)
-        formatted_value = f"{hours}:{minutes:02}:{seconds:05.2f}"
-    
-    pace = ""
-    return formatted_value, pace
+    return format_clock(value, decimals=2), ""
 
 def replace_activity_name_by_typeId(typeId):
     typeId_name_map = {
@@ -158,31 +105,27 @@ def replace_activity_name_by_typeId(typeId):
     }
     return typeId_name_map.get(typeId, "Unnamed Activity")
 
-def get_existing_record(client, database_id, activity_name):
-    query = client.databases.query(
-        database_id=database_id,
-        filter={
-            "and": [
-                {"property": "Record", "title": {"equals": activity_name}},
-                {"property": "PR", "checkbox": {"equals": True}}
-            ]
-        }
-    )
-    return query['results'][0] if query['results'] else None
-
-def get_record_by_date_and_name(client, database_id, activity_date, activity_name):
-    query = client.databases.query(
-        database_id=database_id,
-        filter={
-            "and": [
-                {"property": "Record", "title": {"equals": activity_name}},
-                {"property": "Date", "date": {"equals": activity_date}}
-            ]
-        }
-    )
-    return query['results'][0] if query['results'] else None
-
-def update_record(client, page_id, activity_date, value, pace, activity_name, is_pr=True):
+def load_record_index(client, database_id):
+    """
+    Read the whole PR database once. Returns (current, by_date):
+      current  - {record name: page} for rows with PR = true
+      by_date  - {(record name, date): page} for every row
+    """
+    current = {}
+    by_date = {}
+    for page in mirror_pages(client, database_id):
+        activity_name = page_value(page, "Record")
+        by_date.setdefault((activity_name, page_date(page, "Date")), page)
+        if page_value(page, "PR"):
+            current.setdefault(activity_name, page)
+    return current, by_date
+
+def record_icon_and_cover(activity_name):
+    icon = get_icon_for_record(activity_name)
+    cover = get_cover_for_record(activity_name)
+    return {"emoji": icon}, {"type": "external", "external": {"url": cover}}
+
+def update_record_properties(activity_date, value, pace, is_pr=True):
     properties = {
         "Date": {"date": {"start": activity_date}},
         "PR": {"checkbox": is_pr}
@@ -194,21 +137,9 @@ def update_record(client, page_id, activity_date, value, pace, activity_name, is
     if pace:
         properties["Pace"] = {"rich_text": [{"text": {"content": pace}}]}
 
-    icon = get_icon_for_record(activity_name)
-    cover = get_cover_for_record(activity_name)
+    return properties
 
-    try:
-        client.pages.update(
-            page_id=page_id,
-            properties=properties,
-            icon={"emoji": icon},
-            cover={"type": "external", "external": {"url": cover}}
-        )
-        
-    except Exception as e:
-        print(f"Error updating record: {e}")
-
-def write_new_record(client, database_id, activity_date, activity_type, activity_name, typeId, value, pace):
+def new_record_properties(activity_date, activity_type, activity_name, typeId, value, pace):
     properties = {
         "Date": {"date": {"start": activity_date}},
         "Activity Type": {"select": {"name": activity_type}},
@@ -223,91 +154,46 @@ def write_new_record(client, database_id, activity_date, activity_type, activity
     if pace:
         properties["Pace"] = {"rich_text": [{"text": {"content": pace}}]}
     
-    icon = get_icon_for_record(activity_name)
-    cover = get_cover_for_record(activity_name)
+    return properties
 
-    try:
-        client.pages.create(
-            parent={"database_id": database_id},
-            properties=properties,
-            icon={"emoji": icon},
-            cover={"type": "external", "external": {"url": cover}}
-        )
-    except Exception as e:
-        print(f"Error writing new record: {e}")
-
-def login_to_garmin():
+def record_activity_link(record, links):
     """
-    Login to Garmin Connect with 2FA support
+    Relation to the activity that set a record (none for step records, which have no activity).
     """
-    garmin_email = os.getenv("GARMIN_EMAIL")
-    garmin_password = os.getenv("GARMIN_PASSWORD")
-    token_store = os.getenv("GARMIN_TOKEN_STORE", "~/.garmin_tokens")
-    token_store = os.path.expanduser(token_store)
-    mfa_code = os.getenv("GARMIN_MFA_CODE")  # Optional, for non-interactive 2FA
-    
-    # Initialize Garmin client
-    garmin = Garmin(garmin_email, garmin_password)
-    
-    try:
-        # First try to use token store if it exists
-        if os.path.exists(token_store):
-            print(f"Using stored tokens from {token_store}")
-            garmin.login(tokenstore=token_store)
-            return garmin
-        
-        # If no token store or it failed, try fresh login
-        if mfa_code:
-            # Use non-interactive 2FA flow
-            print("Using non-interactive 2FA flow")
-            client_state, _ = garmin.login(return_on_mfa=True)
-            if client_state == "needs_mfa":
-                garmin.resume_login(client_state, mfa_code)
-            else:
-                print("MFA was expected but not requested")
-        else:
-            # Use interactive login (will prompt for MFA code if needed)
-            garmin.login()
-        
-        # Save tokens for future use if login was successful
-        if hasattr(garmin, 'garth') and garmin.garth:
-            # Make sure token store directory exists
-            os.makedirs(os.path.dirname(token_store), exist_ok=True)
-            garmin.garth.save(token_store)
-            print(f"Saved authentication tokens to {token_store}")
-        
-        return garmin
-    except Exception as e:
-        print(f"Error during Garmin login: {e}")
-        sys.exit(1)
-
-def main():
-    load_dotenv()
+    if not record.get('activityId'):
+        return {}
+    activity_date = record.get('prStartTimeGmtFormatted') or ""
+    return links.activity_properties(local_day(activity_date), record.get('activityName') or "Unnamed Activity",
+                                     gmt_day=activity_date[:10])
 
-    # Get environment variables
-    notion_token = os.getenv("NOTION_TOKEN")
-    database_id = os.getenv("NOTION_PR_DB_ID")
-
-    # Login to Garmin with 2FA support
-    garmin = login_to_garmin()
-    client = Client(auth=notion_token)
-
-    records = garmin.get_personal_record()
-    filtered_records = [record for record in records if record.get('typeId') != 16]
-
-    for record in filtered_records:
+def plan_records(database_id, records, current, by_date, links=None):
+    """
+    Work out the PR rows to create, update and archive for Garmin's current records.
+    """
+    links = links or ActivityLinks([])
+    ops = []
+    for record in records:
         activity_date = record.get('prStartTimeGmtFormatted')
         activity_type = format_activity_type(record.get('activityType'))
         activity_name = replace_activity_name_by_typeId(record.get('typeId'))
         typeId = record.get('typeId', 0)
         value, pace = format_garmin_value(record.get('value', 0), activity_type, typeId)
+        icon, cover = record_icon_and_cover(activity_name)
+        key = f"{activity_name} {activity_date}"
+        link = record_activity_link(record, links)
+
+        existing_pr_record = current.get(activity_name)
+        existing_date_record = by_date.get((activity_name, local_day(activity_date)))
 
-        existing_pr_record = get_existing_record(client, database_id, activity_name)
-        existing_date_record = get_record_by_date_and_name(client, database_id, activity_date, activity_name)
+        def new_record_op():
+            properties = new_record_properties(activity_date, activity_type, activity_name, typeId, value, pace)
+            properties.update(link)
+            return create_op(database_id, key, properties, icon=icon, cover=cover)
 
         if existing_date_record:
-            update_record(client, existing_date_record['id'], activity_date, value, pace, activity_name, True)
-            print(f"Updated existing record: {activity_type} - {activity_name}")
+            ops.append(update_op(existing_date_record, key,
+                                 {**update_record_properties(activity_date, value, pace, True), **link},
+                                 icon=icon, cover=cover))
         elif existing_pr_record:
             # Add error handling here
             try:
@@ -316,25 +202,93 @@ def main():
                     existing_date = date_prop['date']['start']
                     
                     if activity_date > existing_date:
-                        update_record(client, existing_pr_record['id'], existing_date, None, None, activity_name, False)
-                        print(f"Archived old record: {activity_type} - {activity_name}")
-                        
-                        write_new_record(client, database_id, activity_date, activity_type, activity_name, typeId, value, pace)
-                        print(f"Created new PR record: {activity_type} - {activity_name}")
+                        archive = update_op(existing_pr_record, f"{activity_name} {existing_date}",
+                                            update_record_properties(existing_date, None, None, False),
+                                            icon=icon, cover=cover, action="archive")
+                        create = new_record_op()
+                        # Applied back to back, so a deadline never leaves two PR = true rows
+                        for op in (archive, create):
+                            if op:
+                                op["group"] = key
+                        ops += [archive, create]
                     else:
                         print(f"No update needed: {activity_type} - {activity_name}")
                 else:
                     # Handle case where date is missing or improperly formatted
                     print(f"Warning: Record {activity_name} has invalid date format - updating anyway")
-                    update_record(client, existing_pr_record['id'], activity_date, value, pace, activity_name, True)
+                    ops.append(update_op(existing_pr_record, key,
+                                         update_record_properties(activity_date, value, pace, True), icon=icon, cover=cover))
             except (KeyError, TypeError) as e:
                 print(f"Error processing record {activity_name}: {e}")
                 print(f"Record data: {existing_pr_record['properties']}")
                 # Fallback - create new record if we can't process the existing one properly
-                write_new_record(client, database_id, activity_date, activity_type, activity_name, typeId, value, pace)
+                ops.append(new_record_op())
         else:
-            write_new_record(client, database_id, activity_date, activity_type, activity_name, typeId, value, pace)
-            print(f"Successfully written new record: {activity_type} - {activity_name}")
+            ops.append(new_record_op())
+    return new_plan("personal-records", ops)
+
+# typeId -> Activity Type of reconstructed records (the steps records are Walking)
+HISTORY_ACTIVITY_TYPES = {1: "Running", 2: "Running", 3: "Running", 4: "Running", 7: "Running",
+                          8: "Cycling", 9: "Cycling", 10: "Cycling"}
+
+def plan_history(database_id, progression, current, by_date):
+    """
+    PR = false rows for every earlier record in the reconstructed progression
+    that the database does not have yet. The current record itself stays with
+    Garmin's sync above.
+    """
+    by_type = {}
+    for entry in progression:
+        by_type.setdefault(entry["typeId"], []).append(entry)
+
+    ops = []
+    for typeId, entries in sorted(by_type.items()):
+        activity_name = replace_activity_name_by_typeId(typeId)
+        current_page = current.get(activity_name)
+        current_date = page_date(current_page, "Date") if current_page else None
+        history = [e for e in entries if e["day"] < current_date] if current_date else entries[:-1]
+        activity_type = HISTORY_ACTIVITY_TYPES.get(typeId, "Walking")
+        icon, cover = record_icon_and_cover(activity_name)
+        # Improved twice on one day: the row for that day shows the better value
+        latest = {e["day"]: e for e in history}
+        for entry in latest.values():
+            if (activity_name, entry["day"]) in by_date:
+                continue
+            value, pace = format_garmin_value(entry["value"], activity_type, typeId)
+            properties = new_record_properties(entry["day"], activity_type, activity_name, typeId, value, pace)
+            properties["PR"] = {"checkbox": False}
+            ops.append(create_op(database_id, f"{activity_name} {entry['day']}", properties, icon=icon, cover=cover))
+    return ops
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Sync Garmin personal records to Notion")
+    add_plan_arguments(parser)
+    parser.add_argument("--history", action="store_true",
+                        help="also add earlier records (PR = false) reconstructed from the local activity "
+                             "archive, the Activities mirror and stored daily steps")
+    args = parser.parse_args()
+
+    # Get environment variables
+    notion_token = os.getenv("NOTION_TOKEN")
+    database_id = os.getenv("NOTION_PR_DB_ID")
+    client = shared_notion_client(notion_token)
+
+    def build_plan():
+        # Login to Garmin with 2FA support
+        garmin = login_to_garmin()
+        records = garmin.get_personal_record()
+        filtered_records = [record for record in records if record.get('typeId') != 16]
+        current, by_date = load_record_index(client, database_id)
+        plan = plan_records(database_id, filtered_records, current, by_date, load_activity_links(client))
+        if args.history:
+            timeline = update_timeline(mirror_pages(client, activities_database_id()))
+            plan["operations"] += plan_history(database_id, timeline["progression"], current, by_date)
+            plan["pr_timeline"] = timeline
+        return plan
+
+    run_plan_cli(args, client, build_plan, after_apply=record_timeline)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+Personal-record progression rebuilt from local history.
+
+Garmin only reports the current record for each typeId. The full progression
+(every time a record was improved) is reconstructed here in one chronological
+sweep over the local activity archive (activity_archive.py), seeded with the
+Activities database mirror for history synced before the archive existed,
+and over the stored daily steps (step_streaks.py):
+
+  1-4   fastest 1K / mile / 5K / 10K   best efforts from decoded FIT streams
+  7, 8  longest run / ride             activity distance
+  9     total ascent (ride)            activity elevation gain
+  10    max avg power (20 min)         Garmin's max20MinPower or the FIT stream
+  12-14 most steps in a day/week/month daily steps and running week/month totals
+  15    longest goal streak            streak snapshots
+
+The sweep state (best so far per typeId, the progression and which
+activities and days it has seen) is kept in SYNC_STATE_DIR/records/timeline.json,
+so later runs only sweep what is new. Activities are told apart by activityId
+(mirror rows by Notion page ID), so two same-named activities on one day are
+both swept. An activity that started before the last one swept (a late upload)
+restarts the activity sweep from scratch; mirror rows only have a day and
+count as the end of it. The state is saved by record_timeline once the plan
+has been applied, so --plan leaves it alone.
+"""
+
+from datetime import date, timedelta, timezone
+
+from activity_archive import load_archive
+from activity_dedupe import sport_family
+from local_dates import parse_instant
+from notion_index import page_date, page_value
+from relations import activity_page_key
+from step_streaks import LONGEST, MONTH_TOTAL, STEPS, STREAK, WEEK_TOTAL, load_streaks, week_key
+from sync_state import load_json, save_json, state_path
+
+# typeId -> (sport family, archive field, higher is better)
+ACTIVITY_RECORDS = {
+    1: ("running", "1k", False),
+    2: ("running", "1mi", False),
+    3: ("running", "5k", False),
+    4: ("running", "10k", False),
+    7: ("running", "distance", True),
+    8: ("cycling", "distance", True),
+    9: ("cycling", "elevation_gain", True),
+    10: ("cycling", "power_20min", True),
+}
+STEP_RECORDS = (12, 13, 14, 15)
+
+
+def _timeline_file() -> str:
+    return state_path("records", "timeline.json")
+
+
+def _empty_state() -> dict:
+    return {"swept": [], "last_start": "", "steps_until": "", "best": {}, "progression": []}
+
+
+def _instant(start) -> str:
+    """
+    Sortable UTC 'YYYY-MM-DDTHH:MM:SS' for a GMT datetime or a bare local day (its last second).
+    """
+    if not start:
+        return ""
+    if len(start) == 10:
+        instant = parse_instant(f"{start}T23:59:59", naive="local")
+    else:
+        instant = parse_instant(start)
+    return instant.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S") if instant else ""
+
+
+# -----------------------------
+# Inputs
+# -----------------------------
+def mirror_entries(pages: list) -> list:
+    """
+    Archive-shaped entries for rows of the Activities database mirror.
+    """
+    entries = []
+    for page in pages:
+        day = page_date(page, "Date")
+        if not day:
+            continue
+        activity_type = (page_value(page, "Activity Type") or "").lower().replace(" ", "_")
+        distance_km = page_value(page, "Distance (km)")
+        entries.append({
+            "id": f"page {page['id']}",
+            "start": day,
+            "day": day,
+            "name": page_value(page, "Activity Name") or "Unnamed Activity",
+            "key": activity_page_key(page),
+            "family": sport_family({"activityType": {"typeKey": activity_type}}),
+            "distance": distance_km * 1000 if distance_km else None,
+            "elevation_gain": page_value(page, "Elevation Gain (m)"),
+        })
+    return entries
+
+
+def history_entries(mirror_pages: list = ()) -> list:
+    """
+    Archive entries plus mirror rows for activities the archive does not have.
+    """
+    archived = [{**e, "id": activity_id} for activity_id, e in load_archive().items()]
+    keys = {e["key"] for e in archived}
+    return archived + [e for e in mirror_entries(mirror_pages) if e["key"] not in keys]
+
+
+# -----------------------------
+# Sweeps
+# -----------------------------
+def _improves(type_id: int, value, best) -> bool:
+    higher = ACTIVITY_RECORDS[type_id][2] if type_id in ACTIVITY_RECORDS else True
+    return best is None or (value > best if higher else value < best)
+
+
+def _sweep_activities(state: dict, entries: list) -> None:
+    best, progression = state["best"], state["progression"]
+    for e in sorted(entries, key=lambda e: _instant(e["start"])):
+        for type_id, (family, field, _) in ACTIVITY_RECORDS.items():
+            value = e.get(field)
+            if e["family"] != family or not value:
+                continue
+            current = best.get(str(type_id))
+            if _improves(type_id, value, current):
+                best[str(type_id)] = value
+                progression.append({"typeId": type_id, "value": value, "day": e["day"], "name": e["name"]})
+        state["swept"].append(e["id"])
+        state["last_start"] = max(state["last_start"], _instant(e["start"]))
+
+
+def _raise(state: dict, type_id: int, value, day: str, period: str) -> None:
+    # A record raised again within the same week/month/streak moves that entry forward instead of adding one
+    if not _improves(type_id, value, state["best"].get(str(type_id))):
+        return
+    state["best"][str(type_id)] = value
+    same_type = [p for p in state["progression"] if p["typeId"] == type_id]
+    entry = {"typeId": type_id, "value": value, "day": day, "period": period}
+    if same_type and same_type[-1].get("period") == period:
+        same_type[-1].update(entry)
+    else:
+        state["progression"].append(entry)
+
+
+def _sweep_steps(state: dict, days: dict) -> None:
+    for day in sorted(d for d in days if d > state["steps_until"]):
+        snapshot = days[day]
+        if len(snapshot) <= LONGEST:
+            continue
+        _raise(state, 12, snapshot[STEPS], day, day)
+        _raise(state, 13, snapshot[WEEK_TOTAL], day, "week " + week_key(day))
+        _raise(state, 14, snapshot[MONTH_TOTAL], day, "month " + day[:7])
+        if snapshot[STREAK]:
+            streak_start = date.fromisoformat(day) - timedelta(days=snapshot[STREAK] - 1)
+            _raise(state, 15, snapshot[STREAK], day, f"streak {streak_start.isoformat()}")
+        state["steps_until"] = day
+
+
+def update_timeline(mirror_pages: list = ()) -> dict:
+    """
+    Sweep whatever is new since the last run and return the new sweep state;
+    its "progression" is oldest first within each typeId. Nothing is saved
+    here (see record_timeline).
+    """
+    state = load_json(_timeline_file(), None) or _empty_state()
+    state["last_start"] = _instant(state["last_start"])
+    swept = set(state["swept"])
+    new = [e for e in history_entries(mirror_pages) if e["id"] not in swept]
+
+    if any(_instant(e["start"]) < state["last_start"] for e in new):
+        # A late upload can change every later record; sweep activities again from the start
+        print("Older activities appeared; rebuilding the activity record timeline")
+        steps = [p for p in state["progression"] if p["typeId"] in STEP_RECORDS]
+        best = {k: v for k, v in state["best"].items() if int(k) in STEP_RECORDS}
+        state = {**_empty_state(), "steps_until": state["steps_until"], "best": best, "progression": steps}
+        new = history_entries(mirror_pages)
+
+    _sweep_activities(state, new)
+    _sweep_steps(state, load_streaks().days)
+    return state
+
+
+def record_timeline(plan: dict) -> None:
+    """
+    Store the sweep state carried by an applied plan.
+    """
+    if "pr_timeline" in plan:
+        save_json(_timeline_file(), plan["pr_timeline"])
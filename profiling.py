@@ -0,0 +1,217 @@
+"""
+--profile: where a sync run spends its time and memory.
+
+A profiling session writes one run directory (default
+SYNC_STATE_DIR/profiles/<script>-<timestamp>) containing, per stage:
+  <stage>.pstats       cProfile data (python -m pstats, snakeviz, ...)
+  <stage>.folded       sampled stacks in collapsed format (flamegraph.pl, speedscope)
+  <stage>.memory.txt   top allocation sites during the stage (tracemalloc)
+and summary.json with wall time, CPU time, time blocked (wall - CPU), time
+inside socket/SSL calls, time inside garminconnect/garth and notion_client,
+and peak traced memory per stage, plus the run's connection reuse (transport.py).
+
+Top-level stages get their own profiler; stages opened inside another stage
+(e.g. Garmin login or a Notion mirror refresh during planning) only record
+timings, as "<parent>/<name>". Without an active session stage() costs nothing.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from sync_state import state_path
+from transport import connection_stats
+
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+TOP_ALLOCATIONS = 25
+LIBRARIES = {"garmin": ("garminconnect", "garth"), "notion": ("notion_client",)}
+
+_session = None
+
+
+def add_profile_argument(parser) -> None:
+    parser.add_argument("--profile", nargs="?", const="", metavar="DIR",
+                        help="profile this run (CPU per stage, memory, network wait) into DIR "
+                             "(default: SYNC_STATE_DIR/profiles/<script>-<timestamp>)")
+
+
+def default_run_dir(script: str) -> str:
+    return os.path.dirname(state_path("profiles", f"{script}-{datetime.now():%Y%m%d-%H%M%S}", "summary.json"))
+
+
+# -----------------------------
+# Stack sampling
+# -----------------------------
+class _Sampler(threading.Thread):
+    """
+    Samples every other thread's stack at a fixed interval; collapsed-stack
+    counts are what flame graph tools expect.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        names = {}
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# -----------------------------
+# Profile analysis
+# -----------------------------
+def _network_seconds(stats: pstats.Stats) -> float:
+    # Built-in socket/SSL methods are leaves, so their own time is time blocked on I/O
+    total = 0.0
+    for (filename, _, name), (_, _, tottime, _, _) in stats.stats.items():
+        if filename == "~" and ("_socket" in name or "_ssl" in name or "getaddrinfo" in name):
+            total += tottime
+    return total
+
+
+def _library_seconds(stats: pstats.Stats, packages: tuple) -> float:
+    # Cumulative time of the library's entry points (called from outside the library)
+    inside = lambda filename: any(f"{os.sep}{p}{os.sep}" in filename for p in packages)
+    total = 0.0
+    for (filename, _, _), (_, _, _, cumtime, callers) in stats.stats.items():
+        if inside(filename) and any(not inside(caller[0]) for caller in callers):
+            total += cumtime
+    return total
+
+
+# -----------------------------
+# Session and stages
+# -----------------------------
+class _Session:
+    def __init__(self, run_dir: str, script: str):
+        self.run_dir = run_dir
+        self.script = script
+        self.stages = []
+        self.depth = []
+
+
+@contextmanager
+def profile_session(run_dir, script: str):
+    """
+    Enable stage() profiling for the duration of the block. run_dir=None
+    (no --profile) disables it; "" uses the default run directory.
+    """
+    global _session
+    if run_dir is None:
+        yield
+        return
+    run_dir = run_dir or default_run_dir(script)
+    os.makedirs(run_dir, exist_ok=True)
+    _session = _Session(run_dir, script)
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        total = time.perf_counter() - started
+        tracemalloc.stop()
+        session, _session = _session, None
+        _write_summary(session, total)
+
+
+@contextmanager
+def stage(name: str):
+    session = _session
+    if session is None:
+        yield
+        return
+
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    if session.depth:
+        # Nested: timings only, the enclosing stage's profiler covers it
+        label = "/".join(session.depth + [name])
+        session.depth.append(name)
+        try:
+            yield
+        finally:
+            session.depth.pop()
+            wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+            session.stages.append({"stage": label, "wall_s": round(wall, 3), "cpu_s": round(cpu, 3),
+                                   "blocked_s": round(max(wall - cpu, 0), 3)})
+        return
+
+    session.depth.append(name)
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    sampler = _Sampler()
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+        peak = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+        session.depth.pop()
+
+        base = os.path.join(session.run_dir, name)
+        profiler.dump_stats(base + ".pstats")
+        sampler.write(base + ".folded")
+        with open(base + ".memory.txt", "w", encoding="utf-8") as f:
+            for stat in after.compare_to(before, "lineno")[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+
+        stats = pstats.Stats(profiler)
+        entry = {
+            "stage": name,
+            "wall_s": round(wall, 3),
+            "cpu_s": round(cpu, 3),
+            "blocked_s": round(max(wall - cpu, 0), 3),
+            "network_s": round(_network_seconds(stats), 3),
+            "peak_mb": round(peak / 1e6, 1),
+        }
+        for label, packages in LIBRARIES.items():
+            entry[f"{label}_s"] = round(_library_seconds(stats, packages), 3)
+        session.stages.append(entry)
+
+
+def _write_summary(session: _Session, total: float) -> None:
+    summary = {"script": session.script, "total_s": round(total, 3), "stages": session.stages,
+               "http": connection_stats()}
+    with open(os.path.join(session.run_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\nProfile of {session.script} ({total:.2f}s) written to {session.run_dir}")
+    print(f"  {'stage':<28}{'wall':>8}{'cpu':>8}{'blocked':>9}{'network':>9}{'garmin':>8}{'notion':>8}{'peak MB':>9}")
+    for s in session.stages:
+        cell = lambda key, width: f"{s[key]:>{width}}" if key in s else " " * width
+        print(f"  {s['stage']:<28}{cell('wall_s', 8)}{cell('cpu_s', 8)}{cell('blocked_s', 9)}"
+              f"{cell('network_s', 9)}{cell('garmin_s', 8)}{cell('notion_s', 8)}{cell('peak_mb', 9)}")
@@ -0,0 +1,164 @@
+"""
+Targeted syncs triggered by Garmin Health API push notifications.
+
+webhook-receiver.py accepts the Health API's push (and ping) notifications and
+hands them to a PushQueue. Each notification names what changed:
+
+  activities, activityDetails, manuallyUpdatedActivities
+                 -> garmin-activities2.py --date DAY [--activity-id ID]
+  sleeps         -> sleep-data.py --date DAY
+  dailies        -> daily-steps.py --date DAY
+
+Notifications arriving close together are coalesced: a sync starts once no
+new notification has come in for WEBHOOK_DEBOUNCE seconds (default 30), or
+WEBHOOK_MAX_WAIT seconds (default 300) after the first one of a burst, and
+covers every day and activity collected so far in one run per script (one per
+night for sleep-data.py). Ping notifications (a callbackURL instead of the
+summary) carry no day, so they trigger the script's normal run, in addition
+to the targeted runs for the days other notifications named.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from local_dates import local_day
+
+ROOT = Path(__file__).resolve().parent
+
+SUMMARY_SCRIPTS = {
+    "activities": "garmin-activities2.py",
+    "activityDetails": "garmin-activities2.py",
+    "manuallyUpdatedActivities": "garmin-activities2.py",
+    "sleeps": "sleep-data.py",
+    "dailies": "daily-steps.py",
+}
+
+
+# -----------------------------
+# Notifications
+# -----------------------------
+def summary_day(summary: dict):
+    if summary.get("calendarDate"):
+        return summary["calendarDate"]
+    if summary.get("startTimeInSeconds") is not None:
+        return local_day(summary["startTimeInSeconds"] * 1000)
+    return None
+
+
+def notification_targets(payload: dict) -> list:
+    """
+    (script, day or None, activityId or None) for every summary in a push or
+    ping notification body; unknown summary types and malformed entries are ignored.
+    """
+    if not isinstance(payload, dict):
+        return []
+    targets = []
+    for summary_type, summaries in payload.items():
+        script = SUMMARY_SCRIPTS.get(summary_type)
+        if not script or not isinstance(summaries, list):
+            continue
+        for summary in summaries:
+            if not isinstance(summary, dict):
+                continue
+            if summary.get("callbackURL"):
+                targets.append((script, None, None))
+                continue
+            activity_id = summary.get("activityId") if script == "garmin-activities2.py" else None
+            targets.append((script, summary_day(summary), str(activity_id) if activity_id else None))
+    return targets
+
+
+def sync_commands(targets, script_args: dict = None) -> list:
+    """
+    One command per script for a batch of targets (per night for sleep-data.py).
+    A target without a day means the script's normal, untargeted run; the
+    days named by the other targets still get their own run after it.
+    """
+    script_args = script_args or {}
+    by_script = {}
+    for script, day, activity_id in targets:
+        entry = by_script.setdefault(script, {"days": set(), "ids": set(), "full": False, "whole_day": False})
+        if day is None:
+            entry["full"] = True
+            continue
+        entry["days"].add(day)
+        if activity_id:
+            entry["ids"].add(activity_id)
+        else:
+            entry["whole_day"] = True
+
+    commands = []
+    for script, entry in sorted(by_script.items()):
+        base = [script] + script_args.get(script, [])
+        if entry["full"]:
+            commands.append(base)
+        if not entry["days"]:
+            continue
+        if script == "sleep-data.py":
+            commands += [base + ["--date", day] for day in sorted(entry["days"])]
+        else:
+            command = base + [arg for day in sorted(entry["days"]) for arg in ("--date", day)]
+            # Only narrow to activity IDs when every notified activity came with one
+            if entry["ids"] and not entry["whole_day"]:
+                command += [arg for activity_id in sorted(entry["ids"]) for arg in ("--activity-id", activity_id)]
+            commands.append(command)
+    return commands
+
+
+# -----------------------------
+# Debounced queue
+# -----------------------------
+class PushQueue:
+    """
+    Collects targets and runs the coalesced syncs on one background thread, so
+    at most one sync runs at a time and the HTTP handler never waits for one.
+    """
+
+    def __init__(self, script_args: dict = None, dry_run: bool = False):
+        self.script_args = script_args or {}
+        self.dry_run = dry_run
+        self.debounce = float(os.getenv("WEBHOOK_DEBOUNCE", "30"))
+        self.max_wait = float(os.getenv("WEBHOOK_MAX_WAIT", "300"))
+        self._targets = []
+        self._first = self._last = None
+        self._cond = threading.Condition()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def add(self, targets: list) -> None:
+        if not targets:
+            return
+        with self._cond:
+            now = time.monotonic()
+            self._first = self._first or now
+            self._last = now
+            self._targets += targets
+            self._cond.notify()
+
+    def _due(self, now: float):
+        # Seconds until the pending batch should run (<= 0: now), or None when idle
+        if not self._targets:
+            return None
+        return min(self._last + self.debounce, self._first + self.max_wait) - now
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                wait = self._due(time.monotonic())
+                while wait is None or wait > 0:
+                    self._cond.wait(wait)
+                    wait = self._due(time.monotonic())
+                targets, self._targets = self._targets, []
+                self._first = self._last = None
+            for command in sync_commands(targets, self.script_args):
+                self.run(command)
+
+    def run(self, command: list) -> None:
+        print(f"▶ {' '.join(command)}")
+        if self.dry_run:
+            return
+        returncode = subprocess.run([sys.executable, str(ROOT / command[0])] + command[1:], cwd=ROOT).returncode
+        print(f"✓ {command[0]} done" if returncode == 0 else f"✗ {command[0]} failed (exit {returncode})")
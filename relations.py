@@ -0,0 +1,90 @@
+"""
+Relation properties linking the databases to the Activities database.
+
+  PR rows           "Activity"    the activity that set the record
+  Sleep, Steps and  "Activities"  that day's activities (for sleep: the day
+  Health rows                     the night ends, i.e. the next day's training)
+
+Links are resolved from the Activities database's local mirror, keyed the same
+way garmin-activities2.py keys its rows, so linking costs no per-link search.
+The relation goes into the same create/update payload as the row's other
+properties. A target that is not in Notion yet (created later in the same
+sync) is linked on the next run.
+
+Set NOTION_LINK_RELATIONS=1 once those properties exist as relations to the
+Activities database.
+"""
+
+import os
+
+from notion_index import mirror_pages, page_date, page_value
+
+DEFAULT_ACTIVITIES_DB_ID = "244ef489a270818c9872d834c5f30430"
+
+
+def relations_enabled() -> bool:
+    return os.getenv("NOTION_LINK_RELATIONS", "").lower() in ("1", "true", "yes")
+
+
+def activities_database_id() -> str:
+    return os.getenv("NOTION_DB_ID", DEFAULT_ACTIVITIES_DB_ID)
+
+
+def activity_key(date_iso: str, activity_name: str) -> str:
+    """
+    Natural key of an activity row: same date and name means same activity.
+    Assumes:
+      - Date property is named 'Date' (date)
+      - Title property is 'Activity Name'
+    """
+    return f"{(date_iso or '')[:10]}|{activity_name or ''}"
+
+
+def activity_page_key(page: dict):
+    return activity_key(page_date(page, "Date") or "", page_value(page, "Activity Name"))
+
+
+def relation(page_ids) -> dict:
+    return {"relation": [{"id": page_id} for page_id in page_ids]}
+
+
+class ActivityLinks:
+    """
+    Activity page IDs by activity key and by day, from one read of the mirror.
+    """
+
+    def __init__(self, pages: list):
+        self.by_key = {}
+        self.by_day = {}
+        for page in pages:
+            self.by_key.setdefault(activity_page_key(page), page["id"])
+            day = page_date(page, "Date")
+            if day:
+                self.by_day.setdefault(day, []).append(page["id"])
+
+    def activity_properties(self, day: str, activity_name: str, gmt_day: str = None) -> dict:
+        """
+        {"Activity": relation} for the activity with this name on this day, or
+        {} if it is not in Notion. gmt_day covers rows keyed before local-day bucketing.
+        """
+        page_id = self.by_key.get(activity_key(day, activity_name))
+        if not page_id and gmt_day:
+            page_id = self.by_key.get(activity_key(gmt_day, activity_name))
+        return {"Activity": relation([page_id])} if page_id else {}
+
+    def day_properties(self, day: str) -> dict:
+        """
+        {"Activities": relation} for every activity on this day, or {} if there are none.
+        """
+        page_ids = self.by_day.get(day)
+        return {"Activities": relation(sorted(page_ids))} if page_ids else {}
+
+
+def load_activity_links(client) -> ActivityLinks:
+    """
+    Links from the Activities mirror; without NOTION_LINK_RELATIONS an empty
+    ActivityLinks that adds nothing, so callers need no special case.
+    """
+    if not relations_enabled():
+        return ActivityLinks([])
+    return ActivityLinks(mirror_pages(client, activities_database_id()))
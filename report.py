@@ -0,0 +1,195 @@
+"""
+Answer questions about synced data from the local Notion mirrors, with no API calls.
+
+Examples:
+  python report.py activities --type Running --metric "Distance (km)" --agg sum --this month
+  python report.py sleep --metric "Total Sleep (h)" --agg avg --last 30
+  python report.py activities --metric "Distance (km)" --group-by month --percentiles 50,90 --since 2026-01-01
+  python report.py steps --metric "Total Steps" --group-by week --format json
+
+The mirrors are the ones the sync scripts keep under SYNC_STATE_DIR/notion, so
+a report reflects the last sync.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from dotenv import load_dotenv
+import argparse
+import json
+import os
+
+import numpy as np
+
+from local_dates import today
+from notion_index import cached_pages, page_date, page_value
+
+# dataset -> (database ID env var, default ID, date property, type property)
+DATASETS = {
+    "activities": ("NOTION_DB_ID", "244ef489a270818c9872d834c5f30430", "Date", "Activity Type"),
+    "sleep": ("NOTION_SLEEP_DB_ID", None, "Long Date", None),
+    "steps": ("NOTION_STEPS_DB_ID", None, "Date", None),
+    "records": ("NOTION_PR_DB_ID", None, "Date", "Activity Type"),
+    "health": ("NOTION_HEALTH_DB_ID", None, "Full Date", None),
+}
+
+AGGREGATES = {
+    "count": len,
+    "sum": np.sum,
+    "avg": np.mean,
+    "min": np.min,
+    "max": np.max,
+}
+
+DATE_GROUPS = {
+    "day": lambda d: d,
+    "week": lambda d: "{0}-W{1:02d}".format(*date.fromisoformat(d).isocalendar()[:2]),
+    "month": lambda d: d[:7],
+    "year": lambda d: d[:4],
+}
+
+
+# -----------------------------
+# Table
+# -----------------------------
+class Table:
+    """
+    One dataset's rows sorted by date, with a date index (bisect) and a
+    per-type index, so filters never scan rows they cannot match.
+    """
+
+    def __init__(self, pages: list, date_property: str, type_property: str = None):
+        rows = [(page_date(page, date_property), page) for page in pages]
+        rows = sorted((r for r in rows if r[0]), key=lambda r: r[0])
+        self.dates = [d for d, _ in rows]
+        self.pages = [p for _, p in rows]
+        self.by_type = {}
+        if type_property:
+            for i, page in enumerate(self.pages):
+                self.by_type.setdefault(page_value(page, type_property), []).append(i)
+
+    def select(self, since: str = None, until: str = None, types: list = None) -> list:
+        lo = bisect_left(self.dates, since) if since else 0
+        hi = bisect_right(self.dates, until) if until else len(self.dates)
+        if not types:
+            return list(range(lo, hi))
+        # Each type's row indices are in date order, so the range is a bisect there too
+        selected = []
+        for t in types:
+            rows = self.by_type.get(t, [])
+            selected += rows[bisect_left(rows, lo):bisect_left(rows, hi)]
+        return sorted(selected)
+
+
+def load_table(dataset: str) -> Table:
+    env, default, date_property, type_property = DATASETS[dataset]
+    database_id = os.getenv(env, default)
+    if not database_id:
+        raise SystemExit(f"{env} is not set")
+    pages = cached_pages(database_id)
+    if not pages:
+        raise SystemExit(f"No local mirror for {dataset}; run its sync script first")
+    return Table(pages, date_property, type_property)
+
+
+# -----------------------------
+# Report
+# -----------------------------
+def date_range(args):
+    """
+    (since, until) as YYYY-MM-DD strings from --since/--until, --last or --this.
+    """
+    end = today()
+    if args.last:
+        return (end - timedelta(days=args.last - 1)).isoformat(), end.isoformat()
+    if args.this == "week":
+        return (end - timedelta(days=end.weekday())).isoformat(), end.isoformat()
+    if args.this == "month":
+        return end.replace(day=1).isoformat(), end.isoformat()
+    if args.this == "year":
+        return end.replace(month=1, day=1).isoformat(), end.isoformat()
+    return args.since, args.until
+
+
+def run_report(table: Table, metric: str = None, agg: str = "count", since: str = None, until: str = None,
+               types: list = None, group_by: str = None, percentiles: list = None) -> list:
+    """
+    One result row per group: {"group", "rows", agg, "p<N>"...}.
+    """
+    groups = {}
+    for i in table.select(since, until, types):
+        page = table.pages[i]
+        if group_by in DATE_GROUPS:
+            key = DATE_GROUPS[group_by](table.dates[i])
+        elif group_by:
+            key = page_value(page, group_by)
+            if isinstance(key, list):
+                # Relations and date ranges: one group per distinct combination
+                key = ", ".join(str(v) for v in key)
+        else:
+            key = "all"
+        value = page_value(page, metric) if metric else None
+        bucket = groups.setdefault(key, [])
+        if not metric:
+            bucket.append(1)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            bucket.append(value)
+
+    results = []
+    for key in sorted(groups, key=lambda k: (k is None, str(k))):
+        values = np.array(groups[key], dtype=np.float64)
+        row = {"group": key, "rows": len(values)}
+        if agg == "count" or not len(values):
+            row[agg] = len(values) if agg == "count" else None
+        else:
+            row[agg] = round(float(AGGREGATES[agg](values)), 2)
+        for p in percentiles or []:
+            row[f"p{p:g}"] = round(float(np.percentile(values, p)), 2) if len(values) else None
+        results.append(row)
+    return results
+
+
+def format_table(results: list) -> str:
+    if not results:
+        return "No matching rows."
+    columns = list(results[0])
+    cells = [[str(c) for c in columns]] + [["-" if r[c] is None else str(r[c]) for c in columns] for r in results]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(columns))]
+    lines = ["  ".join(v.ljust(w) if i == 0 else v.rjust(w) for i, (v, w) in enumerate(zip(row, widths)))
+             for row in cells]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Report on synced data from the local mirror (no API calls)")
+    parser.add_argument("dataset", choices=list(DATASETS))
+    parser.add_argument("--metric", help="number property to aggregate, e.g. 'Distance (km)'")
+    parser.add_argument("--agg", choices=list(AGGREGATES), default=None,
+                        help="aggregate (default: sum with --metric, otherwise count)")
+    parser.add_argument("--type", action="append", dest="types", help="only this activity type (repeatable)")
+    parser.add_argument("--since", help="first day, YYYY-MM-DD")
+    parser.add_argument("--until", help="last day, YYYY-MM-DD")
+    parser.add_argument("--last", type=int, metavar="DAYS", help="the last DAYS days up to today")
+    parser.add_argument("--this", choices=["week", "month", "year"], help="the current week, month or year")
+    parser.add_argument("--group-by", help="day, week, month, year or a property name")
+    parser.add_argument("--percentiles", type=lambda s: [float(p) for p in s.split(",")], default=[],
+                        help="comma-separated percentiles of the metric, e.g. 50,90")
+    parser.add_argument("--format", choices=["table", "json"], default="table")
+    args = parser.parse_args()
+
+    agg = args.agg or ("sum" if args.metric else "count")
+    if agg != "count" and not args.metric:
+        parser.error(f"--agg {agg} needs --metric")
+    since, until = date_range(args)
+
+    results = run_report(load_table(args.dataset), args.metric, agg, since, until,
+                         args.types, args.group_by, args.percentiles)
+    if args.format == "json":
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print(format_table(results))
+
+if __name__ == '__main__':
+    main()
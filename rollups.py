@@ -0,0 +1,204 @@
+"""
+Weekly and monthly rollups, kept in their own Notion database.
+
+Dashboards used to sum thousands of rows with Notion formulas/rollups. Instead
+the sync scripts remember the per-day facts they see (activity distance,
+duration and calories, daily steps, sleep and resting HR) in
+SYNC_STATE_DIR/rollups/facts.json, and after each sync recompute only the
+ISO weeks and calendar months containing the days that were just synced.
+A bucket row is only written when one of its totals actually changed.
+
+The Rollups database (NOTION_ROLLUPS_DB_ID) needs:
+  Period (title), Kind (select), Start (date), Distance (km), Duration (min),
+  Calories, Activities, Steps, Avg Sleep (h), Avg Resting HR (numbers).
+"""
+
+import os
+from datetime import date, timedelta
+
+from formatting import km, minutes
+from local_dates import activity_day
+from notion_index import load_index, page_value
+from sync_plan import create_op, update_op
+from sync_state import load_json, save_json, state_path
+
+FACT_KINDS = ("activities", "steps", "sleep", "resting_hr")
+
+# Key prefix of rollup operations
+ROLLUP_PREFIX = "rollup "
+
+
+def rollups_database_id():
+    return os.getenv("NOTION_ROLLUPS_DB_ID")
+
+
+# -----------------------------
+# Facts
+# -----------------------------
+def _facts_file() -> str:
+    return state_path("rollups", "facts.json")
+
+
+def load_facts() -> dict:
+    facts = load_json(_facts_file(), {}) or {}
+    return {kind: facts.get(kind, {}) for kind in FACT_KINDS}
+
+
+def load_pending() -> list:
+    # Buckets whose write was skipped by the run deadline or failed
+    return (load_json(_facts_file(), {}) or {}).get("pending", [])
+
+
+def activity_facts(activities: list) -> dict:
+    """
+    {"activities": {activityId: [day, km, minutes, calories]}}
+    """
+    facts = {}
+    for a in activities:
+        day = activity_day(a)
+        if a.get("activityId") and day:
+            facts[str(a["activityId"])] = [day, km(a.get("distance")), minutes(a.get("duration")),
+                                           round(a.get("calories") or 0)]
+    return {"activities": facts}
+
+
+def steps_facts(daily_steps: list) -> dict:
+    return {"steps": {s["calendarDate"]: s["totalSteps"] for s in daily_steps
+                      if s.get("calendarDate") and s.get("totalSteps") is not None}}
+
+
+def sleep_facts(sleep_data: dict) -> dict:
+    daily = (sleep_data or {}).get("dailySleepDTO") or {}
+    day = daily.get("calendarDate")
+    if not day:
+        return {}
+    total = sum(daily.get(k) or 0 for k in ("deepSleepSeconds", "lightSleepSeconds", "remSleepSeconds"))
+    facts = {"sleep": {day: round(total / 3600, 2)} if total else {}}
+    if sleep_data.get("restingHeartRate"):
+        facts["resting_hr"] = {day: sleep_data["restingHeartRate"]}
+    return facts
+
+
+def touched_days(new_facts: dict) -> set:
+    days = {fact[0] for fact in new_facts.get("activities", {}).values()}
+    for kind in ("steps", "sleep", "resting_hr"):
+        days.update(new_facts.get(kind, {}))
+    return days
+
+
+def merge_facts(facts: dict, new_facts: dict) -> dict:
+    return {kind: {**facts.get(kind, {}), **new_facts.get(kind, {})} for kind in FACT_KINDS}
+
+
+# -----------------------------
+# Buckets
+# -----------------------------
+def bucket_keys(day: str) -> tuple:
+    """
+    ("2026-W41", "2026-10") for a YYYY-MM-DD day.
+    """
+    d = date.fromisoformat(day)
+    year, week, _ = d.isocalendar()
+    return f"{year}-W{week:02d}", d.strftime("%Y-%m")
+
+
+def bucket_range(key: str) -> tuple:
+    """
+    First and last day of a bucket key.
+    """
+    if "-W" in key:
+        year, week = key.split("-W")
+        start = date.fromisocalendar(int(year), int(week), 1)
+        return start, start + timedelta(days=6)
+    start = date.fromisoformat(f"{key}-01")
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+
+def bucket_totals(facts: dict, key: str) -> dict:
+    start, end = bucket_range(key)
+    first, last = start.isoformat(), end.isoformat()
+    inside = lambda day: first <= day <= last
+
+    activities = [f for f in facts["activities"].values() if inside(f[0])]
+    steps = [v for d, v in facts["steps"].items() if inside(d)]
+    sleep = [v for d, v in facts["sleep"].items() if inside(d)]
+    resting = [v for d, v in facts["resting_hr"].items() if inside(d)]
+    return {
+        "start": first,
+        "end": last,
+        "distance": round(sum(f[1] for f in activities), 2),
+        "duration": round(sum(f[2] for f in activities), 1),
+        "calories": sum(f[3] for f in activities),
+        "activities": len(activities),
+        "steps": sum(steps) if steps else None,
+        "sleep": round(sum(sleep) / len(sleep), 1) if sleep else None,
+        "resting_hr": round(sum(resting) / len(resting)) if resting else None,
+    }
+
+
+def rollup_properties(key: str, totals: dict) -> dict:
+    return {
+        "Period": {"title": [{"text": {"content": key}}]},
+        "Kind": {"select": {"name": "Week" if "-W" in key else "Month"}},
+        "Start": {"date": {"start": totals["start"]}},
+        "Distance (km)": {"number": totals["distance"]},
+        "Duration (min)": {"number": totals["duration"]},
+        "Calories": {"number": totals["calories"]},
+        "Activities": {"number": totals["activities"]},
+        "Steps": {"number": totals["steps"]},
+        "Avg Sleep (h)": {"number": totals["sleep"]},
+        "Avg Resting HR": {"number": totals["resting_hr"]},
+    }
+
+
+# -----------------------------
+# Planning
+# -----------------------------
+def plan_rollups(client, new_facts: dict) -> list:
+    """
+    Create/update operations for every week and month containing a day in
+    new_facts, computed from the stored facts plus the new ones.
+    """
+    database_id = rollups_database_id()
+    if not database_id:
+        return []
+    keys = {key for day in touched_days(new_facts) for key in bucket_keys(day)} | set(load_pending())
+    if not keys:
+        return []
+
+    facts = merge_facts(load_facts(), new_facts)
+    index = load_index(client, database_id, lambda page: page_value(page, "Period"))
+    ops = []
+    for key in sorted(keys):
+        properties = rollup_properties(key, bucket_totals(facts, key))
+        existing = index.get(key)
+        if existing:
+            ops.append(update_op(existing, f"{ROLLUP_PREFIX}{key}", properties))
+        else:
+            ops.append(create_op(database_id, f"{ROLLUP_PREFIX}{key}", properties, icon={"emoji": "📊"}))
+    return [op for op in ops if op]
+
+
+def add_rollups(plan: dict, client, new_facts: dict) -> dict:
+    """
+    Append rollup operations to a script's plan and carry the new facts, so
+    record_rollups can store them once the plan has been applied.
+    """
+    if rollups_database_id():
+        plan["operations"] += plan_rollups(client, new_facts)
+        plan["rollup_facts"] = new_facts
+    return plan
+
+
+def record_rollups(plan: dict) -> None:
+    """
+    Store the plan's facts; buckets the deadline skipped or that failed stay
+    pending and are recomputed on the next run.
+    """
+    if "rollup_facts" not in plan:
+        return
+    # Earlier pending buckets were part of this plan, so only the newly skipped ones remain
+    pending = sorted(op["key"][len(ROLLUP_PREFIX):] for op in plan.get("skipped") or []
+                     if op["key"].startswith(ROLLUP_PREFIX))
+    save_json(_facts_file(), {**merge_facts(load_facts(), plan["rollup_facts"]), "pending": pending})
@@ -0,0 +1,194 @@
+"""
+Recent-first scheduling of the sync scripts' work for sync-all2.py --recent-first.
+
+Run one after the other, a long backfill in one script (a year of health
+history, PR history, weeks of missed steps) can use up the deadline before
+the next script writes today's row. With --recent-first the scripts share one
+queue instead:
+
+  planning  each script plans in turn, under its fair share of the remaining
+            planning time (SYNC_PLAN_SHARE, default half of what is left, split
+            between the scripts still to run); a script that overruns stops
+            like it would at the deadline and plans the rest next run
+  applying  instead of writing, each script hands its plan to the shared queue
+            (run_plan_cli does this while collecting). Once every script has
+            planned, drain() writes all operations in one order: operations
+            dated within SYNC_RECENT_DAYS (default 3) of today first, then the
+            history, newest first in both tiers. Within a tier scripts take
+            turns by weight (SYNC_SHARES, e.g. "garmin-activities2=2,daily-steps=1";
+            default 1 each), so one script's backlog cannot starve the others.
+            Each script's after_apply then sees exactly its own applied and
+            skipped (or failed) operations, and those are planned again next run.
+            Operations of one group (op["group"], e.g. archiving an old PR and
+            creating the new one) stay next to each other.
+
+Rollups are the one thing several scripts write: each plan's rollup rows were
+computed from the stored facts without the other scripts' new ones, so drain()
+drops them and plans the rollups once from all the queued facts.
+
+Scripts that write without a plan (daily-metrics.py, intraday-data.py) run
+during planning as usual.
+"""
+
+import heapq
+import os
+import re
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from deadline import DEADLINE_ENV, remaining
+from local_dates import today
+from rollups import ROLLUP_PREFIX, bucket_range, merge_facts, plan_rollups
+from sync_plan import apply_plan, collect_plans
+
+_jobs = None
+
+ISO_DAY = re.compile(r"\d{4}-\d{2}-\d{2}")
+BUCKET = re.compile(r"\d{4}-(W\d{2}|\d{2})$")
+
+
+def start_collecting() -> None:
+    global _jobs
+    _jobs = []
+    collect_plans(submit)
+
+
+def submit(client, plan: dict, after_apply=None) -> None:
+    """
+    Queue a plan's Notion writes; they are applied, and after_apply called, by drain().
+    """
+    _jobs.append({"client": client, "plan": plan, "after_apply": after_apply})
+    print(f"{plan['script']}: {len(plan['operations'])} operation(s) queued")
+
+
+def _shares() -> dict:
+    shares = {}
+    for item in (os.getenv("SYNC_SHARES") or "").split(","):
+        if "=" in item:
+            script, weight = item.split("=", 1)
+            shares[script.strip()] = max(float(weight), 0.01)
+    return shares
+
+
+# -----------------------------
+# Ordering
+# -----------------------------
+def op_day(op: dict):
+    """
+    The day an operation is about: the last day of a rollup's week/month, a
+    date property it writes, else a date in its key. None for undated rows
+    such as gear.
+    """
+    key = op.get("key") or ""
+    bucket = BUCKET.search(key)
+    if key.startswith(ROLLUP_PREFIX) and bucket:
+        return bucket_range(bucket.group())[1].isoformat()
+    for prop in (op.get("properties") or {}).values():
+        start = ((prop or {}).get("date") or {}).get("start") if isinstance(prop, dict) else None
+        if start:
+            return start[:10]
+    found = ISO_DAY.search(key)
+    return found.group() if found else None
+
+
+def schedule(plans: list) -> list:
+    """
+    All operations of the given plans in apply order (see the module docstring).
+    """
+    shares = _shares()
+    newest = today().isoformat()
+    recent_from = (today() - timedelta(days=int(os.getenv("SYNC_RECENT_DAYS", "3")))).isoformat()
+
+    tiers = ({}, {})
+    for i, plan in enumerate(plans):
+        units = []
+        for op in plan["operations"]:
+            if units and op.get("group") is not None and op.get("group") == units[-1][-1].get("group"):
+                units[-1].append(op)
+            else:
+                units.append([op])
+        # Undated operations (gear, pending rollups) count as today's; a group goes by its newest day
+        dated = [(max(op_day(op) or newest for op in unit), n, unit) for n, unit in enumerate(units)]
+        # Newest day first; a day's operations keep their planned order (e.g. a row before its body)
+        dated.sort(key=lambda d: (-date.fromisoformat(d[0]).toordinal(), d[1]))
+        for day, _, unit in dated:
+            tiers[0 if day >= recent_from else 1].setdefault(i, []).append(unit)
+
+    ordered = []
+    for tier in tiers:
+        # Weighted round robin: the script with the least used share goes next
+        heap = [(0.0, i) for i in tier]
+        heapq.heapify(heap)
+        cursors = dict.fromkeys(tier, 0)
+        while heap:
+            used, i = heapq.heappop(heap)
+            ordered += tier[i][cursors[i]]
+            cursors[i] += 1
+            if cursors[i] < len(tier[i]):
+                weight = shares.get(plans[i]["script"], 1.0)
+                heapq.heappush(heap, (used + 1 / weight, i))
+    return ordered
+
+
+def drain() -> None:
+    """
+    Apply every queued operation in schedule order under the run deadline,
+    then run each script's after_apply with its own applied/skipped operations.
+    """
+    global _jobs
+    jobs, _jobs = _jobs or [], None
+    collect_plans(None)
+    if not jobs:
+        return
+    plans = [job["plan"] for job in jobs]
+    _replan_rollups(jobs[0]["client"], plans)
+    ordered = schedule(plans)
+    print(f"\n▶ applying {len(ordered)} queued operation(s), most recent first")
+    applied, skipped, failed = apply_plan(jobs[0]["client"], {"script": "sync-all2", "operations": ordered})
+    applied, skipped = {id(op) for op in applied}, {id(op) for op in skipped + failed}
+
+    for job in jobs:
+        plan = job["plan"]
+        if job["after_apply"]:
+            job["after_apply"]({**plan,
+                                "operations": [op for op in plan["operations"] if id(op) in applied],
+                                "skipped": [op for op in plan["operations"] if id(op) in skipped]})
+
+
+def _replan_rollups(client, plans: list) -> None:
+    """
+    Replace the rollup rows each plan computed on its own with one set planned
+    from every plan's new facts. The first plan carrying facts takes the rows
+    and all the facts, so its record_rollups stores them and the pending buckets.
+    """
+    with_facts = [plan for plan in plans if "rollup_facts" in plan]
+    if len(with_facts) < 2:
+        return
+    facts = {}
+    for plan in with_facts:
+        plan["operations"] = [op for op in plan["operations"] if not op["key"].startswith(ROLLUP_PREFIX)]
+        facts = merge_facts(facts, plan.pop("rollup_facts"))
+    with_facts[0]["operations"] += plan_rollups(client, facts)
+    with_facts[0]["rollup_facts"] = facts
+
+
+# -----------------------------
+# Planning budget
+# -----------------------------
+@contextmanager
+def planning_budget(scripts_left: int):
+    """
+    Pull the deadline in to this script's share of the remaining planning time,
+    restoring the run deadline afterwards. Without a deadline it does nothing.
+    """
+    left, saved = remaining(), os.getenv(DEADLINE_ENV)
+    if left is None or left <= 0:
+        yield
+        return
+    share = float(os.getenv("SYNC_PLAN_SHARE", "0.5")) * left / max(scripts_left, 1)
+    os.environ[DEADLINE_ENV] = str(time.time() + share)
+    try:
+        yield
+    finally:
+        os.environ[DEADLINE_ENV] = saved
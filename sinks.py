@@ -0,0 +1,265 @@
+"""
+Output sinks: where a plan's rows are written besides (or instead of) Notion.
+
+  --sink notion    the Notion databases (default)
+  --sink sqlite    SYNC_SINK_DIR/garmin.db, one table per database
+  --sink parquet   SYNC_SINK_DIR/<table>.parquet (needs pyarrow)
+  --sink csv       SYNC_SINK_DIR/<table>.csv
+--sink can be repeated, or set as a comma list in SYNC_SINKS; SYNC_SINK_DIR
+defaults to SYNC_STATE_DIR/sinks.
+
+Rows are every row the plan computed, including those that need no Notion
+write, flattened to plain values (one column per Notion property) and keyed
+by the operation key, so writing the same plan twice is harmless. SQLite is the store every file sink
+writes through: each run upserts its rows with executemany inside a single
+transaction, then the Parquet/CSV files of the tables that changed are
+rewritten from it in fixed-size row groups. That is what makes a 10k-row
+backfill take seconds instead of hours of Notion calls.
+
+Without notion among the sinks nothing is sent to Notion; planning then
+reads the last mirrored state of each database (notion_index.py) instead of
+querying it, and no after_apply runs, so the scripts' sync state (metric
+watermarks, body hashes, streaks, gear totals) only moves once Notion is
+written and the next Notion run plans the same rows again.
+"""
+
+import csv
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from notion_index import property_value, use_local_mirror
+from sync_state import state_path
+
+SINKS_ENV = "SYNC_SINKS"
+SINK_NAMES = ("notion", "sqlite", "parquet", "csv")
+ROW_GROUP_ROWS = 10000
+KEY_COLUMN = "key"
+SYNCED_COLUMN = "synced_at"
+
+
+def add_sink_argument(parser) -> None:
+    parser.add_argument("--sink", action="append", choices=SINK_NAMES, metavar="SINK",
+                        help="write to this sink: notion, sqlite, parquet or csv (repeatable; default: "
+                             "SYNC_SINKS or notion)")
+
+
+def init_sinks(names: list = None) -> list:
+    """
+    Select the run's sinks. Stored in SYNC_SINKS so scripts started by
+    sync-all2.py write to the same places.
+    """
+    if names:
+        os.environ[SINKS_ENV] = ",".join(names)
+    sinks = selected_sinks()
+    use_local_mirror("notion" not in sinks)
+    return sinks
+
+
+def selected_sinks() -> list:
+    names = [n.strip() for n in os.getenv(SINKS_ENV, "notion").split(",") if n.strip()]
+    unknown = [n for n in names if n not in SINK_NAMES]
+    if unknown:
+        raise SystemExit(f"Unknown sink(s) in {SINKS_ENV}: {', '.join(unknown)}")
+    return names
+
+
+def sink_dir() -> str:
+    path = os.path.expanduser(os.getenv("SYNC_SINK_DIR") or os.path.dirname(state_path("sinks", "garmin.db")))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# -----------------------------
+# Rows
+# -----------------------------
+def table_name(database_id: str) -> str:
+    """
+    Table for a Notion database: named after the NOTION_*_DB_ID variable that
+    holds its ID (NOTION_SLEEP_DB_ID -> sleep, NOTION_DB_ID -> activities).
+    """
+    database_id = (database_id or "").replace("-", "")
+    for name, value in os.environ.items():
+        if name.startswith("NOTION_") and name.endswith("DB_ID") and value.replace("-", "") == database_id:
+            return name[len("NOTION_"):-len("DB_ID")].strip("_").lower() or "activities"
+    if database_id == "244ef489a270818c9872d834c5f30430":
+        return "activities"
+    return f"db_{database_id[:8] or 'unknown'}"
+
+
+def _column_value(prop):
+    value = property_value(prop)
+    if isinstance(value, list):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def operation_rows(plan: dict) -> dict:
+    """
+    {table: [(key, {column: value})]} for the plan's full rows (plan["rows"],
+    see sync_plan.take_rows). Plans saved without them fall back to the
+    property operations, which only carry the changed properties. Body
+    operations have no row and are left out.
+    """
+    rows = plan.get("rows")
+    if rows is None:
+        rows = [op for op in plan["operations"] if op["action"] != "body"]
+    tables = {}
+    for row in rows:
+        if not row.get("properties"):
+            continue
+        values = {name: _column_value(prop) for name, prop in row["properties"].items()}
+        tables.setdefault(table_name(row.get("database_id")), []).append((row["key"], values))
+    return tables
+
+
+# -----------------------------
+# SQLite
+# -----------------------------
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sqlite_path() -> str:
+    return os.path.join(sink_dir(), "garmin.db")
+
+
+def _ensure_columns(db, table: str, columns: set) -> None:
+    db.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} "
+               f"({_quote(KEY_COLUMN)} TEXT PRIMARY KEY, {_quote(SYNCED_COLUMN)} TEXT)")
+    existing = {row[1] for row in db.execute(f"PRAGMA table_info({_quote(table)})")}
+    for column in sorted(columns - existing):
+        db.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(column)}")
+
+
+def write_sqlite(tables: dict) -> None:
+    """
+    Upsert every row in one transaction. Rows are grouped by their column set
+    (an archived PR only carries its PR flag) so each group is a single
+    executemany; columns a row does not carry keep their stored value.
+    """
+    synced_at = datetime.now().isoformat(timespec="seconds")
+    db = sqlite3.connect(_sqlite_path())
+    try:
+        with db:
+            for table, rows in tables.items():
+                _ensure_columns(db, table, {c for _, values in rows for c in values})
+                groups = {}
+                for key, values in rows:
+                    groups.setdefault(tuple(values), []).append((key, synced_at, *values.values()))
+                for columns, params in groups.items():
+                    names = [KEY_COLUMN, SYNCED_COLUMN, *columns]
+                    updates = ", ".join(f"{_quote(c)} = excluded.{_quote(c)}" for c in names[1:])
+                    db.executemany(
+                        f"INSERT INTO {_quote(table)} ({', '.join(map(_quote, names))}) "
+                        f"VALUES ({', '.join('?' * len(names))}) "
+                        f"ON CONFLICT({_quote(KEY_COLUMN)}) DO UPDATE SET {updates}",
+                        params,
+                    )
+    finally:
+        db.close()
+
+
+def _table_batches(db, table: str):
+    """
+    (columns, rows) for the whole table, ROW_GROUP_ROWS rows at a time.
+    """
+    cursor = db.execute(f"SELECT * FROM {_quote(table)} ORDER BY {_quote(KEY_COLUMN)}")
+    columns = [d[0] for d in cursor.description]
+    while True:
+        rows = cursor.fetchmany(ROW_GROUP_ROWS)
+        if not rows:
+            return
+        yield columns, rows
+
+
+# -----------------------------
+# File exports
+# -----------------------------
+def _export(table: str, extension: str, write) -> None:
+    # Written to a temporary file first so readers never see half a table
+    path = os.path.join(sink_dir(), f"{table}.{extension}")
+    tmp = path + ".tmp"
+    db = sqlite3.connect(_sqlite_path())
+    try:
+        write(tmp, db, table)
+        os.replace(tmp, path)
+    finally:
+        db.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _write_csv(path: str, db, table: str) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        for i, (columns, rows) in enumerate(_table_batches(db, table)):
+            if i == 0:
+                writer.writerow(columns)
+            writer.writerows(rows)
+
+
+def _parquet_schema(db, table: str):
+    import pyarrow as pa
+
+    # SQLite columns are untyped; a column is numeric only if every stored value is
+    fields = []
+    for row in db.execute(f"PRAGMA table_info({_quote(table)})"):
+        column = row[1]
+        kinds = {k for (k,) in db.execute(f"SELECT DISTINCT typeof({_quote(column)}) FROM {_quote(table)}")}
+        kinds.discard("null")
+        if kinds == {"integer"}:
+            fields.append(pa.field(column, pa.int64()))
+        elif kinds and kinds <= {"integer", "real"}:
+            fields.append(pa.field(column, pa.float64()))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+
+def _write_parquet(path: str, db, table: str) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(db, table)
+    with pq.ParquetWriter(path, schema) as writer:
+        for columns, rows in _table_batches(db, table):
+            data = {c: [row[i] for row in rows] for i, c in enumerate(columns)}
+            writer.write_table(pa.table(data, schema=schema), row_group_size=ROW_GROUP_ROWS)
+
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        print("The parquet sink needs the pyarrow package (pip install pyarrow); skipping it")
+        return False
+    return True
+
+
+def write_sinks(plan: dict, sinks: list) -> int:
+    """
+    Write the plan's rows to every file sink. Returns the number of rows written.
+    """
+    if not any(s in sinks for s in ("sqlite", "parquet", "csv")):
+        return 0
+    tables = operation_rows(plan)
+    if not tables:
+        return 0
+
+    write_sqlite(tables)
+    rows = sum(len(r) for r in tables.values())
+    written = ["sqlite"]
+    if "csv" in sinks:
+        for table in tables:
+            _export(table, "csv", _write_csv)
+        written.append("csv")
+    if "parquet" in sinks and _parquet_available():
+        for table in tables:
+            _export(table, "parquet", _write_parquet)
+        written.append("parquet")
+    print(f"Wrote {rows} row(s) to {', '.join(sorted(tables))} ({', '.join(written)} in {sink_dir()})")
+    return rows
@@ -1,25 +1,23 @@
 from datetime import datetime
-from garminconnect import Garmin
-from notion_client import Client
-from dotenv import load_dotenv, dotenv_values
-import pytz
+from dotenv import load_dotenv
+import argparse
 import os
-import sys
 
-# Constants
-local_tz = pytz.timezone("America/New_York")
-
-# Load environment variables
+from formatting import format_duration, format_local_time
+from garmin_session import login_to_garmin
+from local_dates import sync_tz_name, today
+from notion_index import load_index, page_date
+from relations import load_activity_links
+from rollups import add_rollups, record_rollups, sleep_facts
+from sleep_detail import DEFAULT_RESOLUTION, ingest_sleep_detail, record_sleep_detail, summary_properties
+from sync_plan import add_plan_arguments, create_op, new_plan, run_plan_cli, update_op
+from transport import shared_notion_client
+
+# Load environment variables (SYNC_TIMEZONE is read when needed, see local_dates.py)
 load_dotenv()
-CONFIG = dotenv_values()
-
-def get_sleep_data(garmin):
-    today = datetime.today().date()
-    return garmin.get_sleep_data(today.isoformat())
 
-def format_duration(seconds):
-    minutes = (seconds or 0) // 60
-    return f"{minutes // 60}h {minutes % 60}m"
+def get_sleep_data(garmin, day=None):
+    return garmin.get_sleep_data(day or today().isoformat())
 
 def format_time(timestamp):
     return (
@@ -28,26 +26,24 @@ def format_time(timestamp):
     )
 
 def format_time_readable(timestamp):
-    return (
-        datetime.fromtimestamp(timestamp / 1000, local_tz).strftime("%H:%M")
-        if timestamp else "Unknown"
-    )
+    return format_local_time(timestamp, sync_tz_name())
 
 def format_date_for_name(sleep_date):
     return datetime.strptime(sleep_date, "%Y-%m-%d").strftime("%d.%m.%Y") if sleep_date else "Unknown"
 
-def sleep_data_exists(client, database_id, sleep_date):
-    query = client.databases.query(
-        database_id=database_id,
-        filter={"property": "Long Date", "date": {"equals": sleep_date}}
-    )
-    results = query.get('results', [])
-    return results[0] if results else None  # Ensure it returns None instead of causing IndexError
+def load_sleep_index(client, database_id):
+    """
+    Read the whole sleep database once, keyed by its 'Long Date'.
+    """
+    return load_index(client, database_id, lambda page: page_date(page, "Long Date"))
 
-def create_sleep_data(client, database_id, sleep_data, skip_zero_sleep=True):
+def sleep_properties(sleep_data, skip_zero_sleep=True):
+    """
+    Notion properties for one night of Garmin sleep data, or None if there is nothing to write.
+    """
     daily_sleep = sleep_data.get('dailySleepDTO', {})
     if not daily_sleep:
-        return
+        return None
     
     sleep_date = daily_sleep.get('calendarDate', "Unknown Date")
     total_sleep = sum(
@@ -57,9 +53,9 @@ def create_sleep_data(client, database_id, sleep_data, skip_zero_sleep=True):
     
     if skip_zero_sleep and total_sleep == 0:
         print(f"Skipping sleep data for {sleep_date} as total sleep is 0")
-        return
+        return None
 
-    properties = {
+    return {
         "Date": {"title": [{"text": {"content": format_date_for_name(sleep_date)}}]},
         "Times": {"rich_text": [{"text": {"content": f"{format_time_readable(daily_sleep.get('sleepStartTimestampGMT'))} → {format_time_readable(daily_sleep.get('sleepEndTimestampGMT'))}"}}]},
         "Long Date": {"date": {"start": sleep_date}},
@@ -76,71 +72,66 @@ def create_sleep_data(client, database_id, sleep_data, skip_zero_sleep=True):
         "Awake Time": {"rich_text": [{"text": {"content": format_duration(daily_sleep.get('awakeSleepSeconds', 0))}}]},
         "Resting HR": {"number": sleep_data.get('restingHeartRate', 0)}
     }
-    
-    client.pages.create(parent={"database_id": database_id}, properties=properties, icon={"emoji": "😴"})
-    print(f"Created sleep entry for: {sleep_date}")
 
-def login_to_garmin():
+def plan_sleep_data(database_id, sleep_data, index, skip_zero_sleep=True, extra_properties=None):
     """
-    Login to Garmin Connect with 2FA support
+    Create the night if Notion does not have it yet, otherwise update any changed fields.
+    extra_properties (e.g. the sleep_detail summary) are written in the same payload.
     """
-    garmin_email = os.getenv("GARMIN_EMAIL")
-    garmin_password = os.getenv("GARMIN_PASSWORD")
-    token_store = os.getenv("GARMIN_TOKEN_STORE", "~/.garmin_tokens")
-    token_store = os.path.expanduser(token_store)
-    mfa_code = os.getenv("GARMIN_MFA_CODE")  # Optional, for non-interactive 2FA
-    
-    # Initialize Garmin client
-    garmin = Garmin(garmin_email, garmin_password)
-    
-    try:
-        # First try to use token store if it exists
-        if os.path.exists(token_store):
-            print(f"Using stored tokens from {token_store}")
-            garmin.login(tokenstore=token_store)
-            return garmin
-        
-        # If no token store or it failed, try fresh login
-        if mfa_code:
-            # Use non-interactive 2FA flow
-            print("Using non-interactive 2FA flow")
-            client_state, _ = garmin.login(return_on_mfa=True)
-            if client_state == "needs_mfa":
-                garmin.resume_login(client_state, mfa_code)
-            else:
-                print("MFA was expected but not requested")
+    ops = []
+    properties = sleep_properties(sleep_data, skip_zero_sleep) if sleep_data else None
+    if properties:
+        properties.update(extra_properties or {})
+        sleep_date = properties["Long Date"]["date"]["start"]
+        existing = index.get(sleep_date)
+        if existing:
+            ops.append(update_op(existing, sleep_date, properties))
         else:
-            # Use interactive login (will prompt for MFA code if needed)
-            garmin.login()
-        
-        # Save tokens for future use if login was successful
-        if hasattr(garmin, 'garth') and garmin.garth:
-            # Make sure token store directory exists
-            os.makedirs(os.path.dirname(token_store), exist_ok=True)
-            garmin.garth.save(token_store)
-            print(f"Saved authentication tokens to {token_store}")
-        
-        return garmin
-    except Exception as e:
-        print(f"Error during Garmin login: {e}")
-        sys.exit(1)
+            ops.append(create_op(database_id, sleep_date, properties, icon={"emoji": "😴"}))
+    return new_plan("sleep-data", ops)
 
 def main():
     load_dotenv()
 
+    parser = argparse.ArgumentParser(description="Sync last night's Garmin sleep to Notion")
+    add_plan_arguments(parser)
+    parser.add_argument("--date", metavar="YYYY-MM-DD",
+                        help="sync the night ending on this day instead of last night")
+    parser.add_argument("--detail", action="store_true",
+                        help="also ingest overnight HR/HRV/SpO2/respiration series and write their summary")
+    parser.add_argument("--resolution", type=int,
+                        default=int(os.getenv("SLEEP_DETAIL_RESOLUTION", DEFAULT_RESOLUTION)),
+                        help="seconds per bucket when downsampling detail series (default: %(default)s)")
+    args = parser.parse_args()
+
     # Initialize Notion client using environment variables
     notion_token = os.getenv("NOTION_TOKEN")
     database_id = os.getenv("NOTION_SLEEP_DB_ID")
-
-    # Login to Garmin with 2FA support
-    garmin = login_to_garmin()
-    client = Client(auth=notion_token)
-
-    data = get_sleep_data(garmin)
-    if data:
-        sleep_date = data.get('dailySleepDTO', {}).get('calendarDate')
-        if sleep_date and not sleep_data_exists(client, database_id, sleep_date):
-            create_sleep_data(client, database_id, data, skip_zero_sleep=True)
+    client = shared_notion_client(notion_token)
+
+    def build_plan():
+        # Login to Garmin with 2FA support
+        garmin = login_to_garmin()
+        data = get_sleep_data(garmin, args.date)
+        extra = {}
+        if args.detail and data:
+            # Planning is read-only: the series are stored by after_apply
+            extra = summary_properties(ingest_sleep_detail(data, args.resolution, store=False))
+        if data:
+            # The night's calendarDate is the day it ends, so this links the next day's training
+            sleep_day = (data.get('dailySleepDTO') or {}).get('calendarDate')
+            extra.update(load_activity_links(client).day_properties(sleep_day))
+        plan = plan_sleep_data(database_id, data, load_sleep_index(client, database_id),
+                               skip_zero_sleep=True, extra_properties=extra)
+        if args.detail and data:
+            plan["sleep_detail"] = {"data": data, "resolution": args.resolution}
+        return add_rollups(plan, client, sleep_facts(data))
+
+    def after_apply(plan):
+        record_rollups(plan)
+        record_sleep_detail(plan)
+
+    run_plan_cli(args, client, build_plan, after_apply=after_apply)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
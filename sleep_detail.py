@@ -0,0 +1,228 @@
+"""
+Overnight detail series from the Garmin sleep payload.
+
+get_sleep_data() returns more than dailySleepDTO: per-interval sleep levels and
+per-sample heart rate, HRV, SpO2 and respiration. This module turns those lists
+into NumPy arrays column by column, downsamples them to a fixed resolution with
+bincount (no Python loop per sample), stores the result locally as one .npz
+per night and derives the compact summaries written to Notion.
+"""
+
+import numpy as np
+
+from sync_state import state_path
+
+DEFAULT_RESOLUTION = 300  # seconds per downsampled bucket
+
+# Garmin sleepLevels activityLevel codes
+LEVEL_DEEP, LEVEL_LIGHT, LEVEL_REM, LEVEL_AWAKE = 0, 1, 2, 3
+
+# series name -> (payload key, timestamp field, value field)
+SERIES_FIELDS = {
+    "heart_rate": ("sleepHeartRate", "startGMT", "value"),
+    "hrv": ("hrvData", "startGMT", "value"),
+    "spo2": ("wellnessEpochSPO2DataDTOList", "epochTimestamp", "spo2Reading"),
+    "respiration": ("wellnessEpochRespirationDataDTOList", "startTimeGMT", "respirationValue"),
+    "stress": ("sleepStress", "startGMT", "value"),
+}
+
+
+# -----------------------------
+# Parsing
+# -----------------------------
+def epoch_seconds(values) -> np.ndarray:
+    """
+    Garmin mixes epoch milliseconds and GMT ISO strings ('2025-08-05T22:30:00.0')
+    between series; convert a whole column of either kind to epoch seconds.
+    """
+    if values and isinstance(values[0], str):
+        stamps = np.array([v[:19] for v in values], dtype="datetime64[s]")
+        return stamps.astype(np.int64).astype(np.float64)
+    return np.asarray(values, dtype=np.float64) / 1000.0
+
+
+def _columns(samples: list, t_field: str, v_field: str):
+    t = [s.get(t_field) for s in samples]
+    v = [s.get(v_field) for s in samples]
+    keep = [i for i, x in enumerate(t) if x is not None]
+    if len(keep) != len(t):
+        t = [t[i] for i in keep]
+        v = [v[i] for i in keep]
+    # None -> nan through the float cast
+    return epoch_seconds(t), np.array(v, dtype=np.float64)
+
+
+def series_arrays(sleep_data: dict) -> dict:
+    """
+    {name: (t, v)} float64 arrays for every detail series present in the payload.
+    Samples with missing or negative values (Garmin's "no reading") are dropped.
+    """
+    out = {}
+    for name, (key, t_field, v_field) in SERIES_FIELDS.items():
+        samples = sleep_data.get(key) or []
+        if not samples:
+            continue
+        t, v = _columns(samples, t_field, v_field)
+        keep = np.isfinite(v) & (v >= 0)
+        if keep.any():
+            out[name] = (t[keep], v[keep])
+    return out
+
+
+def level_intervals(sleep_data: dict):
+    """
+    (start, end, level) arrays for the sleepLevels intervals, sorted by start.
+    """
+    levels = sleep_data.get("sleepLevels") or []
+    if not levels:
+        return None
+    starts = epoch_seconds([l["startGMT"] for l in levels])
+    ends = epoch_seconds([l["endGMT"] for l in levels])
+    codes = np.array([l.get("activityLevel", LEVEL_AWAKE) for l in levels], dtype=np.float64).astype(np.int8)
+    order = np.argsort(starts, kind="stable")
+    return starts[order], ends[order], codes[order]
+
+
+# -----------------------------
+# Downsampling
+# -----------------------------
+def downsample(t, v, t0: float, resolution: int):
+    """
+    Mean and minimum of v in fixed buckets of `resolution` seconds starting at t0.
+    Returns (bucket_start, mean, minimum) for the non-empty buckets only.
+    """
+    bucket = ((t - t0) // resolution).astype(np.int64)
+    keep = bucket >= 0
+    bucket, v = bucket[keep], v[keep]
+    if not len(bucket):
+        empty = np.empty(0)
+        return empty, empty, empty
+
+    size = int(bucket.max()) + 1
+    counts = np.bincount(bucket, minlength=size)
+    sums = np.bincount(bucket, weights=v, minlength=size)
+    mins = np.full(size, np.inf)
+    np.minimum.at(mins, bucket, v)
+
+    filled = counts > 0
+    idx = np.nonzero(filled)[0]
+    return t0 + idx * resolution, sums[filled] / counts[filled], mins[filled]
+
+
+def downsample_levels(starts, ends, levels, t0: float, t1: float, resolution: int):
+    """
+    Sleep stage at the midpoint of each bucket between t0 and t1 (-1 where no interval covers it).
+    """
+    mids = t0 + (np.arange(int(np.ceil((t1 - t0) / resolution))) + 0.5) * resolution
+    pos = np.searchsorted(starts, mids, side="right") - 1
+    valid = (pos >= 0) & (mids < ends[np.clip(pos, 0, None)])
+    return mids - 0.5 * resolution, np.where(valid, levels[np.clip(pos, 0, None)], -1)
+
+
+# -----------------------------
+# Summaries
+# -----------------------------
+def _round(value, digits=1):
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+def sleep_summary(sleep_data: dict, series: dict) -> dict:
+    """
+    Compact overnight figures for Notion: lowest HR, average overnight HRV,
+    sleep efficiency (time asleep / time in bed) and average SpO2/respiration.
+    """
+    daily = sleep_data.get("dailySleepDTO") or {}
+
+    hr = series.get("heart_rate")
+    hrv = series.get("hrv")
+    spo2 = series.get("spo2")
+    resp = series.get("respiration")
+
+    asleep = sum((daily.get(k) or 0) for k in ("deepSleepSeconds", "lightSleepSeconds", "remSleepSeconds"))
+    start, end = daily.get("sleepStartTimestampGMT"), daily.get("sleepEndTimestampGMT")
+    in_bed = (end - start) / 1000.0 if start and end else 0
+
+    avg_hrv = sleep_data.get("avgOvernightHrv")
+    if avg_hrv is None and hrv is not None:
+        avg_hrv = hrv[1].mean()
+
+    return {
+        "lowest_hr": _round(hr[1].min(), 0) if hr is not None else None,
+        "avg_hrv": _round(avg_hrv),
+        "efficiency": _round(100.0 * asleep / in_bed) if in_bed > 0 else None,
+        "avg_spo2": _round(spo2[1].mean()) if spo2 is not None else None,
+        "lowest_spo2": _round(spo2[1].min(), 0) if spo2 is not None else None,
+        "avg_respiration": _round(resp[1].mean()) if resp is not None else None,
+    }
+
+
+def summary_properties(summary: dict) -> dict:
+    """
+    Notion number properties for a sleep_summary(); missing figures are left out.
+    """
+    names = {
+        "lowest_hr": "Lowest HR",
+        "avg_hrv": "Avg Overnight HRV",
+        "efficiency": "Sleep Efficiency (%)",
+        "avg_spo2": "Avg SpO2",
+        "lowest_spo2": "Lowest SpO2",
+        "avg_respiration": "Avg Respiration",
+    }
+    return {names[k]: {"number": v} for k, v in summary.items() if v is not None}
+
+
+# -----------------------------
+# Ingestion
+# -----------------------------
+def ingest_sleep_detail(sleep_data: dict, resolution: int = DEFAULT_RESOLUTION, store: bool = True) -> dict:
+    """
+    Downsample every overnight series of one night, save it to
+    SYNC_STATE_DIR/sleep/<date>.npz and return the night's summary.
+    """
+    daily = sleep_data.get("dailySleepDTO") or {}
+    sleep_date = daily.get("calendarDate")
+    series = series_arrays(sleep_data)
+    summary = sleep_summary(sleep_data, series)
+    if not store or not sleep_date:
+        return summary
+
+    start, end = daily.get("sleepStartTimestampGMT"), daily.get("sleepEndTimestampGMT")
+    all_t = [t for t, _ in series.values()]
+    t0 = start / 1000.0 if start else (min(t.min() for t in all_t) if all_t else 0.0)
+    t0 -= t0 % resolution
+
+    arrays = {"resolution": np.array(resolution), "summary_keys": np.array(list(summary)),
+              "summary_values": np.array([np.nan if v is None else v for v in summary.values()])}
+    for name, (t, v) in series.items():
+        bt, mean, low = downsample(t, v, t0, resolution)
+        arrays[f"{name}_t"] = bt.astype(np.int64)
+        arrays[f"{name}_mean"] = mean.astype(np.float32)
+        arrays[f"{name}_min"] = low.astype(np.float32)
+
+    intervals = level_intervals(sleep_data)
+    if intervals is not None:
+        t1 = end / 1000.0 if end else float(intervals[1].max())
+        bt, lv = downsample_levels(*intervals, t0, t1, resolution)
+        arrays["levels_t"] = bt.astype(np.int64)
+        arrays["levels"] = lv.astype(np.int8)
+
+    np.savez_compressed(state_path("sleep", f"{sleep_date}.npz"), **arrays)
+    return summary
+
+
+def record_sleep_detail(plan: dict) -> None:
+    """
+    Store the night's series carried by a plan once it has been applied
+    (planning only computes the summary, see --plan).
+    """
+    detail = plan.get("sleep_detail")
+    if detail:
+        ingest_sleep_detail(detail["data"], detail["resolution"])
+
+
+def load_sleep_detail(sleep_date: str) -> dict:
+    """
+    Stored downsampled series for one night, as {array name: ndarray}.
+    """
+    with np.load(state_path("sleep", f"{sleep_date}.npz")) as data:
+        return {k: data[k] for k in data.files}
@@ -0,0 +1,144 @@
+"""
+Step-goal streaks and step records, maintained incrementally.
+
+Garmin only reports "Most Steps in a Day/Week/Month" and "Longest Goal
+Streak" as personal records, and never the current streak. Here the daily
+totals daily-steps.py syncs are folded into a small running state (current
+and longest streak, this week's and month's totals, best day/week/month)
+kept in SYNC_STATE_DIR/steps/streaks.json. A new day is one O(1) update;
+nothing is re-summed.
+
+Each processed day also keeps its snapshot (steps, goal, streak, longest
+streak, week and month totals so far), so re-syncing a day that did not
+change costs a lookup. Only a day that changed after later days were
+processed (a late Garmin correction) rebuilds the state from the stored days.
+A day missing between two synced days breaks the streak, which is why
+daily-steps.py --streaks first catches up on days it has not seen.
+"""
+
+from datetime import date, timedelta
+
+from sync_state import load_json, save_json, state_path
+
+MAX_CATCHUP_DAYS = 90
+
+# Snapshot layout per day
+STEPS, GOAL, STREAK, LONGEST, WEEK_TOTAL, MONTH_TOTAL = range(6)
+
+
+def _state_file() -> str:
+    return state_path("steps", "streaks.json")
+
+
+def week_key(day: str) -> str:
+    year, week, _ = date.fromisoformat(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _empty_running() -> dict:
+    return {
+        "last_day": None,
+        "streak": 0,
+        "longest": [0, None],      # length, last day
+        "week": [None, 0],         # key, total so far
+        "month": [None, 0],
+        "best_day": [0, None],     # total, key
+        "best_week": [0, None],
+        "best_month": [0, None],
+    }
+
+
+class StepStreaks:
+    def __init__(self, state: dict = None):
+        state = state or {}
+        self.days = state.get("days", {})
+        self.running = state.get("running") or _empty_running()
+
+    def to_json(self) -> dict:
+        return {"days": self.days, "running": self.running}
+
+    def next_day(self):
+        """
+        First day not processed yet, or None before the first update.
+        """
+        last = self.running["last_day"]
+        return (date.fromisoformat(last) + timedelta(days=1)) if last else None
+
+    def update(self, day: str, steps: int, goal: int) -> list:
+        """
+        Fold one day's total into the state and return the day's snapshot.
+        """
+        steps, goal = steps or 0, goal or 0
+        known = self.days.get(day)
+        if known and known[STEPS] == steps and known[GOAL] == goal:
+            return known
+        last = self.running["last_day"]
+        if last and day <= last:
+            self.days[day] = [steps, goal]
+            self._rebuild()
+        else:
+            self._add(day, steps, goal)
+        return self.days[day]
+
+    def _add(self, day: str, steps: int, goal: int) -> None:
+        r = self.running
+        if r["last_day"] and date.fromisoformat(day) - date.fromisoformat(r["last_day"]) > timedelta(days=1):
+            r["streak"] = 0  # a day without data breaks the streak
+        r["streak"] = r["streak"] + 1 if goal and steps >= goal else 0
+        if r["streak"] > r["longest"][0]:
+            r["longest"] = [r["streak"], day]
+
+        for name, key in (("week", week_key(day)), ("month", day[:7])):
+            if r[name][0] != key:
+                r[name] = [key, 0]
+            r[name][1] += steps
+            if r[name][1] > r[f"best_{name}"][0]:
+                r[f"best_{name}"] = [r[name][1], key]
+        if steps > r["best_day"][0]:
+            r["best_day"] = [steps, day]
+
+        r["last_day"] = day
+        self.days[day] = [steps, goal, r["streak"], r["longest"][0], r["week"][1], r["month"][1]]
+
+    def _rebuild(self) -> None:
+        print("Step history changed before the last processed day; rebuilding streaks")
+        days, self.days, self.running = self.days, {}, _empty_running()
+        for day in sorted(days):
+            self._add(day, days[day][STEPS], days[day][GOAL])
+
+    def records(self) -> dict:
+        r = self.running
+        return {
+            "Current Goal Streak": r["streak"],
+            "Longest Goal Streak": r["longest"][0],
+            "Most Steps in a Day": r["best_day"][0],
+            "Most Steps in a Week": r["best_week"][0],
+            "Most Steps in a Month": r["best_month"][0],
+        }
+
+
+def load_streaks() -> StepStreaks:
+    return StepStreaks(load_json(_state_file(), {}))
+
+
+def save_streaks(streaks: StepStreaks) -> None:
+    save_json(_state_file(), streaks.to_json())
+
+
+def catchup_start(streaks: StepStreaks, end: date) -> date:
+    """
+    First day daily-steps.py should fetch so no day is missing from the streak.
+    """
+    start = streaks.next_day() or end
+    return max(min(start, end), end - timedelta(days=MAX_CATCHUP_DAYS - 1))
+
+
+def streak_properties(snapshot: list) -> dict:
+    goal = snapshot[GOAL]
+    return {
+        "Goal Streak": {"number": snapshot[STREAK]},
+        "Longest Goal Streak": {"number": snapshot[LONGEST]},
+        "Week Steps": {"number": snapshot[WEEK_TOTAL]},
+        "Month Steps": {"number": snapshot[MONTH_TOTAL]},
+        "Goal Progress": {"number": round(snapshot[STEPS] / goal, 3) if goal else None},
+    }
@@ -1,26 +1,138 @@
 #!/usr/bin/env python3
+import argparse
+import json
+import os
+import runpy
 import subprocess
 import sys
+import time
+from contextlib import nullcontext
 from pathlib import Path
 
+from deadline import add_deadline_argument, init_deadline, remaining
+from profiling import add_profile_argument, default_run_dir
+from scheduler import drain, planning_budget, start_collecting
+from sinks import add_sink_argument, init_sinks
+from transport import print_connection_stats
+
 ROOT = Path(__file__).resolve().parent
 
-def run(script):
+# Extra time a script gets past the deadline to stop between writes before it is killed
+KILL_GRACE = 60
+
+SCRIPTS = [
+    "garmin-activities2.py",
+    "personal-records.py",
+    "sleep-data.py",
+    "daily-steps.py",
+    "health-data.py",
+    "daily-metrics.py",
+    "intraday-data.py",
+]
+
+def run_in_process(script, argv):
+    """
+    Run a script in this interpreter, so every script shares one Garmin login,
+    one Notion connection pool and the Garmin call cache (see garmin_session.py).
+    A hung call cannot be killed here; per-call timeouts still apply.
+    """
+    saved_argv = sys.argv
+    sys.argv = [str(ROOT / script)] + argv
+    try:
+        runpy.run_path(str(ROOT / script), run_name="__main__")
+        return 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception as e:
+        print(f"{script}: {type(e).__name__}: {e}")
+        return 1
+    finally:
+        sys.argv = saved_argv
+
+def run(script, profile_dir=None, in_process=False):
     path = ROOT / script
     print(f"\n▶ {script}")
-    # always call with the same Python interpreter running this file
-    result = subprocess.run([sys.executable, str(path)], cwd=ROOT)
-    if result.returncode == 0:
+    argv = []
+    if profile_dir:
+        argv += ["--profile", str(Path(profile_dir) / Path(script).stem)]
+    command = [sys.executable, str(path)] + argv
+    left = remaining()
+    if left is not None and left <= 0:
+        print(f"⏭ {script} skipped: deadline reached")
+        return {"script": script, "exit": None, "wall_s": 0.0, "cpu_s": 0.0}
+    if in_process:
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        returncode = run_in_process(script, argv)
+        print(f"✓ {script} done" if returncode == 0 else f"✗ {script} failed (exit {returncode})")
+        return {"script": script, "exit": returncode, "wall_s": round(time.perf_counter() - wall0, 3),
+                "cpu_s": round(time.process_time() - cpu0, 3)}
+    # always call with the same Python interpreter running this file; children
+    # inherit SYNC_DEADLINE_AT, so they stop cleanly on their own before the kill timeout
+    wall0, cpu0 = time.perf_counter(), os.times()
+    try:
+        returncode = subprocess.run(command, cwd=ROOT,
+                                    timeout=left + KILL_GRACE if left is not None else None).returncode
+    except subprocess.TimeoutExpired:
+        returncode = -1
+        print(f"✗ {script} killed: still running {KILL_GRACE}s past the deadline")
+    cpu1 = os.times()
+    if returncode == 0:
         print(f"✓ {script} done")
-    else:
-        print(f"✗ {script} failed (exit {result.returncode})")
+    elif returncode != -1:
+        print(f"✗ {script} failed (exit {returncode})")
+    return {
+        "script": script,
+        "exit": returncode,
+        "wall_s": round(time.perf_counter() - wall0, 3),
+        "cpu_s": round((cpu1.children_user - cpu0.children_user) + (cpu1.children_system - cpu0.children_system), 3),
+    }
+
+def write_profile_summary(profile_dir, runs):
+    """
+    One summary for the whole run: per-script wall/CPU time plus each script's own stages.
+    """
+    for r in runs:
+        child = Path(profile_dir) / Path(r["script"]).stem / "summary.json"
+        if child.exists():
+            r["stages"] = json.loads(child.read_text(encoding="utf-8"))["stages"]
+    with open(Path(profile_dir) / "summary.json", "w", encoding="utf-8") as f:
+        json.dump({"script": "sync-all2", "runs": runs}, f, indent=2)
+
+    print(f"\nProfile written to {profile_dir}")
+    for r in runs:
+        print(f"  {r['script']:<24}{r['wall_s']:>8.2f}s wall{r['cpu_s']:>8.2f}s cpu")
 
 if __name__ == "__main__":
-    for s in [
-        "garmin-activities2.py",
-        "personal-records.py",
-        "sleep-data.py",
-        "daily-steps.py",
-        "health-data.py",
-    ]:
-        run(s)
+    parser = argparse.ArgumentParser(description="Run every sync script in turn")
+    add_profile_argument(parser)
+    add_deadline_argument(parser)
+    add_sink_argument(parser)
+    parser.add_argument("--in-process", action="store_true",
+                        help="run the scripts in this process, sharing the Garmin login, connections "
+                             "and identical Garmin calls between them")
+    parser.add_argument("--recent-first", action="store_true",
+                        help="run in process and write every script's changes from one queue, most recent "
+                             "dates first with fair shares per script, so backfills never delay today's data")
+    args = parser.parse_args()
+    init_deadline(args.deadline)
+    init_sinks(args.sink)
+
+    profile_dir = None
+    if args.profile is not None:
+        profile_dir = args.profile or default_run_dir("sync-all2")
+        os.makedirs(profile_dir, exist_ok=True)
+
+    in_process = args.in_process or args.recent_first
+    if args.recent_first:
+        start_collecting()
+    runs = []
+    for i, s in enumerate(SCRIPTS):
+        with planning_budget(len(SCRIPTS) - i) if args.recent_first else nullcontext():
+            runs.append(run(s, profile_dir, in_process))
+    if args.recent_first:
+        drain()
+    if in_process:
+        print()
+        print_connection_stats()
+    if profile_dir:
+        write_profile_summary(profile_dir, runs)
@@ -0,0 +1,315 @@
+"""
+Plan/apply split for the Notion sync scripts.
+
+A plan is a list of create/update/archive operations computed from Garmin data
+and the bulk Notion state, each carrying a field-level diff. "body" operations
+replace the content of an existing page. Planning is
+read-only; `apply_plan` is the only place that writes to Notion.
+
+Every sync script accepts:
+  --plan          print the plan and exit without writing
+  --plan FILE     write the plan as JSON to FILE and exit
+  --apply FILE    apply a plan previously written with --plan FILE
+  --profile [DIR] profile the "plan" and "apply" stages (see profiling.py)
+  --deadline SECS stop cleanly between writes once the run's time is up (see deadline.py)
+  --sink SINK     also (or only) write the rows to SQLite, Parquet or CSV (see sinks.py)
+With neither flag the script plans and applies in one go, as before.
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+from autotune import save_tuning
+from deadline import add_deadline_argument, expired, init_deadline
+from notion_blocks import append_blocks, pack_blocks, replace_body
+from notion_index import fold_pages, page_value, property_value
+from profiling import add_profile_argument, profile_session, stage
+from sinks import add_sink_argument, init_sinks, write_sinks
+from transport import print_connection_stats
+
+PLAN_VERSION = 1
+
+PAST_TENSE = {"create": "Created", "update": "Updated", "archive": "Archived", "body": "Rewrote body of"}
+
+# Set by scheduler.start_collecting: plans are queued there instead of applied here
+_collector = None
+
+# Every row planned since the last take_rows(), changed or not: (database_id, key) -> properties
+_rows = {}
+
+
+# -----------------------------
+# Building operations
+# -----------------------------
+def diff_properties(page: dict, properties: dict) -> dict:
+    """
+    Field-level diff between an existing Notion page and a properties payload.
+    Returns {name: {"old": ..., "new": ...}} for every property that would change.
+    """
+    diff = {}
+    for name, prop in properties.items():
+        old = page_value(page, name) if page else None
+        new = property_value(prop)
+        if old != new:
+            diff[name] = {"old": old, "new": new}
+    return diff
+
+
+def _note_row(database_id: str, key: str, properties: dict) -> None:
+    _rows.setdefault(((database_id or "").replace("-", ""), key), {}).update(properties)
+
+
+def take_rows() -> list:
+    """
+    The full property rows planned since the last call (for the file sinks,
+    which also want the rows that needed no Notion write), and forget them.
+    """
+    global _rows
+    rows, _rows = _rows, {}
+    return [{"database_id": database_id, "key": key, "properties": properties}
+            for (database_id, key), properties in rows.items()]
+
+
+def create_op(database_id: str, key: str, properties: dict, icon=None, cover=None) -> dict:
+    """
+    Operation that creates a new page in database_id.
+    """
+    _note_row(database_id, key, properties)
+    return {
+        "action": "create",
+        "database_id": database_id,
+        "key": key,
+        "properties": properties,
+        "icon": icon,
+        "cover": cover,
+        "diff": diff_properties(None, properties),
+    }
+
+
+def update_op(page: dict, key: str, properties: dict, icon=None, cover=None, action: str = "update"):
+    """
+    Operation that updates an existing page, or None if nothing would change.
+    Only the changed properties are sent. `action="archive"` marks updates that
+    retire a row (e.g. an old PR) so they read clearly in the plan.
+    """
+    _note_row(page.get("database_id"), key, properties)
+    diff = diff_properties(page, properties)
+    if not diff:
+        return None
+    return {
+        "action": action,
+        "page_id": page["id"],
+        "database_id": page.get("database_id"),
+        "key": key,
+        "properties": {name: properties[name] for name in diff},
+        "icon": icon,
+        "cover": cover,
+        "diff": diff,
+    }
+
+
+def body_op(page_id: str, key: str, children: list, old_hash, new_hash) -> dict:
+    """
+    Operation that replaces the body (child blocks) of an existing page.
+    """
+    return {
+        "action": "body",
+        "page_id": page_id,
+        "key": key,
+        "children": children,
+        "diff": {"body": {"old": old_hash, "new": new_hash}},
+    }
+
+
+def new_plan(script: str, operations) -> dict:
+    return {
+        "version": PLAN_VERSION,
+        "script": script,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "operations": [op for op in operations if op],
+    }
+
+
+# -----------------------------
+# Output
+# -----------------------------
+def _short(value) -> str:
+    text = json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= 60 else text[:57] + "..."
+
+
+def print_plan(plan: dict) -> None:
+    """
+    Human-readable diff preview of a plan.
+    """
+    ops = plan["operations"]
+    if not ops:
+        print(f"{plan['script']}: nothing to do")
+        return
+
+    for op in ops:
+        marker = {"create": "+", "update": "~", "archive": "-", "body": "~"}.get(op["action"], "?")
+        print(f"{marker} {op['action']} {op['key']}")
+        for name, change in op["diff"].items():
+            if op["action"] == "create":
+                print(f"    {name}: {_short(change['new'])}")
+            else:
+                print(f"    {name}: {_short(change['old'])} → {_short(change['new'])}")
+
+    counts = {}
+    for op in ops:
+        counts[op["action"]] = counts.get(op["action"], 0) + 1
+    summary = ", ".join(f"{n} to {action}" for action, n in sorted(counts.items()))
+    print(f"{plan['script']}: {summary}")
+
+
+def write_plan(plan: dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+    print(f"Wrote plan with {len(plan['operations'])} operation(s) to {path}")
+
+
+def load_plan(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version in {path}: {plan.get('version')}")
+    return plan
+
+
+# -----------------------------
+# Applying
+# -----------------------------
+def apply_op(client, op: dict):
+    """
+    Write one operation; returns the page Notion sent back (None for bodies).
+    """
+    extra = {}
+    if op.get("icon"):
+        extra["icon"] = op["icon"]
+    if op.get("cover"):
+        extra["cover"] = op["cover"]
+
+    if op["action"] == "create":
+        # The first batch of body blocks rides along with the create call
+        batches = pack_blocks(op.get("children") or [])
+        if batches:
+            extra["children"] = batches[0]
+        page = client.pages.create(parent={"database_id": op["database_id"]}, properties=op["properties"], **extra)
+        for batch in batches[1:]:
+            append_blocks(client, page["id"], batch)
+        return page
+    if op["action"] == "body":
+        replace_body(client, op["page_id"], op["children"])
+        return None
+    return client.pages.update(page_id=op["page_id"], properties=op["properties"], **extra)
+
+
+def apply_plan(client, plan: dict) -> tuple:
+    """
+    Execute every operation of a plan against Notion. Failures are reported per
+    operation so one bad row does not stop the rest. Once the run deadline has
+    passed the remaining operations are skipped, except the rest of a group
+    (operations sharing op["group"]) already started. The written pages are
+    folded into the local mirrors (notion_index.fold_pages). Returns (applied,
+    skipped, failed).
+    """
+    if not plan["operations"]:
+        print(f"{plan['script']}: nothing to apply")
+        return [], [], []
+
+    applied, skipped, failed, written = [], [], [], []
+    previous = {}
+    for i, op in enumerate(plan["operations"]):
+        # Operations of one group (e.g. archiving the old PR and creating the new one) are not split up
+        in_group = op.get("group") is not None and op.get("group") == previous.get("group")
+        previous = op
+        if expired() and not in_group:
+            skipped = plan["operations"][i:]
+            print(f"Deadline reached: {len(skipped)} operation(s) left for the next run")
+            break
+        try:
+            page = apply_op(client, op)
+            applied.append(op)
+            if isinstance(page, dict) and page.get("id"):
+                written.append(page)
+            print(f"{PAST_TENSE[op['action']]}: {op['key']}")
+        except Exception as e:
+            failed.append(op)
+            print(f"Error applying {op['action']} for {op['key']}: {e}")
+    fold_pages(written)
+    return applied, skipped, failed
+
+
+def collect_plans(collector) -> None:
+    """
+    collector(client, plan, after_apply) takes over the Notion writes of every
+    plan run_plan_cli would apply (see scheduler.py); None restores applying.
+    """
+    global _collector
+    _collector = collector
+
+
+# -----------------------------
+# CLI glue
+# -----------------------------
+def add_plan_arguments(parser) -> None:
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--plan", nargs="?", const="-", metavar="FILE",
+                       help="compute the plan without writing; print it, or save it as JSON to FILE")
+    group.add_argument("--apply", metavar="FILE",
+                       help="apply a plan previously saved with --plan FILE")
+    add_profile_argument(parser)
+    add_deadline_argument(parser)
+    add_sink_argument(parser)
+
+
+def run_plan_cli(args, client, build_plan, after_apply=None) -> None:
+    """
+    Dispatch --plan / --apply. build_plan is only called when a plan is needed,
+    so --apply never logs in to Garmin. after_apply(plan), if given, runs once a
+    plan has been written to Notion (e.g. to advance local sync state); it gets
+    the applied operations, plus "skipped" ones: those the deadline cut off and
+    those that failed, both planned again next run.
+    Without notion among the sinks it does not run: Notion got none of the
+    plan, so its sync state stays where it was.
+    """
+    init_deadline(getattr(args, "deadline", None))
+    sinks = init_sinks(getattr(args, "sink", None))
+    script = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    with profile_session(getattr(args, "profile", None), script):
+        _dispatch(args, client, build_plan, after_apply, sinks)
+    print_connection_stats()
+    save_tuning()
+
+
+def _dispatch(args, client, build_plan, after_apply, sinks) -> None:
+    if args.apply:
+        plan = load_plan(args.apply)
+    else:
+        with stage("plan"):
+            take_rows()
+            plan = build_plan()
+            plan["rows"] = take_rows()
+        if args.plan == "-":
+            print_plan(plan)
+            return
+        if args.plan:
+            print_plan(plan)
+            write_plan(plan, args.plan)
+            return
+
+    with stage("apply"):
+        write_sinks(plan, sinks)
+        if "notion" in sinks and _collector:
+            _collector(client, plan, after_apply)
+            return
+        if "notion" not in sinks:
+            if after_apply:
+                print(f"{plan['script']}: Notion not written, sync state left as it was")
+            return
+        applied, skipped, failed = apply_plan(client, plan)
+        if after_apply:
+            after_apply({**plan, "operations": applied, "skipped": skipped + failed})
@@ -0,0 +1,50 @@
+"""
+Local state shared by the sync scripts (Notion mirrors, watermarks, caches).
+
+Everything lives under SYNC_STATE_DIR (default ~/.garmin_notion_state) as
+plain JSON files, written atomically so an interrupted run never leaves a
+half-written file behind.
+"""
+
+import json
+import os
+import tempfile
+
+
+def state_dir() -> str:
+    path = os.path.expanduser(os.getenv("SYNC_STATE_DIR", "~/.garmin_notion_state"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def state_path(*parts: str) -> str:
+    """
+    Path of a file inside the state directory, creating parent folders as needed.
+    """
+    path = os.path.join(state_dir(), *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def load_json(path: str, default=None):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable state file {path}: {e}")
+        return default
+
+
+def save_json(path: str, data) -> None:
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -0,0 +1,187 @@
+"""
+formatting.py against the per-script helpers it replaced.
+
+The old_* functions are the inline helpers from garmin-activities2.py,
+sleep-data.py and personal-records.py as they were before formatting.py.
+Run with: python -m pytest -q test_formatting.py (needs pytest and hypothesis).
+"""
+
+from datetime import datetime
+
+import pytz
+from hypothesis import assume, given
+from hypothesis import strategies as st
+
+from formatting import (
+    format_clock,
+    format_clock_array,
+    format_duration,
+    format_local_time,
+    format_local_time_array,
+    format_pace,
+    format_pace_array,
+    format_pace_for_effort,
+    km,
+    minutes,
+)
+
+speeds = st.floats(min_value=0.3, max_value=15.0, allow_nan=False)
+# Garmin reports record times to the hundredth of a second
+record_times = st.integers(min_value=0, max_value=5 * 3600 * 100).map(lambda c: c / 100)
+epoch_ms = st.integers(min_value=946684800000, max_value=2524608000000)
+
+
+# -----------------------------
+# The old helpers
+# -----------------------------
+def old_format_pace(average_speed_mps):
+    if not average_speed_mps or average_speed_mps <= 0:
+        return ""
+    pace_min = 1000.0 / (average_speed_mps * 60.0)
+    minutes = int(pace_min)
+    seconds = int(round((pace_min - minutes) * 60))
+    if seconds == 60:
+        minutes += 1
+        seconds = 0
+    return f"{minutes}:{seconds:02d} min/km"
+
+
+def old_km(distance_meters):
+    try:
+        return round((distance_meters or 0) / 1000.0, 2)
+    except Exception:
+        return 0.0
+
+
+def old_minutes(duration_seconds):
+    try:
+        return round((duration_seconds or 0) / 60.0, 2)
+    except Exception:
+        return 0.0
+
+
+def old_format_duration(seconds):
+    minutes = (seconds or 0) // 60
+    return f"{minutes // 60}h {minutes % 60}m"
+
+
+def old_fmt_dt_readable(iso_str, local_tz):
+    if not iso_str:
+        return "Unknown"
+    try:
+        dt = datetime.fromisoformat(iso_str.replace("Z", "").replace("000Z", ""))
+        if dt.tzinfo is None:
+            dt = local_tz.localize(dt)
+        return dt.astimezone(local_tz).strftime("%H:%M")
+    except Exception:
+        return "Unknown"
+
+
+def old_format_time_readable(timestamp, local_tz):
+    return datetime.fromtimestamp(timestamp / 1000, local_tz).strftime("%H:%M") if timestamp else "Unknown"
+
+
+def old_1k_value(value):
+    total_seconds = round(value)
+    return f"{total_seconds // 60}:{total_seconds % 60:02d} /km"
+
+
+def old_default_value(value):
+    if int(value // 60) < 60:
+        minutes = int(value // 60)
+        seconds = round((value / 60 - minutes) * 60, 2)
+        return f"{minutes}:{seconds:05.2f}"
+    hours = int(value // 3600)
+    minutes = int((value % 3600) // 60)
+    seconds = round(value % 60, 2)
+    return f"{hours}:{minutes:02}:{seconds:05.2f}"
+
+
+# -----------------------------
+# Same output as before
+# -----------------------------
+@given(speeds)
+def test_pace_matches_old_helper(speed):
+    per_km = 1000.0 / speed
+    # Under an hour per km, and not on a half second where the two float paths may round apart
+    assume(per_km < 3600 and abs(per_km % 1 - 0.5) > 1e-6)
+    assert format_pace(speed) == old_format_pace(speed)
+
+
+@given(st.one_of(st.none(), st.just(0), st.floats(max_value=0, allow_nan=False)))
+def test_pace_of_invalid_speed_is_empty(speed):
+    assert format_pace(speed) == old_format_pace(speed) == ""
+
+
+@given(st.one_of(st.none(), st.integers(-10**7, 10**7), st.floats(-1e7, 1e7)))
+def test_km_and_minutes_match_old_helpers(value):
+    assert km(value) == old_km(value)
+    assert minutes(value) == old_minutes(value)
+
+
+@given(st.one_of(st.none(), st.integers(min_value=0, max_value=10**6)))
+def test_duration_matches_old_helper(seconds):
+    assert format_duration(seconds) == old_format_duration(seconds)
+
+
+@given(record_times)
+def test_1k_record_matches_old_branch(value):
+    # Over an hour now reads h:mm:ss instead of 60:00 (see the formatting.py commit)
+    assume(round(value) < 3600)
+    assert f"{format_clock(value)} /km" == old_1k_value(value)
+
+
+@given(record_times)
+def test_default_record_matches_old_branch(value):
+    assert format_clock(value, decimals=2) == old_default_value(value)
+
+
+@given(epoch_ms, st.sampled_from(["Europe/London", "America/New_York", "Asia/Kolkata", "Australia/Adelaide"]))
+def test_local_time_matches_old_helpers(ms, tz_name):
+    tz = pytz.timezone(tz_name)
+    assert format_local_time(ms, tz_name) == old_format_time_readable(ms, tz)
+    iso = datetime.utcfromtimestamp(ms // 1000).isoformat() + ".0"
+    assert format_local_time(iso, tz_name) == old_fmt_dt_readable(iso, tz)
+
+
+# -----------------------------
+# Batched and localized variants
+# -----------------------------
+@given(st.lists(st.floats(min_value=0, max_value=10**6, allow_nan=False), max_size=20))
+def test_clock_array_matches_scalar(values):
+    assert format_clock_array(values) == [format_clock(v) for v in values]
+
+
+@given(st.lists(st.one_of(speeds, st.just(0.0), st.just(-1.0)), max_size=20))
+def test_pace_array_matches_scalar(values):
+    assert format_pace_array(values) == [format_pace(v) for v in values]
+
+
+@given(st.lists(epoch_ms, max_size=20), st.sampled_from(["Europe/London", "Asia/Kolkata", "Australia/Lord_Howe"]))
+def test_local_time_array_matches_scalar(values, tz_name):
+    assert format_local_time_array(values, tz_name) == [format_local_time(v, tz_name) for v in values]
+
+
+@given(speeds, st.sampled_from(["en", "de", "fr", "nl"]))
+def test_pace_locale_only_changes_separators(speed, locale):
+    assume(1000.0 / speed < 3600)
+    assert format_pace(speed, locale=locale) == format_pace(speed)
+    english = format_pace(speed, decimals=1)
+    localized = format_pace(speed, decimals=1, locale=locale)
+    assert localized == (english if locale == "en" else english.replace(".", ","))
+
+
+def test_locale_examples():
+    assert format_pace(1000 / 295.25, decimals=1, locale="de") == "4:55,2 min/km"
+    assert format_pace(1609.344 / 480, units="imperial", locale="fr") == "8:00 min/mi"
+    assert format_pace_for_effort(1500, 5000, locale="nl") == "5:00 /km"
+    assert format_duration(1234 * 3600 + 5 * 60, locale="en") == "1,234h 5m"
+    assert format_duration(1234 * 3600 + 5 * 60, locale="de") == "1.234h 5m"
+    assert format_duration(7 * 3600 + 5 * 60 + 59, locale="fr") == "7h 5m"
+
+
+def test_local_time_array_across_half_hour_transition():
+    # Lord Howe moves from +10:30 to +11 at 15:30 UTC, halfway through the hour
+    start = 1759590000000  # 2025-10-04 15:00 UTC
+    values = [start + m * 60000 for m in range(0, 60, 15)]
+    assert format_local_time_array(values, "Australia/Lord_Howe") == ["01:30", "01:45", "02:30", "02:45"]
@@ -0,0 +1,33 @@
+"""
+HealthTrends smoothing and incremental updates.
+Run with: python -m pytest -q test_health_trends.py
+"""
+
+import numpy as np
+
+from health_trends import HealthTrends, ema
+
+
+def test_trailing_day_without_reading_keeps_the_last_trend():
+    trends = HealthTrends()
+    trends.update({"2026-10-15": [80.0, 50], "2026-10-16": [79.0, 52]})
+    trends.extend_to("2026-10-17")
+    summary = trends.summary("2026-10-17")
+    assert summary == {**trends.summary("2026-10-16"), "weight_delta_7d": None, "weight_delta_30d": None}
+    assert summary["weight_trend"] is not None and summary["rhr_trend"] is not None
+
+
+def test_reading_on_a_carried_day_recomputes_it():
+    trends = HealthTrends()
+    trends.update({"2026-10-15": [80.0, 50]})
+    trends.extend_to("2026-10-17")
+    trends.update({"2026-10-17": [78.0, None]})
+    assert trends.days["2026-10-16"][2] == 80.0
+    assert trends.days["2026-10-17"][2] < 80.0
+
+
+def test_ema_stays_finite_for_tiny_half_lives():
+    values = np.where(np.arange(1000) % 3, 70.0 + np.arange(1000) % 7, np.nan)
+    for alpha in (0.5, 0.999, 1.0):
+        trend = ema(values, alpha)
+        assert np.isfinite(trend[1:]).all()
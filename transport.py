@@ -0,0 +1,136 @@
+"""
+Shared HTTP transport: one pooled keep-alive client per service per process.
+
+Notion: a single httpx.Client (HTTP/2 when NOTION_HTTP2=1 and the h2 package
+is installed) behind one notion_client.Client per token, so every stage of a
+script (mirror refresh, planning reads, writes) reuses the same connections.
+Garmin: garminconnect already talks through garth's requests.Session; the
+logged-in session is shared per process by garmin_session.login_to_garmin and
+instrumented here.
+
+Both transports count requests, new connections and TLS handshakes, so a run
+can show that handshakes happen once rather than once per stage.
+"""
+
+import os
+from collections import Counter
+
+import httpx
+from notion_client import Client
+
+from deadline import notion_timeout
+
+STATS = {"notion": Counter(), "garmin": Counter()}
+
+_notion_clients = {}
+
+
+# -----------------------------
+# Notion
+# -----------------------------
+def _http2_enabled() -> bool:
+    if os.getenv("NOTION_HTTP2", "").lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        print("NOTION_HTTP2 is set but the h2 package is missing (pip install 'httpx[http2]'); using HTTP/1.1")
+        return False
+    return True
+
+
+def _trace(event: str, info: dict) -> None:
+    if event == "connection.connect_tcp.complete":
+        STATS["notion"]["connections"] += 1
+    elif event == "connection.start_tls.complete":
+        STATS["notion"]["tls_handshakes"] += 1
+
+
+def _on_request(request: httpx.Request) -> None:
+    STATS["notion"]["requests"] += 1
+    request.extensions["trace"] = _trace
+
+
+def _notion_http_client() -> httpx.Client:
+    return httpx.Client(
+        http2=_http2_enabled(),
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=60),
+        event_hooks={"request": [_on_request]},
+    )
+
+
+def shared_notion_client(token: str) -> Client:
+    """
+    The process-wide Notion client for a token (in practice there is one).
+    notion_client sets the base URL and auth header on the httpx client it is
+    given, which is why the pooled client is per token rather than global.
+    """
+    if token not in _notion_clients:
+        _notion_clients[token] = Client(auth=token, client=_notion_http_client(),
+                                        timeout_ms=int(notion_timeout() * 1000))
+    return _notion_clients[token]
+
+
+# -----------------------------
+# Garmin
+# -----------------------------
+def _count_connections(pool) -> None:
+    # Only this pool's connections are counted; no urllib3 logger is touched
+    new_conn = pool._new_conn
+
+    def counted():
+        STATS["garmin"]["connections"] += 1
+        if pool.scheme == "https":
+            STATS["garmin"]["tls_handshakes"] += 1
+        return new_conn()
+    pool._new_conn = counted
+
+
+def _count_pools(manager) -> None:
+    # Wrap the pools the Garmin session already has and every one it creates later
+    if getattr(manager, "_garmin_counted", False):
+        return
+    manager._garmin_counted = True
+    for key in list(manager.pools.keys()):
+        _count_connections(manager.pools[key])
+    new_pool = manager._new_pool
+
+    def counted_pool(*args, **kwargs):
+        pool = new_pool(*args, **kwargs)
+        _count_connections(pool)
+        return pool
+    manager._new_pool = counted_pool
+
+
+def instrument_garmin(garmin) -> None:
+    """
+    Count requests and new connections made through a Garmin client's session.
+    """
+    session = garmin.garth.sess
+    if getattr(session, "_garmin_counted", False):
+        return
+    session._garmin_counted = True
+    for adapter in session.adapters.values():
+        if getattr(adapter, "poolmanager", None) is not None:
+            _count_pools(adapter.poolmanager)
+
+    def count(response, *args, **kwargs):
+        STATS["garmin"]["requests"] += 1
+    session.hooks["response"].append(count)
+
+
+# -----------------------------
+# Stats
+# -----------------------------
+def connection_stats() -> dict:
+    return {service: dict(counts) for service, counts in STATS.items() if counts}
+
+
+def print_connection_stats() -> None:
+    for service, counts in connection_stats().items():
+        line = (f"HTTP {service}: {counts.get('requests', 0)} request(s) over "
+                f"{counts.get('connections', 0)} connection(s), {counts.get('tls_handshakes', 0)} TLS handshake(s)")
+        if counts.get("coalesced"):
+            # Counted by garmin_session.SingleFlight
+            line += f"; {counts['coalesced']} duplicate call(s) served from the run cache"
+        print(line)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Garmin's push service: posts sample Health API
+notifications to webhook-receiver.py, e.g.
+
+  python webhook-poster.py activity --activity-id 12345678901 --date 2025-08-05
+  python webhook-poster.py sleep daily --repeat 3
+  python webhook-poster.py activity --ping
+"""
+
+import argparse
+import json
+import os
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+from local_dates import today
+
+SUMMARY_TYPES = {"activity": "activities", "sleep": "sleeps", "daily": "dailies"}
+
+
+def sample_summary(kind: str, day: str, activity_id: int) -> dict:
+    """
+    A summary shaped like the Health API's push payloads (only the fields the receiver reads, plus a few).
+    """
+    noon = int(datetime.fromisoformat(day).replace(hour=12, tzinfo=timezone.utc).timestamp())
+    summary = {"userId": "stand-in-user", "userAccessToken": "stand-in-token", "summaryId": f"{kind}-{day}"}
+    if kind == "activity":
+        summary.update(activityId=activity_id, activityName="Stand-in Run", activityType="RUNNING",
+                       startTimeInSeconds=noon, startTimeOffsetInSeconds=0, durationInSeconds=1800,
+                       distanceInMeters=5000.0)
+    elif kind == "sleep":
+        summary.update(calendarDate=day, startTimeInSeconds=noon - 14 * 3600, durationInSeconds=8 * 3600)
+    else:
+        summary.update(calendarDate=day, steps=8000, restingHeartRateInBeatsPerMinute=52)
+    return summary
+
+
+def notification(kinds: list, day: str, activity_id: int, ping: bool) -> dict:
+    payload = {}
+    for kind in kinds:
+        if ping:
+            entry = {"userId": "stand-in-user", "userAccessToken": "stand-in-token",
+                     "callbackURL": "https://apis.garmin.com/wellness-api/rest/stand-in"}
+        else:
+            entry = sample_summary(kind, day, activity_id)
+        payload.setdefault(SUMMARY_TYPES[kind], []).append(entry)
+    return payload
+
+
+def post(url: str, payload: dict) -> int:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status
+
+
+def main():
+    port = os.getenv("WEBHOOK_PORT", "8787")
+    token = os.getenv("WEBHOOK_TOKEN")
+    default_url = f"http://127.0.0.1:{port}/garmin" + (f"?token={token}" if token else "")
+
+    parser = argparse.ArgumentParser(description="Post sample Garmin push notifications to webhook-receiver.py")
+    parser.add_argument("kinds", nargs="+", choices=sorted(SUMMARY_TYPES))
+    parser.add_argument("--url", default=default_url)
+    parser.add_argument("--date", default=today().isoformat(), help="calendar day of the samples (default: today)")
+    parser.add_argument("--activity-id", type=int, default=12345678901)
+    parser.add_argument("--ping", action="store_true", help="send ping notifications (callbackURL only)")
+    parser.add_argument("--repeat", type=int, default=1, help="send the notification this many times")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between repeats")
+    args = parser.parse_args()
+
+    payload = notification(args.kinds, args.date, args.activity_id, args.ping)
+    for i in range(args.repeat):
+        if i:
+            time.sleep(args.interval)
+        print(f"POST {args.url}: {', '.join(payload)} -> {post(args.url, payload)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Run targeted syncs as soon as Garmin reports new data, instead of polling.
+
+Point the Garmin Health API push (or ping) endpoints for activities, sleeps
+and dailies at http://HOST:PORT/garmin?token=WEBHOOK_TOKEN. Every POST is
+acknowledged with 200 straight away; the syncs it asks for are debounced and
+coalesced by push_sync.PushQueue. Try it locally with webhook-poster.py.
+"""
+
+import argparse
+import json
+import os
+import shlex
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from dotenv import load_dotenv
+
+from push_sync import PushQueue, notification_targets
+
+# Garmin's notifications are small; anything bigger is not one of them
+MAX_BODY_BYTES = 5 * 1024 * 1024
+
+
+def make_handler(queue: PushQueue, token: str = None):
+    class PushHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if token and parse_qs(urlparse(self.path).query).get("token", [None])[0] != token:
+                self.send_error(403)
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self.send_error(413)
+                return
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self.send_error(400, "Body is not JSON")
+                return
+            if not isinstance(payload, dict):
+                self.send_error(400, "Body is not a JSON object")
+                return
+            targets = notification_targets(payload)
+            self.send_response(200)
+            self.end_headers()
+            print(f"Notification: {len(targets)} summary(ies) from {', '.join(payload) or 'nothing'}")
+            queue.add(targets)
+
+        def log_message(self, format, *args):
+            # One line per notification is printed above; skip the access log
+            pass
+
+    return PushHandler
+
+
+def parse_script_args(values: list) -> dict:
+    """
+    ["garmin-activities2.py=--body --fit", ...] -> {script: [args]}
+    """
+    script_args = {}
+    for value in values or []:
+        script, _, args = value.partition("=")
+        script_args[script] = shlex.split(args)
+    return script_args
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Receive Garmin Health API notifications and run targeted syncs")
+    parser.add_argument("--host", default=os.getenv("WEBHOOK_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEBHOOK_PORT", "8787")))
+    parser.add_argument("--script-args", action="append", metavar="SCRIPT=ARGS",
+                        help='extra arguments for a triggered script, e.g. "garmin-activities2.py=--body --fit" '
+                             "(repeatable)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the syncs that would run instead of running them")
+    args = parser.parse_args()
+
+    token = os.getenv("WEBHOOK_TOKEN")
+    if not token:
+        print("WEBHOOK_TOKEN is not set: accepting notifications from anyone who can reach the port")
+
+    queue = PushQueue(parse_script_args(args.script_args), dry_run=args.dry_run)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(queue, token))
+    print(f"Listening on http://{args.host}:{args.port} "
+          f"(debounce {queue.debounce:.0f}s, max wait {queue.max_wait:.0f}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()